@@ -22,15 +22,34 @@ def create_app(test_config=None):
     except OSError:
         pass
     
+    # Configure database engines and per-request sessions
+    from app.database import init_db
+    init_db(app)
+    
+    # Request ids in the X-Request-ID header, for logs and stored profiles
+    from app.middleware import RequestIDMiddleware
+    app.wsgi_app = RequestIDMiddleware(app.wsgi_app)
+    
+    # Request counters and latency histograms for /metrics
+    from app.metrics import init_metrics
+    init_metrics(app)
+    
+    # On-demand profiles and slow-request logs
+    from app.profiling import init_profiling
+    init_profiling(app)
+    
     # Enable CORS for API endpoints
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
     # Register routes
     from app.routes import bp as routes_bp
     app.register_blueprint(routes_bp)
+    from app.recommend import recommend_bp
+    app.register_blueprint(recommend_bp)
     
     # Verify paths before initializing recommender
     from app.config import Config
+    app.catalogs = None
     missing_files = Config.verify_paths()
     if missing_files:
         app.logger.critical(f"Missing required files: {missing_files}")
@@ -42,11 +61,21 @@ def create_app(test_config=None):
         from .recommender import AppRecommender
         app.recommender = AppRecommender()
         app.logger.info("Successfully initialized recommender")
+        # Startup timings reach the shared metrics directory even if this
+        # process only forks workers (gunicorn --preload)
+        from app.metrics import REGISTRY
+        REGISTRY.maybe_flush(app.config.get('METRICS_DIR'), 0)
         # IMPORTANT: Removed the line that was setting recommender to None
     except Exception as e:
         app.recommender = None  # Explicitly set to None only on error
         app.logger.critical(f"Fatal initialization error: {str(e)}")
         app.logger.critical(f"Stack trace: {traceback.format_exc()}")
         # Don't re-raise the exception - allow the app to start
+    
+    # Extra catalogs (markets, locales) share the models above and load on first request
+    if Config.CATALOGS:
+        from app.catalogs import CatalogRegistry
+        app.catalogs = CatalogRegistry.from_config(shared=app.recommender)
+        app.logger.info(f"Serving catalogs {app.catalogs.names} on request")
 
     return app
\ No newline at end of file
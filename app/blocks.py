@@ -0,0 +1,83 @@
+"""
+Feature-block weights chosen per query instead of baked into the index.
+
+The combined feature vector has three blocks: TF-IDF text, scaled numerical
+columns and one-hot categoricals. The scoring index holds the cosine of
+their concatenation, so the balance between blocks is fixed when the index
+is built. ``BlockFeatures`` keeps every block row-normalized on its own in
+one matrix; multiplying the query's entries by the weight of their block
+makes a single sparse product return
+
+    sum_b w_b * cos_b(query, row) / sum_b w_b
+
+so any weighting is served from the same matrix. Weights come from
+``Config.FEATURE_BLOCK_WEIGHTS`` or the ``weights`` request parameter, e.g.
+``weights=text:2,numeric:0.5``; blocks left out keep weight 1.
+"""
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix, hstack
+from app.index import ExactIndex, normalize_features
+
+logger = logging.getLogger(__name__)
+
+BLOCK_NAMES = ('text', 'numeric', 'categorical')
+
+
+def parse_block_weights(value):
+    """Weights per block from 'text:2,numeric:0.5' or a dict; None when not given.
+
+    Raises ValueError for unknown blocks, negative weights or all-zero weights.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        pairs = [part.split(':', 1) if ':' in part else part.split('=', 1) for part in value.split(',') if part.strip()]
+        if any(len(pair) != 2 for pair in pairs):
+            raise ValueError(f"weights must look like 'text:2,numeric:0.5', got '{value}'")
+        value = {name.strip(): weight.strip() for name, weight in pairs}
+    if not isinstance(value, dict):
+        raise ValueError("weights must be an object or 'block:weight' pairs")
+    weights = dict.fromkeys(BLOCK_NAMES, 1.0)
+    for name, weight in value.items():
+        if name not in BLOCK_NAMES:
+            raise ValueError(f"Unknown feature block '{name}'. Use one of: {', '.join(BLOCK_NAMES)}")
+        try:
+            weights[name] = float(weight)
+        except (TypeError, ValueError):
+            raise ValueError(f"Weight of '{name}' must be a number, got '{weight}'")
+        if not weights[name] >= 0:
+            raise ValueError(f"Weight of '{name}' must not be negative")
+    if not sum(weights.values()) > 0:
+        raise ValueError("At least one block weight must be positive")
+    return weights
+
+
+class BlockFeatures:
+    """Row-normalized feature blocks side by side, scored with query-time weights."""
+
+    def __init__(self, combined, block_sizes, precision=None):
+        if sum(block_sizes) != combined.shape[1]:
+            raise ValueError(f"Block sizes {block_sizes} do not add up to {combined.shape[1]} feature columns")
+        combined = csr_matrix(combined)
+        bounds = np.cumsum([0] + list(block_sizes))
+        blocks = [normalize_features(combined[:, lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        # Exact scoring, masks and top-k selection are the same as the fixed-weight index
+        self.index = ExactIndex(hstack(blocks, format='csr'), precision)
+        self.block_sizes = list(block_sizes)
+        self.column_block = np.repeat(np.arange(len(block_sizes), dtype=np.int8), block_sizes)
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + self.column_block.nbytes
+
+    def query(self, row, weights):
+        """The catalog row's block features, each entry scaled by its block's share of the weights."""
+        scale = np.array([weights[name] for name in BLOCK_NAMES], dtype=np.float64)
+        scale /= scale.sum()
+        query = self.index.features[row]
+        return csr_matrix((query.data * scale[self.column_block[query.indices]].astype(query.dtype),
+                           query.indices, query.indptr), shape=query.shape)
+
+    def describe(self):
+        return dict(zip(BLOCK_NAMES, self.block_sizes), nbytes=int(self.nbytes))
@@ -0,0 +1,199 @@
+"""
+Several catalogs (markets, locales) served from one process.
+
+``CATALOGS`` names extra catalog CSVs, e.g. ``de=data/de.csv,fr=data/fr.csv``.
+Requests pick one with the ``catalog`` parameter; without it, or with
+``DEFAULT_CATALOG``, they use the recommender built at startup from the
+usual data paths.
+
+``CatalogRegistry`` builds a catalog's recommender on its first request.
+The fitted transformers, rating model and compiled forest are shared with
+the default recommender, so a catalog only adds its own data, index and
+lookup structures. A catalog whose data the shared models cannot handle
+can bring its own models. Catalog-specific artifacts live in
+``CATALOG_ARTIFACTS_DIR/<name>/`` under the usual file names: a saved
+index (``python -m app.index --catalog data/de.csv --output
+models/catalogs/de/index``), predicted ratings (``python -m app.ratings``
+likewise), a neighbor table, or model pickles.
+
+Loaded catalogs are kept in least-recently-used order. When their
+structures exceed ``CATALOG_MEMORY_MB``, the least recently used ones are
+dropped and rebuilt on their next request. Requests already holding an
+evicted recommender finish with it.
+
+A catalog that fails to load is unavailable for ``CATALOG_RETRY_SECONDS``,
+doubled after each further failure (at most ``MAX_RETRY_SECONDS``), so
+requests for it do not rebuild it over and over.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+MB = 2 ** 20
+
+# Columns the shared transformers and model read from every catalog
+REQUIRED_COLUMNS = ['App', 'Category', 'Genres', 'Reviews', 'Size', 'Installs', 'Price', 'Type', 'Content Rating']
+# Structures a catalog shares with the default recommender; not counted against the budget
+SHARED_STRUCTURES = ('tfidf_vectorizer', 'encoder', 'scaler', 'model', 'compiled_model')
+# Longest wait before retrying a catalog that keeps failing to load
+MAX_RETRY_SECONDS = 3600
+
+
+class UnknownCatalog(KeyError):
+    """The requested catalog is not configured."""
+
+
+def parse_catalogs(value):
+    """{name: CSV path} from 'de=data/de.csv,fr=data/fr.csv'; relative paths are from BASE_DIR.
+
+    Raises ValueError for entries without a name or path.
+    """
+    catalogs = {}
+    for entry in (value or '').split(','):
+        if not entry.strip():
+            continue
+        name, _, path = entry.partition('=')
+        name, path = name.strip(), path.strip()
+        if not name or not path:
+            raise ValueError(f"Catalogs must look like 'de=data/de.csv', got '{entry.strip()}'")
+        catalogs[name] = path if os.path.isabs(path) else os.path.join(Config.BASE_DIR, path)
+    return catalogs
+
+
+class CatalogRegistry:
+    """Recommenders of named catalogs, built on first use and evicted least recently used first."""
+
+    def __init__(self, paths, shared=None, memory_budget_mb=None, artifacts_dir=None, retry_seconds=None):
+        self.paths = dict(paths)
+        # Recommender whose fitted models every catalog reuses
+        self.shared = shared
+        self.memory_budget = memory_budget_mb * MB if memory_budget_mb else None
+        self.artifacts_dir = artifacts_dir or Config.CATALOG_ARTIFACTS_DIR
+        self.loaded = OrderedDict()  # name -> (recommender, bytes), least recently used first
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0, 'failures': 0}
+        self.retry_seconds = Config.CATALOG_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self._failed = {}  # name -> (consecutive failures, time.monotonic() of the next attempt)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    @classmethod
+    def from_config(cls, shared=None):
+        return cls(parse_catalogs(Config.CATALOGS), shared, Config.CATALOG_MEMORY_MB)
+
+    @property
+    def names(self):
+        return sorted(self.paths)
+
+    def get(self, name):
+        """The catalog's recommender, built now if it is not loaded; None if it cannot be built.
+
+        Raises UnknownCatalog for names that are not configured.
+        """
+        if name not in self.paths:
+            raise UnknownCatalog(name)
+        with self._lock:
+            recommender = self._touch(name)
+            if recommender is not None or self._backing_off(name):
+                return recommender
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # One build per catalog at a time; other catalogs stay available meanwhile
+        with load_lock:
+            with self._lock:
+                recommender = self._touch(name)
+                if recommender is not None or self._backing_off(name):
+                    return recommender
+            recommender = self._load(name)
+            nbytes = catalog_nbytes(recommender, self.shared) if recommender is not None else 0
+            with self._lock:
+                if recommender is None:
+                    self._record_failure(name)
+                    return None
+                self.stats['loads'] += 1
+                self._failed.pop(name, None)
+                self.loaded[name] = (recommender, nbytes)
+                self._evict(keep=name)
+            return recommender
+
+    def _backing_off(self, name):
+        """True while a catalog that failed to load waits for its next attempt."""
+        failed = self._failed.get(name)
+        return failed is not None and time.monotonic() < failed[1]
+
+    def _record_failure(self, name):
+        self.stats['failures'] += 1
+        failures = self._failed.get(name, (0, 0.0))[0] + 1
+        delay = min(self.retry_seconds * 2 ** (failures - 1), MAX_RETRY_SECONDS)
+        self._failed[name] = (failures, time.monotonic() + delay)
+        logger.warning(f"Catalog '{name}' is unavailable for {delay:.0f}s after {failures} failed load(s)")
+
+    def _touch(self, name):
+        entry = self.loaded.get(name)
+        if entry is None:
+            return None
+        self.loaded.move_to_end(name)
+        self.stats['hits'] += 1
+        return entry[0]
+
+    def _load(self, name):
+        from app.recommender import AppRecommender, load_catalog
+
+        start_time = time.perf_counter()
+        try:
+            data = load_catalog([self.paths[name]])
+            if data is None:
+                raise ValueError(f"No catalog data at {self.paths[name]}")
+            missing = [column for column in REQUIRED_COLUMNS if column not in data.columns]
+            if missing:
+                raise ValueError(f"Catalog lacks columns the models read: {', '.join(missing)}")
+            recommender = AppRecommender(data=data, artifacts_dir=os.path.join(self.artifacts_dir, name),
+                                         share_models_with=self.shared)
+        except Exception as e:
+            logger.error(f"Failed to load catalog '{name}': {str(e)}")
+            return None
+        logger.info(f"Loaded catalog '{name}' ({len(recommender.data)} apps) in {time.perf_counter() - start_time:.1f}s")
+        return recommender
+
+    def _evict(self, keep=None):
+        """Drop least recently used catalogs until the loaded ones fit the budget; never ``keep``."""
+        if self.memory_budget is None:
+            return
+        while sum(nbytes for _, nbytes in self.loaded.values()) > self.memory_budget:
+            name = next((name for name in self.loaded if name != keep), None)
+            if name is None:
+                logger.warning(f"Catalog '{keep}' alone exceeds the {self.memory_budget / MB:.0f} MB catalog budget")
+                return
+            del self.loaded[name]
+            self.stats['evictions'] += 1
+            logger.info(f"Evicted catalog '{name}', the least recently used")
+
+    def describe(self):
+        with self._lock:
+            loaded = {name: round(nbytes / MB, 2) for name, (_, nbytes) in self.loaded.items()}
+            return {
+                'available': self.names,
+                'loaded_mb': loaded,
+                'total_mb': round(sum(loaded.values()), 2),
+                'budget_mb': round(self.memory_budget / MB, 2) if self.memory_budget else None,
+                # Seconds until failed catalogs are tried again
+                'retry_in_s': {name: max(0, round(next_attempt - time.monotonic(), 1))
+                               for name, (_, next_attempt) in self._failed.items()},
+                **self.stats
+            }
+
+
+def catalog_nbytes(recommender, shared=None):
+    """Bytes of the structures a catalog's recommender does not share with ``shared``."""
+    from app.memory import structure_memory
+
+    structures = getattr(recommender, '_structure_memory', None)
+    if structures is None:
+        structures = structure_memory(recommender)
+        # memory_report reuses it for /api/recommender-status
+        recommender._structure_memory = structures
+    return sum(entry['nbytes'] for name, entry in structures.items()
+               if name not in SHARED_STRUCTURES or getattr(recommender, name, None) is not getattr(shared, name, None))
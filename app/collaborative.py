@@ -0,0 +1,141 @@
+"""
+Offline item-item collaborative filtering built from the Review table.
+
+Run ``python -m app.collaborative`` to rebuild ``Config.CF_NEIGHBORS_PATH``.
+The resulting NeighborTable is indexed by catalog row, so the recommender can
+blend it with content-based scores in hybrid mode.
+"""
+import time
+import logging
+import numpy as np
+from scipy.sparse import coo_matrix
+from sklearn.preprocessing import normalize
+from app.config import Config
+from app.models import App, Review
+from app.neighbors import top_k_neighbors
+
+logger = logging.getLogger(__name__)
+
+
+def map_apps_to_catalog(session, catalog_names, aliases=None):
+    """Map App.id values to catalog rows by case-insensitive name.
+    
+    ``aliases`` maps lowercase names of listings collapsed at ingest to their
+    representative's row (see app.dedup), so their reviews count for it.
+    """
+    row_by_name = {}
+    for row, name in enumerate(catalog_names):
+        row_by_name.setdefault(str(name).lower(), row)
+    for name, row in (aliases or {}).items():
+        row_by_name.setdefault(name, row)
+
+    app_rows = {}
+    for app_id, name in session.query(App.id, App.name).yield_per(10000):
+        row = row_by_name.get(str(name).lower())
+        if row is not None:
+            app_rows[app_id] = row
+    return app_rows
+
+
+def stream_reviews(session, batch_size=50000):
+    """Yield (user_key, app_id, rating) for every review without loading them all."""
+    query = session.query(Review.user_id, Review.author, Review.app_id, Review.rating)
+    for user_id, author, app_id, rating in query.yield_per(batch_size):
+        # Imported reviews have no user account, so fall back to the author name
+        yield (user_id if user_id is not None else f"author:{author}"), app_id, rating
+
+
+def build_interaction_matrix(reviews, app_rows, n_apps, batch_size=50000):
+    """
+    Build a sparse app x user rating matrix from (user_key, app_id, rating) tuples.
+
+    Reviews are buffered ``batch_size`` at a time into int32/float32 arrays, so
+    memory grows by 12 bytes per review plus one dict entry per distinct user.
+    """
+    user_ids = {}
+    rows, cols, values = [], [], []
+    batch_rows, batch_cols, batch_values = [], [], []
+    skipped = 0
+
+    def flush():
+        rows.append(np.array(batch_rows, dtype=np.int32))
+        cols.append(np.array(batch_cols, dtype=np.int32))
+        values.append(np.array(batch_values, dtype=np.float32))
+        batch_rows.clear()
+        batch_cols.clear()
+        batch_values.clear()
+
+    for user_key, app_id, rating in reviews:
+        row = app_rows.get(app_id)
+        if row is None:
+            skipped += 1
+            continue
+        batch_rows.append(row)
+        batch_cols.append(user_ids.setdefault(user_key, len(user_ids)))
+        batch_values.append(rating)
+        if len(batch_rows) >= batch_size:
+            flush()
+    flush()
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} reviews for apps that are not in the catalog")
+
+    rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+    shape = (n_apps, max(len(user_ids), 1))
+    interactions = coo_matrix((values, (rows, cols)), shape=shape).tocsr()
+    # Repeated reviews by the same user are summed on conversion; keep their mean
+    counts = coo_matrix((np.ones_like(values), (rows, cols)), shape=shape).tocsr()
+    interactions.data /= counts.data
+    return interactions
+
+
+def build_item_neighbors(session, catalog_names, k=None, chunk_size=None, batch_size=50000, aliases=None):
+    """Build the item-item cosine NeighborTable for a catalog from stored reviews."""
+    k = k or Config.CF_TOP_K
+    chunk_size = chunk_size or Config.CF_CHUNK_SIZE
+    start_time = time.time()
+
+    app_rows = map_apps_to_catalog(session, catalog_names, aliases)
+    interactions = build_interaction_matrix(
+        stream_reviews(session, batch_size), app_rows, len(catalog_names), batch_size
+    )
+    logger.info(f"Built interaction matrix {interactions.shape} with {interactions.nnz} ratings")
+
+    item_vectors = normalize(interactions, norm='l2', axis=1, copy=False)
+    table = top_k_neighbors(item_vectors, k, chunk_size=chunk_size)
+    logger.info(f"Computed top-{k} item neighbors in {time.time() - start_time:.2f}s")
+    return table
+
+
+if __name__ == '__main__':
+    import argparse
+    from flask import Flask
+    from app.database import init_db, read_session
+    from app.recommender import load_catalog, compact_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Build the item-item neighbor table from stored reviews")
+    parser.add_argument('--catalog', help="Catalog CSV to build for instead of the configured one (see app.catalogs)")
+    parser.add_argument('--output', default=Config.CF_NEIGHBORS_PATH)
+    args = parser.parse_args()
+
+    # Same name as create_app so the default SQLite file resolves to the same instance folder
+    app = Flask('app', instance_relative_config=True)
+    app.config.from_object(Config)
+    app.config['DB_CREATE_TABLES'] = False
+    init_db(app)
+
+    catalog = load_catalog([args.catalog] if args.catalog else None)
+    if catalog is None:
+        raise SystemExit("No catalog data found")
+    aliases = None
+    if Config.DEDUP_CATALOG:
+        # Rows must match the collapsed catalog the recommender serves, built the same way
+        from app.dedup import collapse_duplicates, duplicate_aliases
+        catalog, duplicates = collapse_duplicates(compact_catalog(catalog) if Config.COMPACT_CATALOG else catalog)
+        aliases = duplicate_aliases(catalog, duplicates)
+
+    with app.app_context():
+        table = build_item_neighbors(read_session(), catalog['App'].tolist(), aliases=aliases)
+    table.save(args.output)
@@ -19,6 +19,16 @@ class Config:
     DATA_PATH = os.path.join(DATA_DIR, 'googleplaystore.csv')
     FIXED_DATA_PATH = os.path.join(DATA_DIR, 'googleplaystore_fixed.csv')
     SAMPLE_DATA_PATH = os.path.join(DATA_DIR, 'apps_data.csv')
+    CATALOG_PATH = os.environ.get('CATALOG_PATH')  # Optional catalog CSV used instead of the files above
+    CATALOGS = os.environ.get('CATALOGS')  # Extra catalogs served with ?catalog=<name>, e.g. 'de=data/de.csv,fr=data/fr.csv'
+    DEFAULT_CATALOG = os.environ.get('DEFAULT_CATALOG', 'default')  # Name of the catalog loaded from the paths above
+    CATALOG_MEMORY_MB = int(os.environ.get('CATALOG_MEMORY_MB', 0))  # Evict least recently used extra catalogs above this; 0 keeps all
+    CATALOG_RETRY_SECONDS = int(os.environ.get('CATALOG_RETRY_SECONDS', 60))  # Wait before retrying a catalog that failed to load; doubles per failure
+    COMPACT_CATALOG = os.environ.get('COMPACT_CATALOG', '1') != '0'  # Serving columns only, categorical and downcast dtypes
+    DEDUP_CATALOG = os.environ.get('DEDUP_CATALOG', '0') == '1'  # Keep one listing per cluster of near-duplicates (app.dedup)
+    DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', 0.9))  # Minimum Jaccard similarity of name and genre shingles
+    DEDUP_BANDS = 8  # LSH bands; more bands find less similar candidates
+    DEDUP_ROWS_PER_BAND = 4  # MinHash values per band; more rows make candidates stricter
     
         # Model paths
     # Model paths
@@ -26,9 +36,69 @@ class Config:
     ENCODER_PATH = os.path.join(MODELS_DIR, 'onehot_encoder.pkl')
     SCALER_PATH = os.path.join(MODELS_DIR, 'minmax_scaler.pkl')
     MODEL_PATH = os.path.join(MODELS_DIR, 'random_forest_model.pkl')
+    CF_NEIGHBORS_PATH = os.path.join(MODELS_DIR, 'cf_neighbors.npz')  # Optional, built by app.collaborative
+    COMPILED_FOREST_PATH = os.path.join(MODELS_DIR, 'compiled_forest.npz')  # Optional, written by save_model.py
+    PREDICTED_RATINGS_PATH = os.path.join(MODELS_DIR, 'predicted_ratings.npz')  # Optional, written by app.ratings (and save_model.py)
+    CATALOG_ARTIFACTS_DIR = os.path.join(MODELS_DIR, 'catalogs')  # <dir>/<name>/ holds a catalog's own index, neighbor table or models
+    
+    # Scoring index configuration
+    SERVING_PRECISION = os.environ.get('SERVING_PRECISION', 'float32')  # 'float64', 'float32' or 'int8' (embeddings and neighbor scores)
+    SCORING_ENGINE = os.environ.get('SCORING_ENGINE', 'exact')  # 'exact', 'lsh' (approximate) or 'svd' (dense embedding)
+    INDEX_DIR = os.path.join(MODELS_DIR, 'index')  # Prebuilt index from app.index, used when it matches the catalog
+    INDEX_MMAP = True  # Memory-map saved index arrays instead of reading them into memory
+    SERVING_SHARDS = int(os.environ.get('SERVING_SHARDS', 0))  # >1 splits exact scoring across that many local worker processes (app.shards)
+    LSH_TABLES = 16  # More tables raise recall
+    LSH_BITS = 12  # More bits make buckets smaller and queries faster
+    LSH_PROBES = 2  # Extra buckets probed per table by flipping the least confident bits
+    EMBEDDING_DIMS = 128  # Dimensions of the 'svd' engine; pick with python -m app.embeddings
+    
+    FEATURE_BLOCKS = os.environ.get('FEATURE_BLOCKS', '0') == '1'  # Keep per-block features so requests can pass weights
+    FEATURE_BLOCK_WEIGHTS = os.environ.get('FEATURE_BLOCK_WEIGHTS')  # Default weights for every request, e.g. 'text:2,numeric:0.5'
+    
+    # Collaborative filtering configuration
+    CF_TOP_K = 50  # Neighbors stored per app
+    CF_CHUNK_SIZE = 2048  # Rows per sparse product block while building neighbors
+    HYBRID_CF_WEIGHT = 0.3  # Share of the collaborative score in hybrid mode
+    
+    # Offline export (python -m app.export and /api/export)
+    EXPORT_BLOCK_MB = int(os.environ.get('EXPORT_BLOCK_MB', 64))  # Dense score matrix per block of exported apps
+    EXPORT_JOBS = int(os.environ.get('EXPORT_JOBS', -1))  # Worker processes for python -m app.export; -1 uses every core
+    MAX_CONCURRENT_EXPORTS = int(os.environ.get('MAX_CONCURRENT_EXPORTS', 1))  # /api/export streams per process; more get 429
+    
+    # Rating model configuration
+    PREDICT_N_JOBS = int(os.environ.get('PREDICT_N_JOBS', -1))  # Parallel trees when python -m app.ratings predicts the catalog
+    TRAINING_CACHE_DIR = os.environ.get('TRAINING_CACHE_DIR', os.path.join(MODELS_DIR, 'cache'))  # Stage outputs reused by save_model.py
+    COMPILED_FOREST_MAX_BATCH = 32  # Larger batches are faster through scikit-learn (see python -m app.forest)
+    
+    # Database configuration (defaults to a SQLite file in the instance folder)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')  # Optional read-only replica for review reads
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Seconds before a connection is replaced
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 200))
+    DB_CREATE_TABLES = True
+    SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+    
+    # Metrics configuration
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # Shared snapshot directory for multi-worker servers; empty it before starting
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))  # Seconds between a worker's snapshots
+    
+    # Request diagnostics
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # Enables /api/admin endpoints and the X-Profile request header
+    PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # Profile 1 in N requests; 0 turns sampling off
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # Shared profile directory for multi-worker servers; in memory when unset
+    PROFILE_MAX_STORED = 100  # Most recent profiles kept
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))  # Requests at least this slow are logged with stage timings
     
     # API configuration
     MAX_RECOMMENDATIONS = 20
+    MAX_PREDICT_BATCH = 100  # Unseen apps per /predict request
+    SUGGEST_LIMIT = 8  # Default number of /api/suggest completions
+    MAX_SUGGESTIONS = 50
+    HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 300))  # Seconds clients may reuse /api/recommend and /api/popular; revalidated by ETag after
     
     @classmethod
     def verify_paths(cls):
@@ -42,7 +112,7 @@ class Config:
                 missing_files.append(file_path)
         
         # Check at least one data file exists
-        data_files = [cls.DATA_PATH, cls.FIXED_DATA_PATH, cls.SAMPLE_DATA_PATH]
+        data_files = [path for path in (cls.CATALOG_PATH, cls.DATA_PATH, cls.FIXED_DATA_PATH, cls.SAMPLE_DATA_PATH) if path]
         if not any(os.path.exists(path) for path in data_files):
             missing_files.extend(data_files)
         
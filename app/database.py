@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import threading
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask_sqlalchemy.query import Query
+from app.config import Config
+from app.models import db
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND = 'replica'
+
+
+class QueryStats:
+    """Thread-safe running totals of statement timings for one engine."""
+
+    def __init__(self, slow_threshold):
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.slow_count = 0
+
+    def record(self, elapsed):
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+            if elapsed >= self.slow_threshold:
+                self.slow_count += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'total_ms': round(self.total_time * 1000, 3),
+                'avg_ms': round(self.total_time * 1000 / self.count, 3) if self.count else 0.0,
+                'max_ms': round(self.max_time * 1000, 3),
+                'slow_count': self.slow_count
+            }
+
+
+def _setting(app, name):
+    """Read a database setting, falling back to the class defaults in Config."""
+    return app.config.get(name, getattr(Config, name))
+
+
+def _is_sqlite_memory(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def engine_options(app, uri):
+    """Build SQLAlchemy engine options for a database URI from config."""
+    options = {'pool_pre_ping': True}
+    if _is_sqlite_memory(uri):
+        # In-memory SQLite uses a singleton pool, which has no size or overflow
+        return options
+    options.update({
+        'pool_size': _setting(app, 'DB_POOL_SIZE'),
+        'max_overflow': _setting(app, 'DB_MAX_OVERFLOW'),
+        'pool_recycle': _setting(app, 'DB_POOL_RECYCLE'),
+        'pool_timeout': _setting(app, 'DB_POOL_TIMEOUT')
+    })
+    if uri.startswith('sqlite'):
+        # Pooled connections are handed between request threads
+        options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+def _install_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _install_query_timing(engine, stats):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        stats.record(elapsed)
+        if elapsed >= stats.slow_threshold:
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {statement[:200]}")
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_timer(exception_context):
+        # after_cursor_execute does not fire for failed statements
+        connection = exception_context.connection
+        start_times = connection.info.get('query_start_time') if connection is not None else None
+        if start_times:
+            start_times.pop()
+
+
+def init_db(app):
+    """Configure the primary and optional replica engines and bind them to the app."""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or Config.SQLALCHEMY_DATABASE_URI
+    if not uri:
+        uri = 'sqlite:///' + os.path.join(app.instance_path, 'app.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app, uri))
+
+    replica_uri = _setting(app, 'SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_uri, **engine_options(app, replica_uri)}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    pragmas = _setting(app, 'SQLITE_PRAGMAS')
+    slow_threshold = _setting(app, 'DB_SLOW_QUERY_MS') / 1000.0
+    app.extensions['db_query_stats'] = {}
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            name = bind_key or 'primary'
+            if engine.dialect.name == 'sqlite' and not _is_sqlite_memory(str(engine.url)):
+                _install_sqlite_pragmas(engine, pragmas)
+            stats = QueryStats(slow_threshold)
+            _install_query_timing(engine, stats)
+            app.extensions['db_query_stats'][name] = stats
+
+        if _setting(app, 'DB_CREATE_TABLES'):
+            # Only the primary bind owns tables; the replica is read-only
+            db.create_all(bind_key=None)
+
+        logger.info(f"Database initialized: {db.engine.url.render_as_string(hide_password=True)}")
+
+    app.teardown_appcontext(_close_read_session)
+
+
+def read_session():
+    """Return the request-scoped session for review reads.
+
+    Uses the read-only replica when one is configured, otherwise the primary
+    engine. The session is closed when the app context is torn down.
+    """
+    if 'db_read_session' not in g:
+        engine = db.engines.get(REPLICA_BIND, db.engine)
+        g.db_read_session = Session(bind=engine, query_cls=Query)
+    return g.db_read_session
+
+
+def _close_read_session(exc):
+    session = g.pop('db_read_session', None)
+    if session is not None:
+        session.close()
+
+
+def database_status(app):
+    """Pool and query timing statistics for each configured engine."""
+    stats = app.extensions.get('db_query_stats', {})
+    engines = {}
+    for bind_key, engine in db.engines.items():
+        name = bind_key or 'primary'
+        pool = engine.pool
+        engines[name] = {
+            'dialect': engine.dialect.name,
+            'pool_class': type(pool).__name__,
+            'pool_size': pool.size() if hasattr(pool, 'size') else None,
+            'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+            'queries': stats[name].to_dict() if name in stats else None
+        }
+    return {
+        'has_replica': REPLICA_BIND in db.engines,
+        'engines': engines
+    }
@@ -0,0 +1,280 @@
+"""
+Near-duplicate listings collapsed at ingest.
+
+Store catalogs list the same app many times: exact repeats, other
+versions ("Maps 2.1" / "Maps v3") and punctuation or case variants.
+``collapse_duplicates`` keeps one row per cluster of near-duplicates, so
+the serving catalog, feature matrix and neighbor tables only hold
+distinct apps and no result slot goes to a second copy.
+
+Each row becomes a set of shingles: character 3-grams of its normalized
+name (lowercase, punctuation and version numbers removed) plus its
+category and genres. Rows whose MinHash signatures agree on any LSH band
+are candidates; candidates with the same numbers and edition words in
+their names ("Racing 2" is not "Racing", "Notes Pro" is not "Notes") and
+a Jaccard similarity of at least ``DEDUP_THRESHOLD`` are linked, and
+each connected cluster keeps its most reviewed row. The dropped rows and
+the representative each maps to form the cluster map, which the
+recommender keeps to resolve dropped names and which
+
+    python -m app.dedup --output duplicates.csv [--catalog data/catalog.csv] [--catalog-output deduped.csv]
+
+writes out for review.
+"""
+import re
+import logging
+import numpy as np
+import pandas as pd
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+_KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+_VERSION = re.compile(r'\bv(?:er(?:sion)?)?\.?\s*\d+(?:\.\d+)*\b|\b\d+(?:\.\d+)+\b')
+_PUNCTUATION = re.compile(r'[^\w\s]+|_')
+_SPACES = re.compile(r'\s+')
+# Words that tell editions of one app apart; listings must agree on them and on numbers
+EDITION_WORDS = frozenset({'pro', 'lite', 'free', 'plus', 'premium', 'paid', 'full', 'demo', 'trial', 'beta'})
+ROMAN_NUMERALS = frozenset({'ii', 'iii', 'iv', 'vi', 'vii', 'viii', 'ix', 'xi', 'xii'})
+
+
+def normalize_name(name):
+    """Lowercase name without version numbers, punctuation or repeated spaces; '+' reads 'plus'."""
+    name = _VERSION.sub(' ', str(name).lower()).replace('+', ' plus ')
+    return _SPACES.sub(' ', _PUNCTUATION.sub(' ', name)).strip()
+
+
+def variant_key(normalized):
+    """Numbers and edition words of a normalized name: '2', 'pro', ... (sequels and editions differ)."""
+    return ' '.join(sorted(word for word in normalized.split()
+                           if word.isdigit() or word in EDITION_WORDS or word in ROMAN_NUMERALS))
+
+
+def _hash32(codes):
+    """Well-mixed 32-bit hashes of 64-bit integers (the splitmix64 finalizer)."""
+    with np.errstate(over='ignore'):
+        z = codes.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(32)).astype(np.uint32)
+
+
+def name_shingles(names, chunk_size=50000):
+    """(indptr, hashes) of the character 3-grams of normalized names, in CSR layout.
+
+    Names are padded with a space so their first and last letters count.
+    Each 3-gram's code points are packed into one integer and hashed, so no
+    per-gram strings are made.
+    """
+    hashes, counts = [], []
+    for start in range(0, len(names), chunk_size):
+        padded = np.array([f" {name} " for name in names[start:start + chunk_size]], dtype=str)
+        width = max(padded.dtype.itemsize // 4, 3)
+        chars = np.zeros((len(padded), width), dtype=np.uint64)
+        chars[:, :padded.dtype.itemsize // 4] = padded.view(np.uint32).reshape(len(padded), -1)
+        n_grams = np.maximum(np.char.str_len(padded) - 2, 1)
+        # Code points are below 2**21, so three fit in 63 bits
+        codes = (chars[:, :-2] << np.uint64(42)) | (chars[:, 1:-1] << np.uint64(21)) | chars[:, 2:]
+        hashes.append(_hash32(codes[np.arange(width - 2) < n_grams[:, None]]))
+        counts.append(n_grams)
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(counts)]), np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint32)
+
+
+def feature_shingles(category, genres):
+    """Category and genre tokens of a listing."""
+    return {f"#category:{category}"} | {f"#genre:{genre}" for genre in str(genres).split(';')}
+
+
+def _take_rows(indptr, values, rows):
+    """(indptr, values) of the given rows of a CSR layout; rows may repeat."""
+    lengths = np.diff(indptr)[rows]
+    taken = np.concatenate([[0], np.cumsum(lengths)])
+    positions = np.arange(taken[-1]) - np.repeat(taken[:-1] - indptr[rows], lengths)
+    return taken, values[positions]
+
+
+def shingle_sets(data):
+    """(indptr, hashes, variants) of the catalog rows.
+
+    ``hashes[indptr[i]:indptr[i + 1]]`` are row i's sorted, unique 32-bit
+    shingle hashes; ``variants`` hashes each row's variant_key. Each
+    distinct name and category/genres pair is shingled once.
+    """
+    n_rows = len(data)
+    raw_ids, raw_names = pd.factorize(data['App'].astype(str))
+    normalized_ids, names = pd.factorize(pd.Series([normalize_name(name) for name in raw_names], dtype=object))
+    name_ids = normalized_ids[raw_ids]
+    categories = data['Category'].astype(str) if 'Category' in data.columns else pd.Series([''] * n_rows)
+    genres = data['Genres'].astype(str) if 'Genres' in data.columns else pd.Series([''] * n_rows)
+    feature_ids, features = pd.MultiIndex.from_arrays([categories.to_numpy(), genres.to_numpy()]).factorize()
+
+    feature_sets = [feature_shingles(*pair) for pair in features]
+    feature_indptr = np.concatenate([[0], np.cumsum([len(tokens) for tokens in feature_sets])]).astype(np.int64)
+    feature_hashes = pd.util.hash_array(np.array([token for tokens in feature_sets for token in tokens], dtype=object))
+    name_indptr, name_hashes = _take_rows(*name_shingles(names), name_ids)
+    feature_indptr, feature_hashes = _take_rows(feature_indptr, (feature_hashes >> np.uint64(32)).astype(np.uint32),
+                                                feature_ids)
+    rows = np.concatenate([np.repeat(np.arange(n_rows, dtype=np.uint64), np.diff(name_indptr)),
+                           np.repeat(np.arange(n_rows, dtype=np.uint64), np.diff(feature_indptr))])
+    # One sort of (row, hash) keys orders each row's hashes and drops repeats
+    keys = np.sort((rows << np.uint64(32)) | np.concatenate([name_hashes, feature_hashes]).astype(np.uint64))
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount((keys >> np.uint64(32)).astype(np.int64), minlength=n_rows))])
+    variants = pd.util.hash_array(np.array([variant_key(name) for name in names], dtype=object))[name_ids]
+    return indptr, (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32), variants
+
+
+def band_keys(indptr, hashes, bands, rows_per_band, seed=0):
+    """One 64-bit key per row and LSH band, shape (bands, n_rows).
+
+    Each key combines ``rows_per_band`` MinHash values; the full signature
+    is never held, so memory is one key per row and band.
+    """
+    rng = np.random.RandomState(seed)
+    values = hashes.astype(np.uint64)
+    starts = indptr[:-1]
+    keys = np.empty((bands, len(starts)), dtype=np.uint64)
+    # Multiply-shift hashing, h -> high 32 bits of (a*h + b) mod 2**64 with odd a
+    multipliers = rng.randint(0, 2 ** 63, size=bands * rows_per_band, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+    offsets = rng.randint(0, 2 ** 63, size=bands * rows_per_band, dtype=np.int64).astype(np.uint64)
+    with np.errstate(over='ignore'):
+        for band in range(bands):
+            key = np.zeros(len(starts), dtype=np.uint64)
+            for i in range(band * rows_per_band, (band + 1) * rows_per_band):
+                minhash = np.minimum.reduceat((multipliers[i] * values + offsets[i]) >> np.uint64(32), starts)
+                key = key * _KEY_MULTIPLIER + minhash
+            keys[band] = key
+    return keys
+
+
+def candidate_pairs(keys):
+    """Unique (first, other) row pairs that share a key in some band.
+
+    Rows with the same key are paired with the first of them rather than
+    with each other, so a large bucket adds linearly many pairs.
+    """
+    n_rows = keys.shape[1]
+    pairs = []
+    for band_key in keys:
+        order = np.argsort(band_key, kind='stable')
+        sorted_keys = band_key[order]
+        starts = np.ones(n_rows, dtype=bool)
+        starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        first = order[np.maximum.accumulate(np.where(starts, np.arange(n_rows), 0))]
+        linked = ~starts
+        pairs.append(np.minimum(first[linked], order[linked]) * n_rows + np.maximum(first[linked], order[linked]))
+    pairs = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int64)
+    return pairs // n_rows, pairs % n_rows
+
+
+def jaccard(indptr, hashes, left, right, chunk_size=100000):
+    """Exact Jaccard similarity of the shingle sets of each (left, right) row pair."""
+    sizes = np.diff(indptr)
+    similarity = np.empty(len(left))
+    for start in range(0, len(left), chunk_size):
+        lo, ro = left[start:start + chunk_size], right[start:start + chunk_size]
+        pairs = np.arange(len(lo), dtype=np.uint64)
+        values = np.concatenate([_take_rows(indptr, hashes, lo)[1], _take_rows(indptr, hashes, ro)[1]])
+        pair_ids = np.concatenate([np.repeat(pairs, sizes[lo]), np.repeat(pairs, sizes[ro])])
+        # Sets are unique, so a (pair, hash) key seen twice is in both sets
+        keys = np.sort((pair_ids << np.uint64(32)) | values.astype(np.uint64))
+        shared = keys[1:][keys[1:] == keys[:-1]] >> np.uint64(32)
+        intersection = np.bincount(shared.astype(np.int64), minlength=len(lo))
+        similarity[start:start + len(lo)] = intersection / (sizes[lo] + sizes[ro] - intersection)
+    return similarity
+
+
+def duplicate_representatives(data, threshold=None, bands=None, rows_per_band=None, seed=0):
+    """Representative row of every catalog row; rows that are not duplicates represent themselves."""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+    bands = bands or Config.DEDUP_BANDS
+    rows_per_band = rows_per_band or Config.DEDUP_ROWS_PER_BAND
+    n_rows = len(data)
+    if n_rows < 2:
+        return np.arange(n_rows)
+
+    indptr, hashes, variants = shingle_sets(data)
+    left, right = candidate_pairs(band_keys(indptr, hashes, bands, rows_per_band, seed))
+    n_candidates = len(left)
+    # Sequels and editions ('Racing 2', 'Notes Pro') are different apps however similar the names
+    same_variant = variants[left] == variants[right]
+    left, right = left[same_variant], right[same_variant]
+    similar = jaccard(indptr, hashes, left, right) >= threshold
+    left, right = left[similar], right[similar]
+    logger.info(f"{n_candidates} candidate pairs from {bands}x{rows_per_band} LSH bands, {len(left)} near-duplicates")
+
+    graph = coo_matrix((np.ones(len(left), dtype=np.int8), (left, right)), shape=(n_rows, n_rows))
+    _, labels = connected_components(graph, directed=False)
+    # The most reviewed row of a cluster represents it; the first one on ties
+    reviews = pd.to_numeric(data['Reviews'], errors='coerce').fillna(0).to_numpy() if 'Reviews' in data.columns \
+        else np.zeros(n_rows)
+    order = np.lexsort((np.arange(n_rows), -reviews, labels))
+    first = np.ones(n_rows, dtype=bool)
+    first[1:] = labels[order][1:] != labels[order][:-1]
+    representative_of_label = np.empty(labels.max() + 1, dtype=np.int64)
+    representative_of_label[labels[order][first]] = order[first]
+    return representative_of_label[labels]
+
+
+def collapse_duplicates(data, threshold=None):
+    """(catalog with one row per near-duplicate cluster, cluster map of the dropped rows).
+
+    The cluster map has the dropped row's App name and the App name and row
+    of its representative in the returned catalog.
+    """
+    representatives = duplicate_representatives(data, threshold)
+    keep = representatives == np.arange(len(data))
+    new_rows = np.cumsum(keep) - 1
+    dropped = np.flatnonzero(~keep)
+    names = data['App']
+    duplicates = pd.DataFrame({
+        'App': names.iloc[dropped].to_numpy(),
+        'Representative': names.iloc[representatives[dropped]].to_numpy(),
+        'Row': new_rows[representatives[dropped]]
+    })
+    if len(dropped):
+        logger.info(f"Collapsed {len(dropped)} near-duplicate listings into "
+                    f"{len(np.unique(representatives[dropped]))} representatives; {int(keep.sum())} apps remain")
+    return data[keep].reset_index(drop=True), duplicates
+
+
+def duplicate_aliases(data, duplicates):
+    """Lowercase names of dropped listings mapped to their representative's row.
+
+    Names that a kept row also has resolve to that row instead.
+    """
+    kept = set(data['App'].astype(str).str.lower())
+    aliases = {}
+    for name, row in zip(duplicates['App'].astype(str).str.lower(), duplicates['Row'].tolist()):
+        if name not in kept:
+            aliases.setdefault(name, int(row))
+    return aliases
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import load_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate catalog listings and write the cluster map")
+    parser.add_argument('--output', required=True, help="CSV of dropped listings and their representatives")
+    parser.add_argument('--catalog', help="Catalog CSV to read instead of the configured one")
+    parser.add_argument('--catalog-output', help="Also write the collapsed catalog to this CSV")
+    parser.add_argument('--threshold', type=float, default=Config.DEDUP_THRESHOLD, help="Minimum Jaccard similarity")
+    args = parser.parse_args()
+
+    catalog = load_catalog([args.catalog] if args.catalog else None)
+    if catalog is None:
+        raise SystemExit("No catalog data found")
+    collapsed, duplicates = collapse_duplicates(catalog, args.threshold)
+    duplicates.to_csv(args.output, index=False)
+    if args.catalog_output:
+        collapsed.to_csv(args.catalog_output, index=False)
+    print(f"{len(catalog)} listings, {len(duplicates)} near-duplicates, {len(collapsed)} apps kept")
@@ -0,0 +1,101 @@
+"""
+Ranking agreement report for choosing the SVD embedding size.
+
+``python -m app.embeddings --dims 64 128 256`` builds an ``EmbeddingIndex``
+per size over the current catalog and compares its top-k lists against
+exact sparse cosine scoring. Save the chosen size with
+``python -m app.index --engine svd --dims K``.
+"""
+import json
+import time
+import logging
+import numpy as np
+from app.index import ExactIndex, EmbeddingIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _ndcg(exact_scores_of_found, exact_top_scores):
+    """NDCG of a ranking, using exact cosine scores as gains."""
+    discounts = 1.0 / np.log2(np.arange(2, len(exact_top_scores) + 2))
+    ideal = float(np.sum(exact_top_scores * discounts))
+    if ideal <= 0:
+        return 1.0
+    return float(np.sum(exact_scores_of_found * discounts[:len(exact_scores_of_found)]) / ideal)
+
+
+def agreement_report(features, dims_list, k=10, n_queries=500, seed=0):
+    """Compare SVD embeddings of several sizes against exact scoring.
+
+    For each size the report gives recall@k (overlap of the top-k sets),
+    top-1 agreement, NDCG@k of the embedding ranking under exact scores,
+    the share of squared norm the projection keeps, its size in memory and
+    build and per-query times.
+    """
+    exact = ExactIndex(features)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(exact.n_rows, size=min(n_queries, exact.n_rows), replace=False)
+
+    start_time = time.perf_counter()
+    expected = [exact.search(features[row], k) for row in rows]
+    exact_query_ms = (time.perf_counter() - start_time) * 1000 / len(rows)
+
+    results = []
+    for dims in dims_list:
+        start_time = time.perf_counter()
+        index = EmbeddingIndex(features, n_components=dims, seed=seed)
+        build_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        found = [index.search(features[row], k) for row in rows]
+        query_ms = (time.perf_counter() - start_time) * 1000 / len(rows)
+
+        recalls, top1, ndcgs = [], [], []
+        for row, exp, got in zip(rows, expected, found):
+            recalls.append(len(set(exp.indices.tolist()) & set(got.indices.tolist())) / len(exp.indices))
+            top1.append(exp.indices[0] == got.indices[0])
+            ndcgs.append(_ndcg(exact.score_rows(features[row], got.indices), exp.scores))
+
+        results.append({
+            'dims': index.n_components,
+            'recall_at_k': round(float(np.mean(recalls)), 4),
+            'top1_agreement': round(float(np.mean(top1)), 4),
+            'ndcg_at_k': round(float(np.mean(ndcgs)), 4),
+            'explained_variance': round(index.explained_variance, 4),
+            'embedding_mb': round(index.embedding.nbytes / 2 ** 20, 2),
+            'build_seconds': round(build_seconds, 3),
+            'query_ms': round(query_ms, 4)
+        })
+        logger.info(f"dims={index.n_components}: {results[-1]}")
+
+    return {
+        'k': k,
+        'n_queries': len(rows),
+        'n_rows': exact.n_rows,
+        'n_features': features.shape[1],
+        'exact_query_ms': round(exact_query_ms, 4),
+        'sparse_features_mb': round((features.data.nbytes + features.indices.nbytes + features.indptr.nbytes) / 2 ** 20, 2),
+        'embeddings': results
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import AppRecommender
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Report SVD embedding ranking agreement with exact scoring")
+    parser.add_argument('--dims', type=int, nargs='+', default=[32, 64, 128, 256])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    recommender = AppRecommender()
+    report = agreement_report(recommender.features, args.dims, k=args.k, n_queries=args.queries)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
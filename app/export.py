@@ -0,0 +1,277 @@
+"""
+Offline recommendations for every catalog app.
+
+    python -m app.export --output recommendations.ndjson [--count 20] [--mode content] [--jobs 4]
+
+writes the top ``count`` recommendations of each app, ranked and
+de-duplicated exactly as ``AppRecommender.get_recommendations`` ranks
+them, as NDJSON (one app per line), Parquet or a SQLite lookup table (one
+row per app and rank). The format follows the output extension unless
+``--format`` is given. /api/export streams the same NDJSON over HTTP.
+
+With the exact engine a block of apps is scored with one sparse-dense
+product of at most ``EXPORT_BLOCK_MB``; other engines, default feature
+block weights and hybrid blending go through the index per app, as the
+API does. Blocks are written as soon as they are ranked, so memory stays
+bounded by a few blocks whatever the catalog size. ``--jobs`` ranks blocks
+in forked worker processes that share the recommender with the parent.
+"""
+import os
+import math
+import json
+import time
+import logging
+import sqlite3
+import multiprocessing
+from collections import deque
+import numpy as np
+from app.config import Config
+from app.index import ExactIndex, SearchResult, _top_k
+
+logger = logging.getLogger(__name__)
+
+MB = 2 ** 20
+
+EXPORT_FORMATS = ('ndjson', 'parquet', 'sqlite')
+
+# Columns of the Parquet and SQLite exports: one row per app and rank
+FLAT_COLUMNS = ('app', 'rank', 'recommended_app', 'category', 'rating', 'predicted_rating')
+
+# Recommender shared with forked workers; set only while a pool is running
+_worker_state = None
+
+
+def export_rows(recommender):
+    """Catalog rows to export: the first row of each name, the one /api/recommend resolves."""
+    return np.flatnonzero(~recommender.data['App'].duplicated().to_numpy())
+
+
+def default_block_size(recommender):
+    """Rows per block so a block's dense score matrix stays within EXPORT_BLOCK_MB."""
+    row_bytes = recommender.features.shape[0] * recommender.features.dtype.itemsize
+    return max(1, int(Config.EXPORT_BLOCK_MB * MB // row_bytes))
+
+
+def rank_block(recommender, rows, count, mode='content'):
+    """(row, recommended rows) for each catalog row of a block."""
+    weights = getattr(recommender, 'default_block_weights', None)
+    if recommender.index.name != ExactIndex.name or weights is not None:
+        return [(row, recommender._rank(row, count, mode, weights=weights)[0]) for row in rows]
+
+    # Scores against every row for the whole block at once; column j holds
+    # exactly what the exact index computes for rows[j]
+    features = recommender.features
+    scores = features @ features[rows].T.toarray()
+    all_rows = np.arange(features.shape[0])
+    ranked = []
+    for j, row in enumerate(rows):
+        column = scores[:, j]
+        search = lambda fetch, column=column: SearchResult(*_top_k(all_rows, column, fetch), ExactIndex.name)
+        ranked.append((row, recommender._rank(row, count, mode, search=search)[0]))
+    return ranked
+
+
+def _rank_block_in_worker(rows):
+    recommender, count, mode = _worker_state
+    return [(int(row), [int(r) for r in recommended]) for row, recommended in rank_block(recommender, rows, count, mode)]
+
+
+def _ranked_blocks(recommender, blocks, count, mode, jobs):
+    """Ranked blocks in order, from ``jobs`` forked workers when more than one."""
+    global _worker_state
+    # Forked workers cannot reach the shard workers of a sharded index (app.shards)
+    sharded = getattr(recommender.index, 'name', None) == 'sharded'
+    if jobs <= 1 or sharded or 'fork' not in multiprocessing.get_all_start_methods():
+        for block in blocks:
+            yield rank_block(recommender, block, count, mode)
+        return
+
+    _worker_state = (recommender, count, mode)
+    try:
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            # A few blocks in flight per worker keeps them busy without
+            # queueing more results than the writer has taken
+            pending = deque()
+            for block in blocks:
+                pending.append(pool.apply_async(_rank_block_in_worker, (block,)))
+                if len(pending) >= 2 * jobs:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+    finally:
+        _worker_state = None
+
+
+def _clean(value):
+    # NaN is not valid JSON and reads back from SQLite as NULL anyway
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def iter_recommendations(recommender, count=20, mode='content', jobs=1, block_size=None):
+    """Yield (app name, recommendation records) for every exported app in catalog order.
+
+    Records have the fields of the /api/recommend response.
+    """
+    if mode == 'hybrid' and getattr(recommender, 'cf_neighbors', None) is None:
+        logger.warning("Hybrid mode requested but no collaborative neighbors are loaded; using content scores")
+        mode = 'content'
+    data = recommender.data
+    fields = ['App', 'Category', 'Rating'] + (['Predicted Rating'] if 'Predicted Rating' in data.columns else [])
+    # Column lists are far cheaper to index per app than DataFrame rows
+    columns = {field: [_clean(value) for value in data[field].tolist()] for field in fields}
+    names = columns['App']
+
+    rows = export_rows(recommender)
+    block_size = block_size or default_block_size(recommender)
+    blocks = (rows[start:start + block_size] for start in range(0, len(rows), block_size))
+    for block in _ranked_blocks(recommender, blocks, count, mode, jobs):
+        for row, recommended in block:
+            yield names[row], [{field: columns[field][r] for field in fields} for r in recommended]
+
+
+def ndjson_lines(recommendations):
+    """One JSON line per app: {"app": ..., "recommendations": [...]}."""
+    for app, records in recommendations:
+        yield json.dumps({'app': app, 'recommendations': records}) + '\n'
+
+
+def flat_rows(app, records):
+    """Rows of the tabular exports for one app, in FLAT_COLUMNS order."""
+    return [(app, rank, record['App'], record['Category'], record['Rating'], record.get('Predicted Rating'))
+            for rank, record in enumerate(records, start=1)]
+
+
+class NDJSONWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, app, records):
+        self.file.write(json.dumps({'app': app, 'recommendations': records}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteWriter:
+    """Lookup table keyed by (app, rank): ``SELECT ... WHERE app = ? ORDER BY rank``."""
+
+    def __init__(self, path, batch_size=10000):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(
+            'CREATE TABLE recommendations (app TEXT NOT NULL, rank INTEGER NOT NULL, recommended_app TEXT NOT NULL, '
+            'category TEXT, rating REAL, predicted_rating REAL, PRIMARY KEY (app, rank)) WITHOUT ROWID')
+        self.batch_size = batch_size
+        self.batch = []
+
+    def write(self, app, records):
+        self.batch.extend(flat_rows(app, records))
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        self.connection.executemany(f"INSERT INTO recommendations VALUES ({', '.join('?' * len(FLAT_COLUMNS))})",
+                                    self.batch)
+        self.connection.commit()
+        self.batch = []
+
+    def close(self):
+        self._flush()
+        self.connection.close()
+
+
+class ParquetWriter:
+    """Parquet file written one row group per batch; needs pyarrow."""
+
+    def __init__(self, path, batch_size=100000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow; install it or export to NDJSON or SQLite")
+        self.pa = pa
+        self.schema = pa.schema([('app', pa.string()), ('rank', pa.int16()), ('recommended_app', pa.string()),
+                                 ('category', pa.string()), ('rating', pa.float64()),
+                                 ('predicted_rating', pa.float64())])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.batch = []
+
+    def write(self, app, records):
+        self.batch.extend(flat_rows(app, records))
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            columns = dict(zip(FLAT_COLUMNS, zip(*self.batch)))
+            self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+WRITERS = {'ndjson': NDJSONWriter, 'parquet': ParquetWriter, 'sqlite': SQLiteWriter}
+
+
+def export_format(path):
+    """Format named by an output file's extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    formats = {'ndjson': 'ndjson', 'jsonl': 'ndjson', 'parquet': 'parquet', 'sqlite': 'sqlite', 'db': 'sqlite'}
+    if extension not in formats:
+        raise ValueError(f"Cannot tell the export format from '{path}'; use --format with one of {', '.join(EXPORT_FORMATS)}")
+    return formats[extension]
+
+
+def export_recommendations(recommender, path, output_format=None, count=20, mode='content', jobs=1, block_size=None):
+    """Write every app's recommendations to ``path`` and return the number of apps.
+
+    The file is written next to ``path`` and moved into place when complete,
+    so readers of a daily export never see a partial file.
+    """
+    output_format = output_format or export_format(path)
+    start_time = time.perf_counter()
+    temporary = f"{path}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    writer = WRITERS[output_format](temporary)
+    n_apps = 0
+    try:
+        for app, records in iter_recommendations(recommender, count, mode, jobs, block_size):
+            writer.write(app, records)
+            n_apps += 1
+            if n_apps % 100000 == 0:
+                logger.info(f"Exported {n_apps} apps in {time.perf_counter() - start_time:.1f}s")
+    except BaseException:
+        # Leave no partial file behind
+        writer.close()
+        os.remove(temporary)
+        raise
+    writer.close()
+    os.replace(temporary, path)
+    logger.info(f"Exported recommendations for {n_apps} apps to {path} in {time.perf_counter() - start_time:.1f}s")
+    return n_apps
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import AppRecommender, RECOMMENDATION_MODES, load_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Export recommendations for every catalog app")
+    parser.add_argument('--output', required=True, help="Output file (.ndjson, .parquet or .sqlite)")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, help="Output format; defaults to the output extension")
+    parser.add_argument('--count', type=int, default=Config.MAX_RECOMMENDATIONS, help="Recommendations per app")
+    parser.add_argument('--mode', choices=RECOMMENDATION_MODES, default='content')
+    parser.add_argument('--jobs', type=int, default=Config.EXPORT_JOBS, help="Worker processes; -1 uses every core")
+    parser.add_argument('--catalog', help="Catalog CSV to load instead of the configured one")
+    args = parser.parse_args()
+
+    data = load_catalog([args.catalog]) if args.catalog else None
+    recommender = AppRecommender(data=data)
+    jobs = os.cpu_count() if args.jobs < 0 else args.jobs
+    export_recommendations(recommender, args.output, args.format, args.count, args.mode, jobs)
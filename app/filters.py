@@ -0,0 +1,154 @@
+"""
+Precomputed catalog masks for constrained recommendations.
+
+Masks are built once per catalog and stored bit-packed (one bit per app).
+A filtered query ANDs the masks it needs and unpacks the result into a
+boolean row mask that the scoring index applies before top-k selection, so
+results are never thinned out after ranking.
+"""
+import math
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Request parameter -> catalog column for equality filters
+FILTER_COLUMNS = {
+    'category': 'Category',
+    'type': 'Type',
+    'content_rating': 'Content Rating',
+    'genre': 'Genres',
+}
+FILTER_PARAMS = tuple(FILTER_COLUMNS) + ('min_rating',)
+
+# min_rating is answered from cumulative masks at this resolution
+RATING_STEP = 0.1
+MAX_RATING = 5.0
+
+
+def _key(value):
+    return str(value).strip().casefold()
+
+
+class CatalogMasks:
+    """Bit-packed masks per Category, Type, Content Rating, genre and rating threshold."""
+
+    def __init__(self, data):
+        self.n_rows = len(data)
+        self.masks = {}
+        for param, column in FILTER_COLUMNS.items():
+            if column not in data.columns:
+                logger.warning(f"Column {column} not in catalog; '{param}' filters will match nothing")
+                self.masks[param] = {}
+                continue
+            values = data[column].fillna('')
+            if param == 'genre':
+                # Genres is a ';'-separated list, so mask each genre separately
+                values = values.astype(str).str.split(';')
+                exploded = values.explode()
+                self.masks[param] = self._value_masks(exploded.index.to_numpy(), exploded.to_numpy())
+            else:
+                self.masks[param] = self._value_masks(np.arange(self.n_rows), values.to_numpy())
+
+        ratings = pd.to_numeric(data['Rating'], errors='coerce').to_numpy() if 'Rating' in data.columns else np.full(self.n_rows, np.nan)
+        self.rating_thresholds = np.round(np.arange(0, MAX_RATING + RATING_STEP / 2, RATING_STEP), 1)
+        # Apps without a numeric rating fail every threshold (NaN comparisons are False)
+        self.rating_masks = np.stack([np.packbits(ratings >= t - 1e-9) for t in self.rating_thresholds])
+
+    def _value_masks(self, rows, values):
+        keys = pd.Series(values, dtype=object).map(_key)
+        codes, uniques = pd.factorize(keys)
+        # Group rows by value code in one sort instead of one scan per value
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        masks = {}
+        for code, key in enumerate(uniques):
+            if key == '':
+                continue
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[rows[order[bounds[code]:bounds[code + 1]]]] = True
+            masks[key] = np.packbits(mask)
+        return masks
+
+    @property
+    def nbytes(self):
+        total = self.rating_masks.nbytes
+        for masks in self.masks.values():
+            total += sum(mask.nbytes for mask in masks.values())
+        return total
+
+    def values(self, param):
+        """Distinct (casefolded) values that can be filtered on for a parameter."""
+        return sorted(self.masks.get(param, {}))
+
+    def _packed_value_mask(self, param, values):
+        """OR of the masks of one or more values of a parameter."""
+        packed = None
+        for value in values:
+            mask = self.masks[param].get(_key(value))
+            if mask is None:
+                continue
+            packed = mask.copy() if packed is None else np.bitwise_or(packed, mask, out=packed)
+        if packed is None:
+            # Unknown values match no apps
+            packed = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        return packed
+
+    def mask(self, filters):
+        """Boolean row mask for a filter dict, or None when nothing is filtered.
+
+        Equality filters accept a string or a list of values (any may match);
+        different filters must all match.
+        """
+        packed = None
+        for param in FILTER_COLUMNS:
+            values = filters.get(param)
+            if values is None or values == '' or values == []:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            value_mask = self._packed_value_mask(param, values)
+            packed = value_mask if packed is None else np.bitwise_and(packed, value_mask, out=packed)
+
+        min_rating = filters.get('min_rating')
+        if min_rating is not None:
+            # Round up to the mask resolution; ratings have one decimal place
+            step = int(np.ceil(round(float(min_rating) / RATING_STEP, 6)))
+            if step >= len(self.rating_thresholds):
+                rating_mask = np.zeros_like(self.rating_masks[0])
+            else:
+                rating_mask = self.rating_masks[max(step, 0)]
+            packed = rating_mask.copy() if packed is None else np.bitwise_and(packed, rating_mask, out=packed)
+
+        if packed is None:
+            return None
+        return np.unpackbits(packed, count=self.n_rows).astype(bool)
+
+
+def parse_filters(source):
+    """Read filter parameters from request args or a JSON body.
+
+    Comma-separated strings are split into lists. Raises ValueError for a
+    min_rating that is not a finite number and for values that are neither
+    a string nor a list of strings.
+    """
+    filters = {}
+    for param in FILTER_COLUMNS:
+        value = source.get(param)
+        if value is None or value == '':
+            continue
+        if isinstance(value, str):
+            value = [part.strip() for part in value.split(',') if part.strip()]
+        elif not isinstance(value, list) or not all(isinstance(part, str) for part in value):
+            raise ValueError(f"{param} must be a string or a list of strings, got '{value}'")
+        filters[param] = value
+    min_rating = source.get('min_rating')
+    if min_rating not in (None, ''):
+        try:
+            filters['min_rating'] = float(min_rating)
+        except (TypeError, ValueError):
+            raise ValueError(f"min_rating must be a number, got '{min_rating}'")
+        if not math.isfinite(filters['min_rating']):
+            raise ValueError(f"min_rating must be a finite number, got '{min_rating}'")
+    return filters
@@ -0,0 +1,225 @@
+"""
+Compiled tree-ensemble inference for the rating model.
+
+A fitted scikit-learn forest is flattened into contiguous node arrays
+(feature, threshold, left, right, value) with one root offset per tree.
+``CompiledForest.predict`` then advances every (row, tree) pair one level
+per step with vectorized gathers, dropping pairs as they reach a leaf. A
+small batch costs about max_depth small array operations instead of one
+call per tree through scikit-learn; large batches are faster in
+scikit-learn's compiled loops, which ``latency_report`` shows.
+
+``save_model.py`` writes the compiled forest next to the pickled model and
+``python -m app.forest`` benchmarks it against ``model.predict``.
+"""
+import os
+import time
+import logging
+import numpy as np
+from scipy.sparse import issparse, csr_matrix
+
+logger = logging.getLogger(__name__)
+
+
+def _sibling_order(children_left, children_right):
+    """Breadth-first node order in which every pair of children is adjacent."""
+    levels = [np.array([0])]
+    frontier = levels[0]
+    while len(frontier):
+        internal = frontier[children_left[frontier] >= 0]
+        frontier = np.column_stack([children_left[internal], children_right[internal]]).ravel()
+        levels.append(frontier)
+    return np.concatenate(levels)
+
+
+class CompiledForest:
+    """Flat-array regression forest whose predictions match the fitted scikit-learn model.
+
+    ``right`` must equal ``left + 1`` for internal nodes (see ``from_sklearn``);
+    leaves have ``left == right == -1``.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, n_features, model_digest=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.n_features = int(n_features)
+        # sha1 of the model pickle this forest was compiled from, when known
+        self.model_digest = model_digest
+        self.is_leaf = self.left < 0
+        if np.any(self.right[~self.is_leaf] != self.left[~self.is_leaf] + 1):
+            raise ValueError("Right children must directly follow their left siblings")
+
+        # Only columns some split uses are gathered from the input
+        self.columns = np.unique(self.feature[~self.is_leaf]).astype(np.int32)
+        self.column_position = np.full(self.n_features, -1, dtype=np.int64)
+        self.column_position[self.columns] = np.arange(len(self.columns))
+        self.split_column = np.where(self.is_leaf, 0, self.column_position[self.feature]).astype(np.int32)
+        # scikit-learn compares float32 inputs with float64 thresholds; rounding each
+        # threshold down to float32 gives the same decisions with float32 compares
+        threshold32 = self.threshold.astype(np.float32)
+        rounded_up = threshold32.astype(np.float64) > self.threshold
+        threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+        # Leaves loop to themselves (never "greater than" +inf) so rows can take
+        # extra steps after finishing
+        nodes = np.arange(len(self.feature), dtype=np.int32)
+        self._threshold32 = np.where(self.is_leaf, np.float32(np.inf), threshold32).astype(np.float32)
+        self._left = np.where(self.is_leaf, nodes, self.left)
+
+    @classmethod
+    def from_sklearn(cls, model, model_digest=None):
+        """Flatten a fitted RandomForestRegressor (or a single regression tree).
+
+        ``model_digest``, the sha1 of the model's pickle file, is saved with
+        the forest so a retrained model is never served by a stale one.
+
+        Nodes are renumbered breadth-first with each right child stored right
+        after its left sibling, so traversal picks a child with one addition.
+        """
+        estimators = getattr(model, 'estimators_', None) or [model]
+        features, thresholds, lefts, values, roots = [], [], [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            if tree.n_outputs != 1:
+                raise ValueError("Only single-output regression forests can be compiled")
+            order = _sibling_order(tree.children_left, tree.children_right)
+            new_id = np.empty(tree.node_count, dtype=np.int64)
+            new_id[order] = np.arange(tree.node_count)
+            internal = tree.children_left[order] >= 0
+            roots.append(offset)
+            features.append(np.where(internal, tree.feature[order], 0))
+            thresholds.append(tree.threshold[order])
+            lefts.append(np.where(internal, new_id[tree.children_left[order]] + offset, -1))
+            values.append(tree.value[order, 0, 0])
+            offset += tree.node_count
+        left = np.concatenate(lefts)
+        right = np.where(left >= 0, left + 1, -1)
+        return cls(np.concatenate(features), np.concatenate(thresholds), left, right,
+                   np.concatenate(values), np.asarray(roots), model.n_features_in_, model_digest)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        arrays = (self.feature, self.threshold, self.left, self.right, self.value, self.roots,
+                  self.column_position, self.split_column, self._threshold32, self._left)
+        return sum(array.nbytes for array in arrays)
+
+    def _split_inputs(self, X):
+        """Flat row-major float32 values of the split columns for a block of rows."""
+        n_rows = X.shape[0]
+        if not issparse(X):
+            return np.ascontiguousarray(np.asarray(X)[:, self.columns], dtype=np.float32).ravel()
+        X = csr_matrix(X)
+        positions = self.column_position[X.indices]
+        rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(X.indptr))
+        used = positions >= 0
+        inputs = np.zeros(n_rows * len(self.columns), dtype=np.float32)
+        inputs[rows[used] * len(self.columns) + positions[used]] = X.data[used]
+        return inputs
+
+    def predict(self, X, chunk_size=1024):
+        """Mean leaf value over all trees for each row of ``X`` (sparse or dense)."""
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features but the forest was fitted with {self.n_features}")
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_size):
+            stop = min(start + chunk_size, X.shape[0])
+            out[start:stop] = self._predict_chunk(self._split_inputs(X[start:stop]), stop - start)
+        return out
+
+    def _predict_chunk(self, inputs, n_rows, steps_per_check=16):
+        nodes = np.tile(self.roots, n_rows)
+        offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * len(self.columns), self.n_trees)
+        active = np.arange(len(nodes))
+        current = nodes
+        while len(active):
+            # Several levels per leaf check; finished pairs stay on their leaf
+            for _ in range(steps_per_check):
+                go_right = inputs[offsets + self.split_column[current]] > self._threshold32[current]
+                current = self._left[current] + go_right
+            nodes[active] = current
+            unfinished = ~self.is_leaf[current]
+            active, current, offsets = active[unfinished], current[unfinished], offsets[unfinished]
+        return self.value[nodes].reshape(n_rows, self.n_trees).mean(axis=1)
+
+    def save(self, path):
+        """Write the node arrays, and the model digest if known, to an uncompressed ``.npz`` file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        extra = {'model_digest': self.model_digest} if self.model_digest is not None else {}
+        with open(path, 'wb') as f:
+            np.savez(f, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                     value=self.value, roots=self.roots, n_features=self.n_features, **extra)
+        logger.info(f"Saved compiled forest ({self.n_trees} trees, {self.n_nodes} nodes) to {path}")
+
+    @classmethod
+    def load(cls, path):
+        """Read a forest written by ``save``."""
+        with np.load(path) as arrays:
+            model_digest = str(arrays['model_digest']) if 'model_digest' in arrays.files else None
+            return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'],
+                       arrays['roots'], int(arrays['n_features']), model_digest)
+
+
+def latency_report(model, forest, X, batch_sizes=(1, 10, 100, 1000, 10000), repeats=5, seed=0):
+    """Median per-call latency of ``model.predict`` and ``forest.predict`` per batch size."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for batch_size in batch_sizes:
+        rows = rng.choice(X.shape[0], size=min(batch_size, X.shape[0]), replace=False)
+        batch = X[rows]
+        timings = {}
+        for name, predict in (('sklearn', model.predict), ('compiled', forest.predict)):
+            samples = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                predictions = predict(batch)
+                samples.append(time.perf_counter() - start_time)
+            timings[name] = (float(np.median(samples)) * 1000, predictions)
+        results.append({
+            'batch_size': len(rows),
+            'sklearn_ms': round(timings['sklearn'][0], 3),
+            'compiled_ms': round(timings['compiled'][0], 3),
+            'speedup': round(timings['sklearn'][0] / timings['compiled'][0], 2),
+            'max_abs_diff': float(np.max(np.abs(timings['sklearn'][1] - timings['compiled'][1])))
+        })
+        logger.info(f"batch {len(rows)}: {results[-1]}")
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    import argparse
+    import pickle
+    from app.config import Config
+    from app.recommender import AppRecommender
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Benchmark compiled forest inference against model.predict")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    with open(Config.MODEL_PATH, 'rb') as f:
+        model = pickle.load(f)
+    model.n_jobs = 1
+    recommender = AppRecommender(model=model)
+    X = recommender._combine_features(recommender.data)
+    report = latency_report(model, CompiledForest.from_sklearn(model), X, args.batch_sizes, args.repeats)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
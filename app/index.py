@@ -0,0 +1,466 @@
+"""
+Nearest-neighbor indexes over the combined, row-normalized feature matrix.
+
+``ExactIndex`` scores every catalog row per query. ``LSHIndex`` is a
+random-projection LSH index that only scores the rows that share a bucket
+with the query in at least one table, which keeps per-query cost roughly
+constant as the catalog grows. ``EmbeddingIndex`` scores a dense SVD
+projection of the features. All take queries in the combined feature space
+and return a ``SearchResult`` naming the engine that answered.
+
+Run ``python -m app.index`` to build the configured index for the current
+catalog and save it under ``Config.INDEX_DIR``.
+"""
+import os
+import json
+import time
+import logging
+from collections import namedtuple
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+from app.config import Config
+from app.quantization import validate_precision, float_dtype, quantize_rows, quantized_matvec
+
+logger = logging.getLogger(__name__)
+
+SearchResult = namedtuple('SearchResult', ['indices', 'scores', 'engine'])
+
+INDEX_ENGINES = ('exact', 'lsh', 'svd')
+
+# Masks allowing fewer than 1/MASK_SUBSET_RATIO of the rows are scored row by row
+MASK_SUBSET_RATIO = 8
+
+
+def _top_k(indices, scores, k):
+    """Return the k highest-scoring (indices, scores) in descending order.
+
+    Equal scores go to the lower index, so top-k results of disjoint row
+    ranges merge into exactly the top-k of all rows (see app.shards).
+    """
+    if len(scores) > k:
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)
+        need = k - len(above)
+        if len(tied) > need:
+            tied = tied[np.argpartition(indices[tied], need - 1)[:need]] if need > 0 else tied[:0]
+        top = np.concatenate([above, tied])
+        indices, scores = indices[top], scores[top]
+    order = np.lexsort((indices, -scores))
+    return indices[order], scores[order]
+
+
+def save_features(features, directory):
+    """Save a CSR matrix as separate ``.npy`` arrays so it can be memory-mapped."""
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'features_data.npy'), features.data)
+    np.save(os.path.join(directory, 'features_indices.npy'), features.indices)
+    np.save(os.path.join(directory, 'features_indptr.npy'), features.indptr)
+
+
+def load_features(directory, shape, mmap=True):
+    """Load a CSR matrix written by ``save_features``, memory-mapped by default."""
+    mmap_mode = 'r' if mmap else None
+    data = np.load(os.path.join(directory, 'features_data.npy'), mmap_mode=mmap_mode)
+    indices = np.load(os.path.join(directory, 'features_indices.npy'), mmap_mode=mmap_mode)
+    indptr = np.load(os.path.join(directory, 'features_indptr.npy'), mmap_mode=mmap_mode)
+    return csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False)
+
+
+class ExactIndex:
+    """Brute-force cosine scoring against every row of the feature matrix."""
+
+    name = 'exact'
+
+    def __init__(self, features, precision=None):
+        self.precision = validate_precision(precision or Config.SERVING_PRECISION)
+        # Sparse features stay floating point; int8 only applies to dense structures
+        self.features = csr_matrix(features, dtype=float_dtype(self.precision))
+
+    @property
+    def n_rows(self):
+        return self.features.shape[0]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the index, including its feature matrix."""
+        return self.features.data.nbytes + self.features.indices.nbytes + self.features.indptr.nbytes
+
+    def _query_vector(self, query):
+        """Dense 1-D copy of a query given as a sparse row or array."""
+        if issparse(query):
+            query = query.toarray()
+        return np.asarray(query, dtype=self.features.dtype).ravel()
+
+    def score_rows(self, query, rows):
+        """Exact scores of the query against the given catalog rows."""
+        return self.features[rows] @ self._query_vector(query)
+
+    def _masked_search(self, query, k, mask, engine):
+        """Top-k among the rows allowed by a boolean mask (all rows if None).
+
+        Selective masks score only the allowed rows; broad ones score the
+        whole catalog with one product and drop the excluded rows.
+        """
+        if mask is None:
+            scores = self.score_all(query)
+            indices = np.arange(len(scores))
+        elif mask.sum() * MASK_SUBSET_RATIO < self.n_rows:
+            indices = np.flatnonzero(mask)
+            scores = self.score_rows(query, indices)
+        else:
+            scores = self.score_all(query)
+            indices = np.flatnonzero(mask)
+            scores = scores[indices]
+        indices, scores = _top_k(indices, scores, min(k, len(scores)))
+        return SearchResult(indices, scores, engine)
+
+    def score_all(self, query):
+        """Exact scores of the query against every catalog row."""
+        return self.features @ self._query_vector(query)
+
+    def exact_search(self, query, k, mask=None):
+        """Score every allowed catalog row and return the top-k."""
+        return self._masked_search(query, k, mask, ExactIndex.name)
+
+    def search(self, query, k, mask=None):
+        """Return the top-k catalog rows for a query, restricted to ``mask`` if given."""
+        return self.exact_search(query, k, mask)
+
+    def describe(self):
+        return {
+            'engine': self.name,
+            'n_rows': self.n_rows,
+            'n_features': self.features.shape[1],
+            'nnz': int(self.features.nnz),
+            'precision': self.precision,
+            'nbytes': int(self.nbytes)
+        }
+
+    def _meta(self):
+        return {'engine': self.name, 'shape': list(self.features.shape), 'precision': self.precision}
+
+    def save(self, directory, extra_meta=None):
+        """Save the index and its feature matrix under a directory."""
+        save_features(self.features, directory)
+        self._save_arrays(directory)
+        meta = dict(self._meta(), **(extra_meta or {}))
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        logger.info(f"Saved {self.name} index with {self.n_rows} rows to {directory}")
+
+    def _save_arrays(self, directory):
+        pass
+
+    @classmethod
+    def _load(cls, directory, features, meta, mmap):
+        return cls(features, precision=meta['precision'])
+
+
+class LSHIndex(ExactIndex):
+    """
+    Random-projection (SimHash) LSH index with multi-probe lookups.
+
+    Each of ``n_tables`` tables hashes a row to the sign pattern of ``n_bits``
+    random projections of the row minus the catalog mean; centering matters
+    because TF-IDF and scaled features all lie in the positive orthant, where
+    uncentered hyperplanes put nearly every row on one side. A query probes its
+    own bucket plus the ``n_probes`` buckets reached by flipping its least
+    confident bits, and the union of candidates is re-ranked with exact cosine
+    scores. More tables or probes raise recall; more bits make buckets smaller
+    and queries faster.
+    """
+
+    name = 'lsh'
+
+    def __init__(self, features, n_tables=None, n_bits=None, n_probes=None, seed=0, precision=None,
+                 planes=None, offsets=None, sorted_keys=None, order=None, build_chunk_size=65536):
+        super().__init__(features, precision)
+        self.n_tables = n_tables or Config.LSH_TABLES
+        self.n_bits = n_bits or Config.LSH_BITS
+        self.n_probes = Config.LSH_PROBES if n_probes is None else n_probes
+        if not 1 <= self.n_bits <= 32:
+            raise ValueError("n_bits must be between 1 and 32")
+        self.seed = seed
+
+        if planes is None:
+            start_time = time.time()
+            rng = np.random.default_rng(seed)
+            self.planes = rng.standard_normal((self.n_tables * self.n_bits, self.features.shape[1])).astype(np.float32)
+            self.offsets = (self.planes @ np.asarray(self.features.mean(axis=0)).ravel()).astype(np.float32)
+            self.sorted_keys, self.order = self._build_tables(build_chunk_size)
+            logger.info(f"Built LSH index ({self.n_tables} tables x {self.n_bits} bits) in {time.time() - start_time:.2f}s")
+        else:
+            self.planes, self.offsets, self.sorted_keys, self.order = planes, offsets, sorted_keys, order
+
+    def _codes(self, projections):
+        """Pack projection signs into one integer bucket code per table."""
+        bits = (projections > 0).reshape(len(projections), self.n_tables, self.n_bits)
+        weights = (1 << np.arange(self.n_bits, dtype=np.uint64))
+        return (bits.astype(np.uint64) @ weights).astype(np.uint32)
+
+    def _build_tables(self, chunk_size):
+        """Bucket keys of all tables, sorted, and the catalog row of each key.
+
+        A key is ``table << 32 | code``, so one sorted array serves every table
+        and all probes of a query are resolved with a single searchsorted call.
+        """
+        codes = np.empty((self.n_rows, self.n_tables), dtype=np.uint32)
+        planes_t = self.planes.T
+        for start in range(0, self.n_rows, chunk_size):
+            stop = min(start + chunk_size, self.n_rows)
+            codes[start:stop] = self._codes(np.asarray(self.features[start:stop] @ planes_t) - self.offsets)
+        order = np.argsort(codes, axis=0, kind='stable').T.astype(np.int32)
+        sorted_codes = np.take_along_axis(codes.T, order, axis=1)
+        return self._bucket_keys(sorted_codes.T).T.ravel(), np.ascontiguousarray(order.ravel())
+
+    def _bucket_keys(self, codes):
+        """Combine codes whose last axis is the table into global bucket keys."""
+        tables = np.arange(self.n_tables, dtype=np.uint64) << np.uint64(32)
+        return tables | codes.astype(np.uint64)
+
+    def _probe_codes(self, projection):
+        """Bucket codes to probe for each table, most likely bucket first."""
+        per_table = projection.reshape(self.n_tables, self.n_bits)
+        base = self._codes(projection[np.newaxis, :])[0]
+        probes = [base]
+        if self.n_probes:
+            # Flip the bits whose projections are closest to the hyperplane
+            flip_order = np.argsort(np.abs(per_table), axis=1)[:, :self.n_probes]
+            for j in range(flip_order.shape[1]):
+                probes.append(base ^ (np.uint32(1) << flip_order[:, j].astype(np.uint32)))
+        return probes
+
+    def candidates(self, query):
+        """Catalog rows sharing a probed bucket with the query in any table."""
+        projection = self.planes @ self._query_vector(query).astype(np.float32) - self.offsets
+        probe_keys = self._bucket_keys(np.stack(self._probe_codes(projection))).ravel()
+        lo = np.searchsorted(self.sorted_keys, probe_keys, side='left')
+        hi = np.searchsorted(self.sorted_keys, probe_keys, side='right')
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int32)
+        # Gather every order[lo:hi] slice without a Python loop
+        starts = np.repeat(lo - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return np.unique(self.order[starts + np.arange(total)])
+
+    def search(self, query, k, mask=None):
+        """Return the top-k candidates, falling back to exact scoring if too few."""
+        rows = self.candidates(query)
+        if mask is not None:
+            rows = rows[mask[rows]]
+        if len(rows) < k:
+            return self.exact_search(query, k, mask)
+        indices, scores = _top_k(rows, self.score_rows(query, rows), k)
+        return SearchResult(indices, scores, self.name)
+
+    @property
+    def nbytes(self):
+        return super().nbytes + self.planes.nbytes + self.offsets.nbytes + self.sorted_keys.nbytes + self.order.nbytes
+
+    def describe(self):
+        return dict(super().describe(), n_tables=self.n_tables, n_bits=self.n_bits, n_probes=self.n_probes)
+
+    def _meta(self):
+        return dict(super()._meta(), n_tables=self.n_tables, n_bits=self.n_bits,
+                    n_probes=self.n_probes, seed=self.seed)
+
+    def _save_arrays(self, directory):
+        np.save(os.path.join(directory, 'lsh_planes.npy'), self.planes)
+        np.save(os.path.join(directory, 'lsh_offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'lsh_sorted_keys.npy'), self.sorted_keys)
+        np.save(os.path.join(directory, 'lsh_order.npy'), self.order)
+
+    @classmethod
+    def _load(cls, directory, features, meta, mmap):
+        mmap_mode = 'r' if mmap else None
+        return cls(
+            features, n_tables=meta['n_tables'], n_bits=meta['n_bits'], n_probes=meta['n_probes'], seed=meta['seed'],
+            precision=meta['precision'],
+            planes=np.load(os.path.join(directory, 'lsh_planes.npy'), mmap_mode=mmap_mode),
+            offsets=np.load(os.path.join(directory, 'lsh_offsets.npy')),
+            sorted_keys=np.load(os.path.join(directory, 'lsh_sorted_keys.npy'), mmap_mode=mmap_mode),
+            order=np.load(os.path.join(directory, 'lsh_order.npy'), mmap_mode=mmap_mode)
+        )
+
+
+class EmbeddingIndex(ExactIndex):
+    """
+    Dense k-dimensional embedding of the feature matrix from randomized SVD.
+
+    Rows are projected onto the top ``n_components`` right singular vectors
+    and re-normalized, then stored as one C-contiguous array, so a query
+    costs a small projection plus a single BLAS GEMV instead of a sparse
+    product over the whole TF-IDF vocabulary. At int8 precision the embedding
+    is quantized per row and scored block by block.
+    """
+
+    name = 'svd'
+
+    def __init__(self, features, n_components=None, seed=0, n_iter=5, precision=None,
+                 components=None, embedding=None, embedding_scales=None):
+        super().__init__(features, precision)
+        self.n_components = n_components or Config.EMBEDDING_DIMS
+        self.seed = seed
+        self.explained_variance = None
+        if components is None:
+            start_time = time.time()
+            # The projection cannot have more dimensions than the matrix
+            k = min(self.n_components, min(self.features.shape) - 1)
+            # scikit-learn is only imported by the engines and tools that need it
+            from sklearn.utils.extmath import randomized_svd
+            _, singular_values, vt = randomized_svd(self.features, n_components=k, n_iter=n_iter, random_state=seed)
+            self.components = np.ascontiguousarray(vt, dtype=np.float32)
+            embedding = self._normalize_rows(np.asarray(self.features @ self.components.T, dtype=np.float32))
+            self.explained_variance = float((singular_values ** 2).sum() / self.features.multiply(self.features).sum())
+            self._set_embedding(embedding)
+            logger.info(f"Built {k}-dim SVD embedding in {time.time() - start_time:.2f}s "
+                        f"({self.explained_variance:.1%} of squared norm retained)")
+        else:
+            self.components, self.embedding, self.embedding_scales = components, embedding, embedding_scales
+        self.n_components = self.components.shape[0]
+
+    def _set_embedding(self, embedding):
+        if self.precision == 'int8':
+            self.embedding, self.embedding_scales = quantize_rows(embedding)
+        else:
+            self.embedding = np.ascontiguousarray(embedding, dtype=float_dtype(self.precision))
+            self.embedding_scales = None
+
+    @staticmethod
+    def _normalize_rows(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return np.ascontiguousarray(matrix / np.maximum(norms, 1e-12), dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        scales = self.embedding_scales.nbytes if self.embedding_scales is not None else 0
+        return super().nbytes + self.components.nbytes + self.embedding.nbytes + scales
+
+    def project(self, query):
+        """Embed a query given in the combined feature space."""
+        if issparse(query):
+            # Only the query's non-zero columns contribute to the projection
+            query = csr_matrix(query)
+            projected = self.components[:, query.indices] @ query.data.astype(np.float32)
+        else:
+            projected = self.components @ self._query_vector(query).astype(np.float32)
+        return self._normalize_rows(projected).astype(self.embedding.dtype if self.embedding_scales is None else np.float32)
+
+    def score_rows(self, query, rows):
+        if self.embedding_scales is not None:
+            return (self.embedding[rows].astype(np.float32) @ self.project(query)) * self.embedding_scales[rows]
+        return self.embedding[rows] @ self.project(query)
+
+    def score_all(self, query):
+        if self.embedding_scales is not None:
+            return quantized_matvec(self.embedding, self.embedding_scales, self.project(query))
+        return self.embedding @ self.project(query)
+
+    def search(self, query, k, mask=None):
+        return self._masked_search(query, k, mask, self.name)
+
+    def describe(self):
+        return dict(super().describe(), n_components=self.n_components,
+                    embedding_bytes=int(self.embedding.nbytes), explained_variance=self.explained_variance)
+
+    def _meta(self):
+        return dict(super()._meta(), n_components=self.n_components, seed=self.seed)
+
+    def _save_arrays(self, directory):
+        np.save(os.path.join(directory, 'svd_components.npy'), self.components)
+        np.save(os.path.join(directory, 'embedding.npy'), self.embedding)
+        if self.embedding_scales is not None:
+            np.save(os.path.join(directory, 'embedding_scales.npy'), self.embedding_scales)
+
+    @classmethod
+    def _load(cls, directory, features, meta, mmap):
+        mmap_mode = 'r' if mmap else None
+        scales_path = os.path.join(directory, 'embedding_scales.npy')
+        return cls(
+            features, seed=meta['seed'], precision=meta['precision'],
+            components=np.load(os.path.join(directory, 'svd_components.npy')),
+            embedding=np.load(os.path.join(directory, 'embedding.npy'), mmap_mode=mmap_mode),
+            embedding_scales=np.load(scales_path) if meta['precision'] == 'int8' else None
+        )
+
+
+_INDEX_CLASSES = {cls.name: cls for cls in (ExactIndex, LSHIndex, EmbeddingIndex)}
+
+
+def build_index(features, engine=None, **params):
+    """Build the index for an engine name over row-normalized features.
+
+    ``precision`` defaults to ``Config.SERVING_PRECISION``.
+    """
+    engine = engine or Config.SCORING_ENGINE
+    if engine not in _INDEX_CLASSES:
+        raise ValueError(f"Unknown scoring engine '{engine}'. Use one of: {', '.join(INDEX_ENGINES)}")
+    return _INDEX_CLASSES[engine](features, **params)
+
+
+def read_index_meta(directory):
+    """Return the metadata of a saved index, or None if there is none."""
+    meta_path = os.path.join(directory, 'index.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def load_index(directory, mmap=True):
+    """Load an index saved with ``save``; arrays are memory-mapped by default."""
+    meta = read_index_meta(directory)
+    if meta is None:
+        raise FileNotFoundError(f"No saved index in {directory}")
+    features = load_features(directory, meta['shape'], mmap=mmap)
+    return _INDEX_CLASSES[meta['engine']]._load(directory, features, meta, mmap)
+
+
+def recall_at_k(index, reference, query_rows, k):
+    """Mean overlap between an index's top-k and a reference index's top-k."""
+    overlaps = []
+    for row in query_rows:
+        query = reference.features[row]
+        expected = set(reference.search(query, k).indices.tolist())
+        found = set(index.search(query, k).indices.tolist())
+        overlaps.append(len(expected & found) / max(len(expected), 1))
+    return float(np.mean(overlaps)) if overlaps else 0.0
+
+
+def normalize_features(features):
+    """L2-normalize rows so dot products are cosine similarities."""
+    from sklearn.preprocessing import normalize
+    return normalize(csr_matrix(features), norm='l2', axis=1, copy=False)
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import AppRecommender, load_catalog
+    from app.quantization import PRECISIONS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Build and save the recommendation index")
+    parser.add_argument('--engine', choices=INDEX_ENGINES, default=Config.SCORING_ENGINE)
+    parser.add_argument('--tables', type=int, default=Config.LSH_TABLES)
+    parser.add_argument('--bits', type=int, default=Config.LSH_BITS)
+    parser.add_argument('--probes', type=int, default=Config.LSH_PROBES)
+    parser.add_argument('--dims', type=int, default=Config.EMBEDDING_DIMS)
+    parser.add_argument('--precision', choices=PRECISIONS, default=Config.SERVING_PRECISION)
+    parser.add_argument('--output', default=Config.INDEX_DIR)
+    parser.add_argument('--catalog', help="Catalog CSV to index instead of the configured one (see app.catalogs)")
+    args = parser.parse_args()
+
+    recommender = AppRecommender(data=load_catalog([args.catalog]) if args.catalog else None)
+    params = {'precision': args.precision}
+    if args.engine == 'lsh':
+        params.update(n_tables=args.tables, n_bits=args.bits, n_probes=args.probes)
+    elif args.engine == 'svd':
+        params.update(n_components=args.dims)
+    index = build_index(recommender.features, args.engine, **params)
+    sample = np.random.default_rng(0).choice(index.n_rows, size=min(200, index.n_rows), replace=False)
+    logger.info(f"recall@10 against exact scoring: {recall_at_k(index, ExactIndex(recommender.features), sample, 10):.3f}")
+    index.save(args.output, extra_meta={'catalog_fingerprint': recommender.catalog_fingerprint,
+                                        'transformers_fingerprint': recommender.transformers_fingerprint})
@@ -0,0 +1,242 @@
+"""
+Memory accounting for the structures a recommender keeps resident.
+
+``memory_report`` lists the bytes of every structure an AppRecommender
+holds: DataFrame memory per column (deep, so string contents count),
+sparse matrices with their nnz, dtype and shape, fitted transformers and
+the rating model. It also reports process RSS and the time and memory of
+each startup phase. The report is served under ``memory`` by
+/api/recommender-status and printed by
+
+    python -m app.memory [--catalog data/synthetic_1m.csv]
+
+Sizes are bytes of Python objects and array buffers. They do not include
+allocator overhead or memory-mapped files that were never read, so RSS is
+the number to size pods with and the structure sizes show where it goes.
+"""
+import os
+import sys
+import types
+import resource
+import logging
+import numpy as np
+import pandas as pd
+from scipy.sparse import issparse
+from app.metrics import StageTimer
+
+logger = logging.getLogger(__name__)
+
+MB = 2 ** 20
+
+
+def process_memory():
+    """(current RSS, peak RSS) of this process in bytes; current is None off Linux."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        rss = None
+    return rss, peak
+
+
+def deep_nbytes(obj, seen=None):
+    """Bytes reachable from ``obj``: containers, attributes, array buffers and frames.
+
+    Objects already in ``seen`` (ids) are skipped, so shared references are
+    counted once across calls that pass the same set.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    # Pickling states are temporary objects; keep them alive so their ids are not reused
+    states = []
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or item is None or isinstance(item, (type, types.ModuleType, types.FunctionType)):
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            if item.base is None:
+                total += sys.getsizeof(item)
+            elif isinstance(item.base, np.ndarray):
+                total += sys.getsizeof(item)
+                stack.append(item.base)
+            else:
+                # A view of a foreign buffer (e.g. a scikit-learn tree's nodes)
+                total += sys.getsizeof(item) + item.nbytes
+        elif issparse(item):
+            total += sys.getsizeof(item)
+            stack.extend(getattr(item, name) for name in ('data', 'indices', 'indptr', 'row', 'col') if hasattr(item, name))
+        elif isinstance(item, (pd.DataFrame, pd.Series, pd.Index)):
+            total += int(np.sum(item.memory_usage(deep=True)))
+        elif isinstance(item, dict):
+            total += sys.getsizeof(item)
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            total += sys.getsizeof(item)
+            stack.extend(item)
+        else:
+            total += sys.getsizeof(item)
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+            elif not isinstance(item, (str, bytes, int, float, complex, bool)):
+                # Extension types such as sklearn's Tree expose their arrays through pickling state
+                try:
+                    state = item.__getstate__()
+                except Exception:
+                    state = None
+                if isinstance(state, dict):
+                    states.append(state)
+                    stack.append(state)
+    return total
+
+
+def frame_memory(frame):
+    """Deep bytes per column of a DataFrame, plus its index."""
+    usage = frame.memory_usage(deep=True)
+    columns = {column: int(usage[column]) for column in frame.columns}
+    return {
+        'nbytes': int(usage.sum()),
+        'rows': len(frame),
+        'index_bytes': int(usage['Index']),
+        'columns': dict(sorted(columns.items(), key=lambda item: -item[1]))
+    }
+
+
+def matrix_memory(matrix):
+    """Shape, dtype, nnz and buffer bytes of a sparse or dense matrix."""
+    if issparse(matrix):
+        nbytes = sum(getattr(matrix, name).nbytes for name in ('data', 'indices', 'indptr') if hasattr(matrix, name))
+        return {'nbytes': int(nbytes), 'format': matrix.format, 'shape': list(matrix.shape),
+                'dtype': str(matrix.dtype), 'nnz': int(matrix.nnz)}
+    matrix = np.asarray(matrix)
+    return {'nbytes': int(matrix.nbytes), 'format': 'dense', 'shape': list(matrix.shape), 'dtype': str(matrix.dtype)}
+
+
+class PhaseRecorder(StageTimer):
+    """StageTimer that also keeps each phase's seconds and the RSS and peak RSS after it."""
+
+    def __init__(self, histogram):
+        super().__init__(histogram)
+        self.start_rss, self.start_peak = process_memory()
+        self.phases = []
+
+    def lap(self, stage):
+        before = self.stages.get(stage, 0.0)
+        super().lap(stage)
+        rss, peak = process_memory()
+        self.phases.append({
+            'phase': stage,
+            'seconds': round(self.stages[stage] - before, 4),
+            'rss_mb': round(rss / MB, 1) if rss is not None else None,
+            'peak_rss_mb': round(peak / MB, 1)
+        })
+
+    def report(self):
+        return {
+            'rss_mb_before': round(self.start_rss / MB, 1) if self.start_rss is not None else None,
+            'peak_rss_mb_before': round(self.start_peak / MB, 1),
+            'phases': self.phases
+        }
+
+
+def structure_memory(recommender):
+    """Bytes of every structure the recommender holds, largest first."""
+    structures = {}
+    data = getattr(recommender, 'data', None)
+    if data is not None:
+        structures['data'] = frame_memory(data)
+
+    index = getattr(recommender, 'index', None)
+    if index is not None:
+        # The index holds the serving feature matrix (recommender.features is the same object),
+        # unless it is sharded across worker processes
+        features = matrix_memory(index.features) if issparse(index.features) else None
+        structures['index'] = dict(index.describe(), features=features)
+        structures['index']['nbytes'] = int(index.nbytes)
+
+    # Transformers and models share nothing with the structures above
+    for name in ('tfidf_vectorizer', 'encoder', 'scaler', 'model'):
+        component = getattr(recommender, name, None)
+        if component is not None:
+            structures[name] = {'nbytes': deep_nbytes(component), 'type': type(component).__name__}
+    vocabulary = getattr(getattr(recommender, 'tfidf_vectorizer', None), 'vocabulary_', None)
+    if vocabulary is not None:
+        structures['tfidf_vectorizer']['vocabulary_size'] = len(vocabulary)
+
+    compiled = getattr(recommender, 'compiled_model', None)
+    if compiled is not None:
+        structures['compiled_model'] = {'nbytes': int(compiled.nbytes), 'n_trees': compiled.n_trees,
+                                        'n_nodes': compiled.n_nodes}
+    masks = getattr(recommender, 'masks', None)
+    if masks is not None:
+        structures['masks'] = {'nbytes': int(masks.nbytes)}
+    text_index = getattr(recommender, 'text_index', None)
+    if text_index is not None:
+        structures['text_index'] = text_index.describe()
+    prefix_index = getattr(recommender, 'prefix_index', None)
+    if prefix_index is not None:
+        seen = set()
+        structures['prefix_index'] = {
+            'nbytes': sum(deep_nbytes(getattr(prefix_index, name), seen) for name in ('keys', 'rows', 'ranks', 'name_keys')),
+            'n_keys': len(prefix_index.keys)
+        }
+    cf_neighbors = getattr(recommender, 'cf_neighbors', None)
+    if cf_neighbors is not None:
+        structures['cf_neighbors'] = {'nbytes': int(cf_neighbors.nbytes), 'k': cf_neighbors.k}
+    duplicates = getattr(recommender, 'duplicates', None)
+    if duplicates is not None:
+        # The cluster map of listings collapsed at ingest and the names resolving through it
+        aliases = getattr(recommender, 'duplicate_aliases', {})
+        structures['duplicates'] = {'nbytes': int(duplicates.memory_usage(deep=True).sum()) + deep_nbytes(aliases),
+                                    'rows': len(duplicates), 'aliases': len(aliases)}
+    blocks = getattr(recommender, 'blocks', None)
+    if blocks is not None:
+        structures['blocks'] = blocks.describe()
+    return dict(sorted(structures.items(), key=lambda item: -item[1]['nbytes']))
+
+
+def memory_report(recommender):
+    """Structure sizes (computed once per recommender), process RSS and startup phases."""
+    structures = getattr(recommender, '_structure_memory', None)
+    if structures is None:
+        # Structures do not change after startup; deep sizes of large frames take a while
+        structures = structure_memory(recommender)
+        recommender._structure_memory = structures
+    rss, peak = process_memory()
+    total = sum(entry['nbytes'] for entry in structures.values())
+    n_apps = structures['data']['rows'] if 'data' in structures else 0
+    return {
+        'total_structure_mb': round(total / MB, 2),
+        # Scales with the catalog; transformers and the model mostly do not
+        'structure_bytes_per_app': round(total / n_apps, 1) if n_apps else None,
+        'rss_mb': round(rss / MB, 1) if rss is not None else None,
+        'peak_rss_mb': round(peak / MB, 1),
+        'structures': structures,
+        'startup': getattr(recommender, 'startup_report', None)
+    }
+
+
+if __name__ == '__main__':
+    import json
+    import argparse
+    from app.recommender import AppRecommender, load_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Report the memory held by each recommender structure")
+    parser.add_argument('--catalog', help="Catalog CSV to load instead of the configured one")
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    data = load_catalog([args.catalog]) if args.catalog else None
+    recommender = AppRecommender(data=data)
+    text = json.dumps(memory_report(recommender), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,327 @@
+"""
+Counters and latency histograms exposed at /metrics in Prometheus text format.
+
+Metrics are module-level objects in the style of prometheus_client:
+
+    RECOMMEND_STAGE_SECONDS.labels('score').observe(elapsed)
+
+Each process keeps its own totals. When ``METRICS_DIR`` is set (one
+directory shared by all gunicorn workers, emptied before the server
+starts) every process writes a snapshot there at most every
+``METRICS_FLUSH_INTERVAL`` seconds, and /metrics sums the snapshots of all
+processes, so a scrape sees the whole server whichever worker answers.
+Totals of workers that exited stay in the sum, as counters must.
+
+Recording costs one lock and a bisect per observation (about a
+microsecond); ``python -m benchmarks.run`` reports it against lookup latency.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Stage timings of the request being handled, for slow-request logs (see app.profiling)
+request_stages = contextvars.ContextVar('request_stages', default=None)
+
+# Upper bounds in seconds, from sub-millisecond stages to slow requests
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            values = tuple(str(value) for value in values)
+            child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def reset(self):
+        with self._lock:
+            self._children = {}
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def state(self):
+        return self.value
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def state(self):
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start_time)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(float(bucket) for bucket in buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class StageTimer:
+    """Accumulates time per stage of one operation and records it on ``finish``.
+
+    ``lap(stage)`` charges the time since the previous lap to ``stage``, so
+    a stage repeated in a loop is recorded once with its total. Inside a
+    request the totals are also added to ``request_stages``.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.stages = {}
+        self.last_time = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last_time
+        self.last_time = now
+
+    def finish(self):
+        current = request_stages.get()
+        for stage, seconds in self.stages.items():
+            self.histogram.labels(stage).observe(seconds)
+            if current is not None:
+                current[stage] = current.get(stage, 0.0) + seconds
+        self.stages = {}
+
+
+class Registry:
+    """All metrics of the process, with snapshot files for multi-process servers."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def snapshot(self):
+        """Plain-data copy of every series, as written to the metrics directory."""
+        snapshot = {}
+        for metric in self.metrics.values():
+            entry = {'type': metric.type, 'help': metric.documentation, 'labelnames': list(metric.labelnames),
+                     'series': [[list(values), child.state()] for values, child in list(metric._children.items())]}
+            if metric.type == 'histogram':
+                entry['buckets'] = list(metric.buckets)
+            snapshot[metric.name] = entry
+        return snapshot
+
+    def _after_fork(self):
+        # A forked worker (gunicorn --preload) inherits the parent's totals,
+        # which the parent's own snapshot file already holds
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        for metric in self.metrics.values():
+            metric._lock = threading.Lock()
+            metric.reset()
+
+    def flush(self, directory):
+        """Write this process's snapshot to ``directory`` atomically."""
+        snapshot = self.snapshot()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{self._pid}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temporary, path)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self, directory, interval):
+        """Flush when the last snapshot is older than ``interval`` seconds."""
+        if directory and time.monotonic() - self._last_flush >= interval:
+            try:
+                self.flush(directory)
+            except OSError as e:
+                logger.error(f"Error writing metrics snapshot to {directory}: {str(e)}")
+
+    def collect(self, directory=None):
+        """Snapshots of every process in ``directory`` (or this one alone), summed per series."""
+        snapshots = [self.snapshot()]
+        if directory and os.path.isdir(directory):
+            own_file = f"metrics-{self._pid}.json"
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith('.json') or filename == own_file:
+                    continue
+                try:
+                    with open(os.path.join(directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Skipping unreadable metrics snapshot {filename}: {str(e)}")
+        return merge_snapshots(snapshots)
+
+    def render(self, directory=None):
+        return render_text(self.collect(directory))
+
+
+def merge_snapshots(snapshots):
+    """Sum counters and histogram buckets of several snapshots series by series."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.setdefault(name, dict(entry, series={}))
+            if target['type'] != entry['type'] or target.get('buckets') != entry.get('buckets'):
+                logger.warning(f"Metric {name} differs between processes; skipping one snapshot")
+                continue
+            for values, state in entry['series']:
+                key = tuple(values)
+                current = target['series'].get(key)
+                if entry['type'] == 'counter':
+                    target['series'][key] = (current or 0.0) + state
+                elif current is None:
+                    target['series'][key] = [list(state[0]), state[1]]
+                else:
+                    current[0] = [a + b for a, b in zip(current[0], state[0])]
+                    current[1] += state[1]
+    return merged
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_text(merged):
+    """Prometheus text exposition (format 0.0.4) of merged snapshots."""
+    lines = []
+    for name in sorted(merged):
+        entry = merged[name]
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for key in sorted(entry['series']):
+            state = entry['series'][key]
+            if entry['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(entry['labelnames'], key)} {_format_value(state)}")
+                continue
+            counts, total = state
+            cumulative = 0
+            for bound, count in zip(entry['buckets'] + [float('inf')], counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(entry['labelnames'], key, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(entry['labelnames'], key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(entry['labelnames'], key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter('http_requests_total', "HTTP requests by route, method and status",
+                        ['endpoint', 'method', 'status'])
+HTTP_REQUEST_SECONDS = Histogram('http_request_duration_seconds', "HTTP request latency by route", ['endpoint'])
+RECOMMEND_STAGE_SECONDS = Histogram('recommend_stage_seconds',
+                                    "Time per stage of a recommendation (resolve, score, dedupe, records, encode)",
+                                    ['stage'])
+RECOMMENDATIONS = Counter('recommendations_total', "Recommendation calls by outcome", ['outcome'])
+STARTUP_STAGE_SECONDS = Histogram('startup_stage_seconds', "Time per recommender startup phase", ['stage'],
+                                  buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+
+
+def init_metrics(app):
+    """Time every request and flush snapshots for /metrics in multi-process servers."""
+    from flask import g, request
+
+    directory = app.config.get('METRICS_DIR')
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start_time = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start_time = g.pop('metrics_start_time', None)
+        if start_time is not None:
+            # Route patterns keep label cardinality bounded
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start_time)
+            HTTP_REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+        REGISTRY.maybe_flush(directory, interval)
+        return response
@@ -1,12 +1,19 @@
+import re
 import uuid
 from flask import request, g
 
+# Incoming ids are reused only when safe to log and to use in file names
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
 class RequestIDMiddleware:
+    """Give every request an id (the caller's X-Request-ID when valid) and echo it in the response."""
     def __init__(self, app):
         self.app = app
 
     def __call__(self, environ, start_response):
-        request_id = str(uuid.uuid4())
+        request_id = environ.get('HTTP_X_REQUEST_ID', '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = str(uuid.uuid4())
         environ['HTTP_X_REQUEST_ID'] = request_id
 
         def _start_response(status, headers, exc_info=None):
@@ -0,0 +1,128 @@
+import os
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix
+from app.quantization import validate_precision, float_dtype, quantize_rows, dequantize_rows
+
+logger = logging.getLogger(__name__)
+
+
+class NeighborTable:
+    """
+    Top-K neighbors for every catalog row, stored as two fixed-width arrays.
+
+    ``indices[i]`` holds the catalog rows most similar to row ``i`` in
+    descending score order and ``scores[i]`` the matching similarities. Rows
+    with fewer than K neighbors are padded with index -1 and score 0. At int8
+    precision ``scores`` is quantized per row and ``scales`` holds the row
+    scales.
+    """
+
+    def __init__(self, indices, scores, scales=None):
+        if indices.shape != scores.shape:
+            raise ValueError(f"Neighbor indices {indices.shape} and scores {scores.shape} differ in shape")
+        if scores.dtype == np.int8 and scales is None:
+            raise ValueError("int8 neighbor scores need per-row scales")
+        self.indices = np.ascontiguousarray(indices, dtype=np.int32)
+        if scores.dtype in (np.int8, np.float64):
+            self.scores = np.ascontiguousarray(scores)
+        else:
+            self.scores = np.ascontiguousarray(scores, dtype=np.float32)
+        self.scales = None if scales is None else np.ascontiguousarray(scales, dtype=np.float32)
+
+    @property
+    def n_rows(self):
+        return self.indices.shape[0]
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    @property
+    def precision(self):
+        return 'int8' if self.scales is not None else self.scores.dtype.name
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.scores.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def neighbors(self, row):
+        """Return (indices, scores) of the stored neighbors of one row."""
+        indices = self.indices[row]
+        valid = indices >= 0
+        scores = self.scores[row][valid]
+        if self.scales is not None:
+            scores = scores.astype(np.float32) * self.scales[row]
+        return indices[valid], scores
+
+    def dense_scores(self):
+        """All scores as floating point, undoing int8 quantization."""
+        if self.scales is not None:
+            return dequantize_rows(self.scores, self.scales)
+        return self.scores
+
+    def to_precision(self, precision):
+        """Return the table with scores stored at another serving precision."""
+        validate_precision(precision)
+        if precision == self.precision:
+            return self
+        scores = self.dense_scores()
+        if precision == 'int8':
+            values, scales = quantize_rows(scores)
+            return NeighborTable(self.indices, values, scales)
+        return NeighborTable(self.indices, scores.astype(float_dtype(precision)))
+
+    def save(self, path):
+        """Write the table to an uncompressed ``.npz`` file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {'indices': self.indices, 'scores': self.scores}
+        if self.scales is not None:
+            arrays['scales'] = self.scales
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+        logger.info(f"Saved {self.n_rows}x{self.k} {self.precision} neighbor table to {path}")
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by ``save``."""
+        with np.load(path) as arrays:
+            scales = arrays['scales'] if 'scales' in arrays.files else None
+            return cls(arrays['indices'], arrays['scores'], scales)
+
+
+def top_k_neighbors(matrix, k, chunk_size=1024, exclude_self=True):
+    """
+    Compute the top-K neighbors of every row of a row-normalized sparse matrix.
+
+    Similarities are the sparse products ``matrix[chunk] @ matrix.T`` computed
+    ``chunk_size`` rows at a time, so peak memory is bounded by one chunk of
+    the product rather than the full n x n similarity matrix.
+    """
+    matrix = csr_matrix(matrix)
+    n_rows = matrix.shape[0]
+    matrix_t = matrix.T.tocsc()
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, k), dtype=np.float32)
+
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        product = (matrix[start:stop] @ matrix_t).tocsr()
+        for offset in range(stop - start):
+            row = start + offset
+            lo, hi = product.indptr[offset], product.indptr[offset + 1]
+            cols = product.indices[lo:hi]
+            vals = product.data[lo:hi]
+            if exclude_self:
+                keep = (cols != row) & (vals > 0)
+            else:
+                keep = vals > 0
+            cols, vals = cols[keep], vals[keep]
+            if len(vals) > k:
+                top = np.argpartition(-vals, k - 1)[:k]
+                cols, vals = cols[top], vals[top]
+            order = np.argsort(-vals, kind='stable')
+            indices[row, :len(order)] = cols[order]
+            scores[row, :len(order)] = vals[order]
+        logger.debug(f"Computed neighbors for rows {start}-{stop} of {n_rows}")
+
+    return NeighborTable(indices, scores)
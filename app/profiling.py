@@ -0,0 +1,162 @@
+"""
+On-demand request profiling and slow-request logs.
+
+A request is profiled with cProfile when it carries ``X-Profile: 1`` and
+the admin token (``X-Admin-Token``), or when it is picked by sampling one
+in ``PROFILE_SAMPLE_RATE`` requests. The profile is stored under the
+request id set by RequestIDMiddleware and downloaded from
+/api/admin/profiles/<request_id>. The response carries ``X-Profiled: 1``.
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged with their request id
+and the stage timings recorded through ``app.metrics.StageTimer``.
+
+Profiles stay in memory unless ``PROFILE_DIR`` is set; set it for
+multi-worker servers so any worker can serve a download.
+"""
+import io
+import os
+import hmac
+import time
+import uuid
+import random
+import marshal
+import pstats
+import cProfile
+import logging
+import threading
+from collections import OrderedDict
+from flask import g, request
+from app.metrics import request_stages
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileStore:
+    """The most recent profiles by request id, in memory or in a directory.
+
+    Each profile has the raw stats (the format of ``pstats.dump_stats``,
+    readable with ``pstats`` or snakeviz) and a text summary.
+    """
+
+    def __init__(self, directory=None, max_profiles=100):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def save(self, request_id, profiler, description, limit=40):
+        stats = pstats.Stats(profiler)
+        raw = marshal.dumps(stats.stats)
+        text = io.StringIO()
+        stats.stream = text
+        text.write(f"{description}\n\n")
+        stats.sort_stats('cumulative').print_stats(limit)
+        summary = text.getvalue()
+
+        if not self.directory:
+            with self._lock:
+                self._profiles[request_id] = (raw, summary)
+                self._profiles.move_to_end(request_id)
+                while len(self._profiles) > self.max_profiles:
+                    self._profiles.popitem(last=False)
+            return
+        for extension, content, mode in (('prof', raw, 'wb'), ('txt', summary, 'w')):
+            path = os.path.join(self.directory, f"{request_id}.{extension}")
+            with open(f"{path}.tmp", mode) as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+        self._prune()
+
+    def _prune(self):
+        for request_id in self.list()[self.max_profiles:]:
+            for extension in ('prof', 'txt'):
+                try:
+                    os.remove(os.path.join(self.directory, f"{request_id}.{extension}"))
+                except OSError:
+                    pass
+
+    def list(self):
+        """Stored request ids, newest first."""
+        if not self.directory:
+            with self._lock:
+                return list(reversed(self._profiles))
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.prof')]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        return [os.path.basename(path)[:-len('.prof')] for path in paths]
+
+    def get(self, request_id, raw=False):
+        """Raw stats bytes or the text summary of a profile; None when not stored."""
+        if not self.directory:
+            with self._lock:
+                profile = self._profiles.get(request_id)
+            return None if profile is None else profile[0 if raw else 1]
+        path = os.path.join(self.directory, f"{request_id}.{'prof' if raw else 'txt'}")
+        if os.path.basename(path) not in os.listdir(self.directory):
+            return None
+        with open(path, 'rb' if raw else 'r') as f:
+            return f.read()
+
+
+def is_admin(app):
+    """True when the request carries the configured admin token."""
+    token = app.config.get('ADMIN_TOKEN')
+    # Constant-time comparison; bytes because compare_digest rejects non-ASCII strings
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+def _format_stages(stages):
+    return ', '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in stages.items()) or 'none recorded'
+
+
+def init_profiling(app):
+    """Profile requests on demand and log slow requests with their stage timings."""
+    app.profile_store = ProfileStore(app.config.get('PROFILE_DIR'), app.config.get('PROFILE_MAX_STORED', 100))
+    sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+    slow_seconds = app.config.get('SLOW_REQUEST_MS', 500) / 1000
+
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get('X-Request-ID') or str(uuid.uuid4())
+        g.request_start_time = time.perf_counter()
+        request_stages.set({})
+        wanted = request.headers.get('X-Profile') == '1' and is_admin(app)
+        if wanted or (sample_rate > 0 and random.randrange(sample_rate) == 0):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this process
+                return
+            g.profiler = profiler
+
+    @app.after_request
+    def finish_request(response):
+        start_time = g.pop('request_start_time', None)
+        if start_time is None:
+            return response
+        elapsed = time.perf_counter() - start_time
+        stages = request_stages.get() or {}
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            description = (f"{request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+                           f"in {elapsed * 1000:.1f}ms; stages: {_format_stages(stages)}")
+            try:
+                app.profile_store.save(g.request_id, profiler, description)
+                response.headers['X-Profiled'] = '1'
+            except OSError as e:
+                logger.error(f"Error saving profile for request {g.request_id}: {str(e)}")
+        if elapsed >= slow_seconds:
+            logger.warning(f"Slow request {g.request_id}: {request.method} {request.path} -> {response.status_code} "
+                           f"in {elapsed * 1000:.1f}ms; stages: {_format_stages(stages)}")
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # after_request does not run when the request raised
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
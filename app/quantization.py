@@ -0,0 +1,124 @@
+"""
+Reduced-precision storage for the serving structures.
+
+``Config.SERVING_PRECISION`` selects how scores and vectors are held in
+memory: ``float64``, ``float32`` or ``int8``. Sparse feature matrices are
+never stored as int8 (scipy would up-cast them on every product), so int8
+applies to dense embeddings and stored neighbor scores, which are quantized
+symmetrically per row with one float32 scale each.
+
+``python -m app.quantization`` reports memory, latency and top-k overlap of
+each precision against float64 for the current catalog.
+"""
+import json
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ('float64', 'float32', 'int8')
+
+
+def validate_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Use one of: {', '.join(PRECISIONS)}")
+    return precision
+
+
+def float_dtype(precision):
+    """Floating-point dtype used for a precision; int8 data is scored in float32."""
+    return np.float64 if validate_precision(precision) == 'float64' else np.float32
+
+
+def quantize_rows(matrix):
+    """Quantize rows to int8 so that ``matrix ~= values * scales[:, None]``."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=-1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    values = np.rint(matrix / scales[..., np.newaxis]).astype(np.int8)
+    return values, scales
+
+
+def dequantize_rows(values, scales):
+    return values.astype(np.float32) * scales[..., np.newaxis]
+
+
+def quantized_matvec(values, scales, vector, chunk_size=65536):
+    """Compute ``dequantize_rows(values, scales) @ vector`` one block of rows at a time.
+
+    Only one float32 block is materialized at a time, so the int8 matrix is
+    read once per query at a quarter of the float32 memory traffic.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    out = np.empty(len(values), dtype=np.float32)
+    for start in range(0, len(values), chunk_size):
+        stop = min(start + chunk_size, len(values))
+        out[start:stop] = (values[start:stop].astype(np.float32) @ vector) * scales[start:stop]
+    return out
+
+
+def precision_report(features, engine='exact', precisions=PRECISIONS, k=10, n_queries=500, seed=0, **params):
+    """Compare an index engine at each precision against its float64 version.
+
+    Reports index memory, mean and p95 query latency and the mean overlap of
+    each precision's top-k with the float64 top-k.
+    """
+    from app.index import build_index
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(features.shape[0], size=min(n_queries, features.shape[0]), replace=False)
+    queries = [features[row] for row in rows]
+
+    results = []
+    reference = None
+    for precision in precisions:
+        index = build_index(features, engine, precision=precision, **params)
+        latencies = []
+        found = []
+        for query in queries:
+            start_time = time.perf_counter()
+            found.append(index.search(query, k).indices)
+            latencies.append(time.perf_counter() - start_time)
+        if reference is None:
+            reference = found
+        overlap = np.mean([len(set(a.tolist()) & set(b.tolist())) / len(a) for a, b in zip(reference, found)])
+        results.append({
+            'precision': precision,
+            'index_mb': round(index.nbytes / 2 ** 20, 3),
+            'mean_query_ms': round(float(np.mean(latencies)) * 1000, 4),
+            'p95_query_ms': round(float(np.percentile(latencies, 95)) * 1000, 4),
+            'overlap_vs_first': round(float(overlap), 4)
+        })
+        logger.info(f"{engine}/{precision}: {results[-1]}")
+
+    return {
+        'engine': engine,
+        'k': k,
+        'n_queries': len(rows),
+        'reference_precision': precisions[0],
+        'n_rows': features.shape[0],
+        'results': results
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import AppRecommender
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Report memory, latency and top-k overlap per serving precision")
+    parser.add_argument('--engines', nargs='+', default=['exact', 'svd'])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    recommender = AppRecommender()
+    reports = [precision_report(recommender.features, engine, k=args.k, n_queries=args.queries) for engine in args.engines]
+    text = json.dumps(reports, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
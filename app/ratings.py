@@ -0,0 +1,84 @@
+"""
+Predicted ratings of every catalog app, computed offline and loaded at startup.
+
+The rating model predicts the whole serving catalog in one batched pass and
+the result is saved to ``PREDICTED_RATINGS_PATH`` with the fingerprints of
+the catalog, the transformers and the model it came from. AppRecommender
+loads the file as the 'Predicted Rating' column when all three match, so
+workers and lazily loaded catalogs never run the model over the catalog.
+Without a matching file responses leave the column out.
+
+    python -m app.ratings [--catalog data/de.csv --output models/catalogs/de/predicted_ratings.npz] [--jobs -1]
+
+save_model.py runs it for the configured catalog after training.
+"""
+import os
+import time
+import logging
+import numpy as np
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Fingerprints a ratings file must match; see AppRecommender.rating_key
+KEY_FIELDS = ('catalog_fingerprint', 'transformers_fingerprint', 'model_digest')
+
+
+def save_ratings(path, ratings, key):
+    """Write ratings and the fingerprints they were computed with to an uncompressed ``.npz`` file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        np.savez(f, ratings=np.asarray(ratings, dtype=np.float64), **{field: key[field] for field in KEY_FIELDS})
+    logger.info(f"Saved predicted ratings of {len(ratings)} apps to {path}")
+
+
+def load_ratings(path, key):
+    """Ratings saved for exactly this catalog, transformers and model, else None."""
+    if not os.path.exists(path):
+        logger.info(f"No predicted ratings at {path}; run python -m app.ratings to add them to responses")
+        return None
+    try:
+        with np.load(path) as arrays:
+            saved = {field: str(arrays[field]) for field in KEY_FIELDS}
+            ratings = arrays['ratings']
+    except Exception as e:
+        logger.error(f"Error loading predicted ratings {os.path.basename(path)}: {str(e)}")
+        return None
+    stale = [field for field in KEY_FIELDS if saved[field] != key[field]]
+    if stale:
+        logger.warning(f"Predicted ratings in {path} were computed for another {', '.join(stale)}; ignoring them")
+        return None
+    return ratings
+
+
+def build_ratings(recommender, path, n_jobs=1):
+    """Predict the recommender's catalog with ``n_jobs`` parallel trees and save it to ``path``."""
+    start_time = time.perf_counter()
+    model = recommender.model
+    serving_jobs = getattr(model, 'n_jobs', None)
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = n_jobs
+    try:
+        ratings = recommender.predict_catalog_ratings()
+    finally:
+        if hasattr(model, 'n_jobs'):
+            model.n_jobs = serving_jobs
+    logger.info(f"Predicted ratings for {len(ratings)} apps in {time.perf_counter() - start_time:.2f}s")
+    save_ratings(path, ratings, recommender.rating_key())
+    return ratings
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import AppRecommender, load_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Predict and save the rating of every catalog app")
+    parser.add_argument('--catalog', help="Catalog CSV to rate instead of the configured one (see app.catalogs)")
+    parser.add_argument('--output', default=Config.PREDICTED_RATINGS_PATH)
+    parser.add_argument('--jobs', type=int, default=Config.PREDICT_N_JOBS, help="Parallel trees; -1 uses every core")
+    args = parser.parse_args()
+
+    recommender = AppRecommender(data=load_catalog([args.catalog]) if args.catalog else None)
+    build_ratings(recommender, args.output, args.jobs)
@@ -1,70 +1,58 @@
-from flask import Blueprint, request, jsonify
-import pandas as pd
-import pickle
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-from app.config import Config  # Add this import
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import BadRequest, NotFound
+from app.config import Config
+from app.routes import request_recommender
 
 recommend_bp = Blueprint('recommend', __name__)
 
-# Load the trained model and components
-try:
-    with open(Config.MODEL_PATH, 'rb') as file:  # Use Config.MODEL_PATH instead of hardcoded path
-        model_data = pickle.load(file)
-        
-    # Extract components from model_data
-    model = model_data['model']
-    scaler = model_data['scaler']
-    encoder = model_data['encoder']
-    tfidf_vectorizer = model_data['tfidf_vectorizer']
-    numerical_features = model_data['numerical_features']
-    categorical_features = model_data['categorical_features']
-    apps_list = model_data['apps_list']
-except Exception as e:
-    print(f"Error loading model: {str(e)}")
-
 @recommend_bp.route('/predict', methods=['POST'])
 def predict():
+    """Predict ratings and find similar catalog apps for apps not in the catalog.
+
+    Send one app as ``{"features": {...}}`` or several as
+    ``{"apps": [{...}, ...]}``; see AppRecommender.prepare_unseen_apps for
+    the fields of each app.
+    """
     try:
-        data = request.get_json()
+        recommender = request_recommender()
+        if recommender is None or getattr(recommender, 'index', None) is None or recommender.model is None:
+            return jsonify({"error": "Recommender service is currently unavailable"}), 503
+
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        batch = data.get('apps')
         app_features = data.get('features')
-        
-        if not app_features:
+
+        if batch is None and not app_features:
             return jsonify({"error": "No features provided"}), 400
-        
-        # Ensure all required features are present
-        required_features = numerical_features + categorical_features + ['description']
-        missing_features = [feat for feat in required_features if feat not in app_features]
-        
-        if missing_features:
-            return jsonify({"error": f"Missing features: {', '.join(missing_features)}"}), 400
-            
+        if batch is not None and (not isinstance(batch, list) or not batch or not all(isinstance(app, dict) for app in batch)):
+            return jsonify({"error": "'apps' must be a non-empty list of feature objects"}), 400
+        if batch is not None and len(batch) > Config.MAX_PREDICT_BATCH:
+            return jsonify({"error": f"At most {Config.MAX_PREDICT_BATCH} apps per request"}), 400
+        if batch is None and not isinstance(app_features, dict):
+            return jsonify({"error": "'features' must be an object"}), 400
+
         try:
-            numerical_data = [[app_features[feat] for feat in numerical_features]]
-            categorical_data = [[app_features[feat] for feat in categorical_features]]
-            
-            numerical_features_scaled = scaler.transform(numerical_data)
-            categorical_features_encoded = encoder.transform(categorical_data)
-            text_features = tfidf_vectorizer.transform([app_features['description']])
-            
-            # Combine features
-            features = np.hstack([
-                numerical_features_scaled,
-                categorical_features_encoded.toarray(),
-                text_features.toarray()
-            ])
-            
-            # Get prediction
-            predicted_rating = model.predict(features)[0]
-            
-            return jsonify({
-                "predicted_rating": float(predicted_rating),
-                "recommended_apps": apps_list[:5]
-            })
-            
-        except Exception as e:
-            return jsonify({"error": f"Error processing features: {str(e)}"}), 500
-            
+            count = int(data.get('count', 5))
+        except (TypeError, ValueError):
+            return jsonify({"error": "count must be an integer"}), 400
+        if not 1 <= count <= Config.MAX_RECOMMENDATIONS:
+            return jsonify({"error": f"count must be between 1 and {Config.MAX_RECOMMENDATIONS}"}), 400
+
+        try:
+            results = recommender.predict_unseen(batch if batch is not None else [app_features], count)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if batch is None:
+            return jsonify(results[0])
+        return jsonify({"results": results})
+
+    except BadRequest as e:
+        return jsonify({"error": e.description}), 400
+    except NotFound as e:
+        return jsonify({"error": e.description}), 404
     except Exception as e:
+        current_app.logger.error(f"Prediction failed: {str(e)}")
         return jsonify({"error": str(e)}), 500
-
@@ -2,34 +2,179 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
-from scipy.sparse import csr_matrix
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+import json
+import time
+from scipy.sparse import csr_matrix, hstack
 import logging
+import traceback
 from app.config import Config
+from app.index import ExactIndex, build_index, load_index, read_index_meta, normalize_features
+from app.neighbors import NeighborTable
+from app.filters import CatalogMasks
+from app.text_search import InvertedIndex
+from app.suggest import PrefixIndex
+from app.forest import CompiledForest
+from app.metrics import StageTimer, RECOMMEND_STAGE_SECONDS, RECOMMENDATIONS, STARTUP_STAGE_SECONDS
+from app.memory import PhaseRecorder
+from app.blocks import BlockFeatures, parse_block_weights
+from app.dedup import collapse_duplicates, duplicate_aliases
+from app.shards import ShardedIndex
+from app.ratings import load_ratings
 
 logger = logging.getLogger(__name__)
 
+# Feature columns of the rating model and the serving matrix, after the TF-IDF text block
+NUMERICAL_FEATURES = ['Reviews', 'Size', 'Installs', 'Price']
+CATEGORICAL_FEATURES = ['Type', 'Content Rating']
+
+# Scoring modes accepted by get_recommendations
+RECOMMENDATION_MODES = ('content', 'hybrid')
+
+# Catalog columns serving reads; compact_catalog drops the rest (Last Updated, Current Ver, ...)
+SERVING_COLUMNS = ['App', 'Category', 'Rating', 'Reviews', 'Size', 'Installs', 'Type', 'Price', 'Content Rating', 'Genres']
+# Low-cardinality text columns stored as categoricals, with the value used for missing entries
+CATEGORY_COLUMNS = {'Category': '', 'Genres': '', 'Type': 'Unknown', 'Content Rating': 'Unknown'}
+
+try:
+    import pyarrow  # noqa: F401
+    # Arrow strings keep all names in one contiguous buffer instead of one object per name
+    NAME_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    NAME_DTYPE = None
+
+def load_catalog(data_paths=None):
+    """Load the app data from the first catalog CSV that exists."""
+    try:
+        # Try different data paths in order of preference
+        default_paths = [Config.CATALOG_PATH, Config.FIXED_DATA_PATH, Config.DATA_PATH, Config.SAMPLE_DATA_PATH]
+        for data_path in data_paths or [path for path in default_paths if path]:
+            if os.path.exists(data_path):
+                # Add encoding and error handling parameters
+                df = pd.read_csv(data_path, encoding='utf-8-sig', on_bad_lines='skip')
+                logger.info(f"Loaded data from {data_path} with shape {df.shape}")
+                return clean_catalog(df)
+        
+        logger.error("No data file found")
+        return None
+    except Exception as e:
+        logger.error(f"Error loading data: {str(e)}")
+        return None
+
+def clean_catalog(df):
+    """Normalize column names and numeric columns of a raw catalog DataFrame."""
+    # Fix for BOM character in column name
+    if '\ufeffApp' in df.columns and 'App' not in df.columns:
+        df.rename(columns={'\ufeffApp': 'App'}, inplace=True)
+        logger.info("Renamed '\ufeffApp' column to 'App'")
+    
+    # Validate and log column names
+    logger.info(f"Columns in loaded data: {list(df.columns)}")
+    
+    # Ensure numeric columns are properly converted
+    numeric_columns = ['Reviews', 'Size', 'Installs', 'Price']
+    for col in numeric_columns:
+        if col in df.columns:
+            # Convert to string first to handle any formatting issues
+            df[col] = df[col].astype(str)
+            # Remove any non-numeric characters
+            if col == 'Installs':
+                df[col] = df[col].str.replace('[+,]', '', regex=True)
+            elif col == 'Price':
+                df[col] = df[col].str.replace('$', '', regex=False)
+            # Convert to numeric
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+            # Fill NaN values
+            if col in ['Reviews', 'Price']:
+                df[col] = df[col].fillna(0)
+            else:
+                df[col] = df[col].fillna(df[col].median())
+    
+    return df
+
+def _downcast(values):
+    """The smallest integer or float32 form of a numeric column that keeps every value exactly."""
+    numbers = values.to_numpy(dtype=np.float64)
+    finite = numbers[np.isfinite(numbers)]
+    if len(finite) == len(numbers) and np.array_equal(finite, np.round(finite)):
+        return pd.to_numeric(values, downcast='integer')
+    as_float32 = numbers.astype(np.float32)
+    if np.array_equal(as_float32.astype(np.float64), numbers, equal_nan=True):
+        return pd.Series(as_float32, index=values.index, name=values.name)
+    return values
+
+def compact_catalog(df):
+    """Serving columns of a cleaned catalog in compact dtypes.
+    
+    Unused columns are dropped, the CATEGORY_COLUMNS become categoricals,
+    numeric columns are downcast where no value changes, and names use
+    Arrow strings when pyarrow is installed.
+    """
+    keep = [col for col in SERVING_COLUMNS if col in df.columns]
+    if 'Features' in df.columns:
+        keep.append('Features')
+    df = df[keep].copy()
+    for col, missing in CATEGORY_COLUMNS.items():
+        if col in df.columns:
+            df[col] = df[col].astype(object).fillna(missing).astype(str).astype('category')
+    if 'Rating' in df.columns:
+        df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce')
+    for col in ['Rating', 'Reviews', 'Size', 'Installs', 'Price']:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = _downcast(df[col])
+    if NAME_DTYPE is not None:
+        df['App'] = df['App'].astype(NAME_DTYPE)
+    return df
+
+def features_text(frame):
+    """The 'Features' text of catalog rows (Category, App, Genres) the TF-IDF vectorizer was fitted on."""
+    def text(col):
+        return frame[col].astype(object).fillna('').astype(str)
+    
+    features = text('Category') + ' ' + text('App')
+    if 'Genres' in frame.columns:
+        features += ' ' + text('Genres')
+    return features
+
 class AppRecommender:
     """
     A class to handle app recommendations based on similarity metrics.
     """
     
-    def __init__(self):
-        """Initialize the recommender with pre-trained models and data."""
+    def __init__(self, data=None, tfidf_vectorizer=None, encoder=None, scaler=None, model=None, cf_neighbors=None,
+                 artifacts_dir=None, share_models_with=None):
+        """Initialize the recommender with pre-trained models and data.
+        
+        Components that are passed in are used instead of loading them from
+        the paths in Config, so tools and tests can serve their own catalog.
+        With ``artifacts_dir`` the saved index and neighbor table, and any
+        models found there, are read from that directory under their Config
+        file names instead (see app.catalogs). Models it does not have are
+        taken from ``share_models_with``, another recommender, rather than
+        loaded again.
+        """
+        startup = PhaseRecorder(STARTUP_STAGE_SECONDS)
+        # sha1 of each model file as loaded, for the serving version
+        self._artifact_digests = {}
+        self.artifacts_dir = artifacts_dir
+        shared = share_models_with
         try:
             # Load data
             logger.info("Attempting to load data...")
-            self.data = self._load_data()
+            self.data = clean_catalog(data.reset_index(drop=True)) if data is not None else self._load_data()
             if self.data is None:
                 logger.error("Failed to load data")
                 raise Exception("Failed to load data")
+            if Config.COMPACT_CATALOG:
+                self.data = compact_catalog(self.data)
+            startup.lap('load_data')
             
             # Load models
             logger.info("Attempting to load models...")
-            self.tfidf_vectorizer = self._load_model(Config.TFIDF_PATH)
-            self.encoder = self._load_model(Config.ENCODER_PATH)
-            self.scaler = self._load_model(Config.SCALER_PATH)
-            self.model = self._load_model(Config.MODEL_PATH)
+            self.tfidf_vectorizer = tfidf_vectorizer if tfidf_vectorizer is not None else self._component('tfidf_vectorizer', Config.TFIDF_PATH, shared)
+            self.encoder = encoder if encoder is not None else self._component('encoder', Config.ENCODER_PATH, shared)
+            self.scaler = scaler if scaler is not None else self._component('scaler', Config.SCALER_PATH, shared)
+            self.model = model if model is not None else self._component('model', Config.MODEL_PATH, shared)
             
             if not all([self.tfidf_vectorizer, self.encoder, self.scaler, self.model]):
                 missing = []
@@ -39,71 +184,125 @@ class AppRecommender:
                 if not self.model: missing.append("model")
                 logger.error(f"Failed to load models: {', '.join(missing)}")
                 raise Exception(f"Failed to load models: {', '.join(missing)}")
+            startup.lap('load_models')
             
-            # Create similarity matrix if data is available
-            logger.info("Attempting to create similarity matrix...")
+            # Flat-array copy of the forest for low-latency small-batch predictions
+            if shared is not None and self.model is shared.model:
+                self.compiled_model = shared.compiled_model
+            else:
+                forest_path = self._artifact_path(Config.COMPILED_FOREST_PATH)
+                self.compiled_model = self._load_compiled_forest(
+                    forest_path if os.path.exists(forest_path) else Config.COMPILED_FOREST_PATH)
+            startup.lap('compiled_forest')
+            
+            # One listing per cluster of near-duplicates; dropped names resolve to their representative
+            self.duplicates = None
+            self.duplicate_aliases = {}
+            if Config.DEDUP_CATALOG and self.data is not None:
+                self.data, self.duplicates = collapse_duplicates(self.data)
+                self.duplicate_aliases = duplicate_aliases(self.data, self.duplicates)
+                startup.lap('dedup')
+            
+            # Create the scoring index if data is available
+            logger.info("Attempting to create scoring index...")
             if self.data is not None and len(self.data) > 0:
-                self.similarity_matrix = self._create_similarity_matrix()
-                if self.similarity_matrix is None:
-                    logger.error("Failed to create similarity matrix")
-                    raise Exception("Failed to create similarity matrix")
+                self.catalog_fingerprint = self._catalog_fingerprint()
+                self.transformers_fingerprint = self._transformers_fingerprint()
+                self.index = self._load_saved_index(self._artifact_path(Config.INDEX_DIR))
+                if self.index is None:
+                    self.features = self._create_feature_matrix()
+                    if self.features is None:
+                        logger.error("Failed to create feature matrix")
+                        raise Exception("Failed to create feature matrix")
+                    self.index = build_index(self.features, Config.SCORING_ENGINE, precision=Config.SERVING_PRECISION)
+                    # The index holds the features at serving precision; drop the float64 copy
+                    self.features = self.index.features
+                else:
+                    self.features = self.index.features
+                if Config.SERVING_SHARDS > 1 and self.index.name == ExactIndex.name:
+                    # The rows move to local shard workers; this process merges their top-k lists
+                    self.index = ShardedIndex(self.index.features, Config.SERVING_SHARDS, precision=self.index.precision)
+                    self.features = self.index.features
+                elif Config.SERVING_SHARDS > 1:
+                    logger.warning(f"SERVING_SHARDS only applies to exact scoring; serving {self.index.name} unsharded")
+                logger.info(f"Using {self.index.name} scoring over {self.index.n_rows} apps")
+                startup.lap('index')
             else:
-                self.similarity_matrix = None
-                logger.error("No data available for similarity matrix creation")
-                raise Exception("No data available for similarity matrix creation")
-                
-            logger.info("AppRecommender initialized successfully")
+                self.index = None
+                logger.error("No data available for scoring index creation")
+                raise Exception("No data available for scoring index creation")
+            
+            # Ratings of the whole catalog, predicted offline by app.ratings for this catalog and model
+            ratings = load_ratings(self._artifact_path(Config.PREDICTED_RATINGS_PATH), self.rating_key())
+            if ratings is not None:
+                self.data['Predicted Rating'] = ratings
+            startup.lap('predicted_ratings')
+            
+            # Bit-packed masks answer category/type/rating filters before top-k selection
+            self.masks = CatalogMasks(self.data)
+            startup.lap('masks')
+            
+            # Term postings for free-text search over the TF-IDF vocabulary
+            self._ensure_features_column()
+            self.text_index = InvertedIndex(self.tfidf_vectorizer, self.data['Features'])
+            startup.lap('text_index')
+            # Popularity-ranked name prefixes for autocomplete
+            self.prefix_index = PrefixIndex(self.data)
+            startup.lap('prefix_index')
+            
+            # Per-block features for query-time weights; the fixed index serves unweighted requests
+            self.default_block_weights = parse_block_weights(Config.FEATURE_BLOCK_WEIGHTS)
+            self.blocks = None
+            if Config.FEATURE_BLOCKS or self.default_block_weights is not None:
+                self.blocks = BlockFeatures(self._combine_features(self.data), self._block_sizes(),
+                                            precision=Config.SERVING_PRECISION)
+                startup.lap('blocks')
+            
+            # Collaborative neighbors are optional; hybrid mode needs them
+            self.cf_neighbors = cf_neighbors if cf_neighbors is not None else self._load_neighbor_table(self._artifact_path(Config.CF_NEIGHBORS_PATH))
+            startup.lap('cf_neighbors')
+            
+            if Config.COMPACT_CATALOG:
+                # The text now lives in the index and the postings; _combine_features rebuilds it on demand
+                self.data = self.data.drop(columns='Features')
+            
+            # Identifies what responses are computed from; HTTP ETags are keyed to it
+            self.version = self._serving_version()
+            startup.lap('version')
+            logger.info(f"AppRecommender initialized successfully (version {self.version[:12]})")
         except Exception as e:
             logger.error(f"Error initializing AppRecommender: {str(e)}")
             self.data = None
-            self.similarity_matrix = None
+            self.index = None
             raise
+        finally:
+            startup.finish()
+            # Seconds, RSS and peak RSS after each phase, for app.memory reports
+            self.startup_report = startup.report()
     
     def _load_data(self):
         """Load the app data from CSV file."""
-        try:
-            # Try different data paths in order of preference
-            for data_path in [Config.FIXED_DATA_PATH, Config.DATA_PATH, Config.SAMPLE_DATA_PATH]:
-                if os.path.exists(data_path):
-                    # Add encoding and error handling parameters
-                    # After loading the data, add this validation
-                    df = pd.read_csv(data_path, encoding='utf-8-sig', on_bad_lines='skip')
-                    logger.info(f"Loaded data from {data_path} with shape {df.shape}")
-                    
-                    # Fix for BOM character in column name
-                    if '\ufeffApp' in df.columns and 'App' not in df.columns:
-                        df.rename(columns={'\ufeffApp': 'App'}, inplace=True)
-                        logger.info("Renamed '\ufeffApp' column to 'App'")
-                    
-                    # Validate and log column names
-                    logger.info(f"Columns in loaded data: {list(df.columns)}")
-                    
-                    # Ensure numeric columns are properly converted
-                    numeric_columns = ['Reviews', 'Size', 'Installs', 'Price']
-                    for col in numeric_columns:
-                        if col in df.columns:
-                            # Convert to string first to handle any formatting issues
-                            df[col] = df[col].astype(str)
-                            # Remove any non-numeric characters
-                            if col == 'Installs':
-                                df[col] = df[col].str.replace('[+,]', '', regex=True)
-                            elif col == 'Price':
-                                df[col] = df[col].str.replace('$', '', regex=False)
-                            # Convert to numeric
-                            df[col] = pd.to_numeric(df[col], errors='coerce')
-                            # Fill NaN values
-                            if col in ['Reviews', 'Price']:
-                                df[col].fillna(0, inplace=True)
-                            else:
-                                df[col].fillna(df[col].median(), inplace=True)
-                    
-                    return df
-            
-            logger.error("No data file found")
-            return None
-        except Exception as e:
-            logger.error(f"Error loading data: {str(e)}")
-            return None
+        return load_catalog()
+    
+    def _artifact_path(self, config_path):
+        """A Config artifact path, or the file of the same name in artifacts_dir when one is set."""
+        if self.artifacts_dir is None:
+            return config_path
+        return os.path.join(self.artifacts_dir, os.path.basename(config_path))
+    
+    def _component(self, name, config_path, shared=None):
+        """A fitted component: this catalog's own file, the shared recommender's, or the Config file."""
+        own_path = self._artifact_path(config_path)
+        if own_path != config_path and os.path.exists(own_path):
+            return self._load_model(own_path)
+        component = getattr(shared, name, None)
+        if component is not None:
+            # Same object, same file: keep its digest so the version is computed without pickling it
+            digest = shared._artifact_digests.get(id(component))
+            if digest is not None:
+                self._artifact_digests[id(component)] = digest
+            return component
+        return self._load_model(config_path)
     
     def _load_model(self, model_path):
         """Load a model from a pickle file with robust error handling."""
@@ -119,20 +318,185 @@ class AppRecommender:
                 return None
                 
             with open(model_path, 'rb') as f:
-                model = pickle.load(f)
+                content = f.read()
+            model = pickle.loads(content)
+            self._artifact_digests[id(model)] = hashlib.sha1(content).hexdigest()
             logger.info(f"Successfully loaded model: {os.path.basename(model_path)}")
             return model
         except Exception as e:
             logger.error(f"Error loading model {os.path.basename(model_path)}: {str(e)}")
             return None
     
-    def _create_similarity_matrix(self):
-        """Create the similarity matrix for recommendations."""
+    def _load_compiled_forest(self, forest_path):
+        """Load the exported CompiledForest, or compile the loaded forest if it is missing or stale.
+        
+        The export is current only when it records the sha1 of the model file
+        that was loaded; a retrained forest can have the same shape.
+        """
+        estimators = getattr(self.model, 'estimators_', None)
+        if estimators is None:
+            logger.info("Rating model is not a fitted forest; predictions use model.predict")
+            return None
+        model_digest = self._artifact_digests.get(id(self.model))
+        if os.path.exists(forest_path):
+            try:
+                forest = CompiledForest.load(forest_path)
+                if model_digest is not None and forest.model_digest == model_digest:
+                    logger.info(f"Loaded compiled forest from {forest_path}")
+                    return forest
+                logger.warning(f"Compiled forest {os.path.basename(forest_path)} does not match the model; recompiling")
+            except Exception as e:
+                logger.error(f"Error loading compiled forest {os.path.basename(forest_path)}: {str(e)}")
+        try:
+            return CompiledForest.from_sklearn(self.model, model_digest)
+        except Exception as e:
+            logger.error(f"Error compiling rating model: {str(e)}")
+            return None
+    
+    def _predict_ratings(self, X):
+        """Predict ratings, using the compiled forest for batches small enough to be faster."""
+        compiled = getattr(self, 'compiled_model', None)
+        if compiled is not None and X.shape[0] <= Config.COMPILED_FOREST_MAX_BATCH:
+            return compiled.predict(X)
+        return self.model.predict(X)
+    
+    def _load_neighbor_table(self, table_path):
+        """Load an optional NeighborTable, ignoring it if it does not match the catalog."""
+        if not os.path.exists(table_path):
+            logger.info(f"No neighbor table at {table_path}")
+            return None
+        try:
+            table = NeighborTable.load(table_path)
+        except Exception as e:
+            logger.error(f"Error loading neighbor table {os.path.basename(table_path)}: {str(e)}")
+            return None
+        if table.n_rows != len(self.data):
+            logger.error(f"Neighbor table {os.path.basename(table_path)} has {table.n_rows} rows but the catalog has {len(self.data)}; ignoring it")
+            return None
+        logger.info(f"Loaded top-{table.k} neighbor table: {os.path.basename(table_path)}")
+        return table.to_precision(Config.SERVING_PRECISION)
+    
+    def _catalog_fingerprint(self):
+        """Hash of the catalog's app names, used to match saved artifacts to this data."""
+        digest = hashlib.sha1()
+        digest.update(str(len(self.data)).encode('utf-8'))
+        for name in self.data['App'].astype(str):
+            digest.update(name.encode('utf-8', 'replace'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def _component_digest(self, component):
+        """sha1 of the file a component was loaded from, or of its pickle when it was passed in."""
+        digest = self._artifact_digests.get(id(component))
+        if digest is None:
+            digest = hashlib.sha1(pickle.dumps(component)).hexdigest()
+            self._artifact_digests[id(component)] = digest
+        return digest
+    
+    def _transformers_fingerprint(self):
+        """Hash of the fitted transformers that produce the feature columns, used to match saved artifacts."""
+        digest = hashlib.sha1()
+        for component in (self.tfidf_vectorizer, self.encoder, self.scaler):
+            digest.update(self._component_digest(component).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _serving_version(self):
+        """Hash of the serving data, models, index and scoring settings.
+        
+        Workers that load the same files get the same version. Models loaded
+        from disk are identified by their file contents; passed-in models by
+        their pickle, which is only stable within one process.
+        """
+        digest = hashlib.sha1()
+        digest.update(pd.util.hash_pandas_object(self.data, index=False).values.tobytes())
+        digest.update('\0'.join(map(str, self.data.columns)).encode('utf-8'))
+        for component in (self.tfidf_vectorizer, self.encoder, self.scaler, self.model):
+            digest.update(self._component_digest(component).encode('utf-8'))
+        digest.update(json.dumps(self.index._meta(), sort_keys=True).encode('utf-8'))
+        if self.cf_neighbors is not None:
+            for array in (self.cf_neighbors.indices, self.cf_neighbors.scores, self.cf_neighbors.scales):
+                if array is not None:
+                    digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(f"{Config.HYBRID_CF_WEIGHT}|{self.default_block_weights}".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _load_saved_index(self, index_dir):
+        """Load a prebuilt index when it was built for this catalog, these transformers and the engine."""
+        meta = read_index_meta(index_dir)
+        if meta is None:
+            return None
+        if (meta.get('engine') != Config.SCORING_ENGINE or meta.get('precision') != Config.SERVING_PRECISION
+                or meta.get('catalog_fingerprint') != self.catalog_fingerprint):
+            logger.warning(f"Saved index in {index_dir} does not match the catalog or engine; rebuilding")
+            return None
+        # Refit transformers change the feature columns even when the catalog is the same
+        n_features = sum(self._block_sizes())
+        if (meta.get('transformers_fingerprint') != self.transformers_fingerprint
+                or meta.get('shape', [None, None])[1] != n_features):
+            logger.warning(f"Saved index in {index_dir} was built with other transformers "
+                           f"({meta.get('shape', [None, None])[1]} columns, these produce {n_features}); rebuilding")
+            return None
+        try:
+            index = load_index(index_dir, mmap=Config.INDEX_MMAP)
+            logger.info(f"Loaded saved {index.name} index from {index_dir}")
+            return index
+        except Exception as e:
+            logger.error(f"Error loading saved index: {str(e)}")
+            return None
+    
+    def _ensure_features_column(self):
+        """Build the 'Features' text column the TF-IDF vectorizer was fitted on."""
+        # Create Features column if it doesn't exist
+        if 'Features' not in self.data.columns:
+            logger.info("Creating 'Features' column from existing data")
+            try:
+                # Check if required columns exist
+                required_columns = ['Category', 'App']
+                missing_columns = [col for col in required_columns if col not in self.data.columns]
+                
+                if missing_columns:
+                    logger.error(f"Missing required columns: {missing_columns}")
+                    # Create missing columns with default values
+                    for col in missing_columns:
+                        logger.warning(f"Creating missing column '{col}' with default values")
+                        self.data[col] = 'Unknown'
+                
+                # Create Features column safely
+                self.data['Features'] = features_text(self.data)
+                
+            except Exception as e:
+                    logger.error(f"Error creating Features column: {str(e)}")
+                    # Create a basic Features column as fallback
+                    self.data['Features'] = 'default_feature'
+    
+    def _combine_features(self, frame):
+        """Sparse [text | numerical | categorical] blocks in the training column order.
+        
+        ``frame`` needs the NUMERICAL_FEATURES and CATEGORICAL_FEATURES
+        columns and the 'Features' text (built from the catalog columns when
+        absent). Rows are not normalized, so the result is what the rating
+        model was trained on.
+        """
+        text = frame['Features'] if 'Features' in frame.columns else features_text(frame)
+        return hstack([
+            self.tfidf_vectorizer.transform(text),
+            # Compact catalogs may hold float32 or integer columns; scale in float64 as in training
+            csr_matrix(self.scaler.transform(frame[NUMERICAL_FEATURES].astype(np.float64))),
+            csr_matrix(self.encoder.transform(frame[CATEGORICAL_FEATURES]))
+        ]).tocsr()
+    
+    def _block_sizes(self):
+        """Columns of the text, numerical and categorical blocks of _combine_features."""
+        categorical = sum(len(categories) for categories in self.encoder.categories_)
+        return [len(self.tfidf_vectorizer.vocabulary_), len(NUMERICAL_FEATURES), categorical]
+    
+    def _create_feature_matrix(self):
+        """Create the row-normalized combined feature matrix used for scoring."""
         # Define features first
-        numerical_features = ['Reviews', 'Size', 'Installs', 'Price']
-        categorical_features = ['Type', 'Content Rating']
+        numerical_features = NUMERICAL_FEATURES
+        categorical_features = CATEGORICAL_FEATURES
         
-        # Add this at the beginning of the _create_similarity_matrix method
+        # Add this at the beginning of the _create_feature_matrix method
         try:
             # Validate numerical features before processing
             for col in numerical_features:
@@ -141,7 +505,7 @@ class AppRecommender:
                     if not pd.api.types.is_numeric_dtype(self.data[col]):
                         logger.warning(f"Column {col} is not numeric. Converting to numeric.")
                         self.data[col] = pd.to_numeric(self.data[col], errors='coerce')
-                        self.data[col].fillna(self.data[col].median() if not self.data[col].isna().all() else 0, inplace=True)
+                        self.data[col] = self.data[col].fillna(self.data[col].median() if not self.data[col].isna().all() else 0)
             
             # Log some stats to help diagnose issues
             logger.info(f"Column {col} - min: {self.data[col].min()}, max: {self.data[col].max()}, mean: {self.data[col].mean()}, null count: {self.data[col].isna().sum()}")
@@ -164,84 +528,154 @@ class AppRecommender:
                     # Handle missing values in existing columns
                     self.data[col] = self.data[col].fillna('Unknown')
             
-            # Create Features column if it doesn't exist
-            if 'Features' not in self.data.columns:
-                logger.info("Creating 'Features' column from existing data")
-                try:
-                    # Check if required columns exist
-                    required_columns = ['Category', 'App']
-                    missing_columns = [col for col in required_columns if col not in self.data.columns]
-                    
-                    if missing_columns:
-                        logger.error(f"Missing required columns: {missing_columns}")
-                        # Create missing columns with default values
-                        for col in missing_columns:
-                            logger.warning(f"Creating missing column '{col}' with default values")
-                            self.data[col] = 'Unknown'
-                    
-                    # Create Features column safely
-                    self.data['Features'] = self.data['Category'].fillna('') + ' ' + \
-                                    self.data['App'].fillna('')
-                    
-                    if 'Genres' in self.data.columns:
-                        self.data['Features'] += ' ' + self.data['Genres'].fillna('')
-                    
-                except Exception as e:
-                        logger.error(f"Error creating Features column: {str(e)}")
-                        # Create a basic Features column as fallback
-                        self.data['Features'] = 'default_feature'
+            self._ensure_features_column()
                 
-            # Create feature matrices
-            if self.tfidf_vectorizer and 'Features' in self.data.columns:
-                text_features = self.tfidf_vectorizer.transform(self.data['Features'])
-            else:
+            # Check the fitted transformers before building the feature blocks
+            if not self.tfidf_vectorizer or 'Features' not in self.data.columns:
                 logger.error("TF-IDF vectorizer not loaded or 'Features' column missing")
                 return None
-                
-            # Now we can safely use numerical_features since we've created any missing ones
-            if self.scaler:
-                numerical_scaled = self.scaler.transform(self.data[numerical_features])
-                numerical_scaled_sparse = csr_matrix(numerical_scaled)
-            else:
+            if not self.scaler:
                 logger.error("Scaler not loaded")
                 return None
-                
-            # Now we can safely use categorical_features since we've created any missing ones
-            if self.encoder:
-                categorical_encoded = self.encoder.transform(self.data[categorical_features])
-                categorical_encoded_sparse = csr_matrix(categorical_encoded)
-            else:
+            if not self.encoder:
                 logger.error("Encoder not loaded")
                 return None
             
-            # Combine features
-            from scipy.sparse import hstack
-            combined_features = hstack([
-                text_features,
-                numerical_scaled_sparse,
-                categorical_encoded_sparse
-            ])
-            
-            # Create similarity matrix
-            similarity_matrix = cosine_similarity(combined_features)
-            logger.info(f"Created similarity matrix with shape {similarity_matrix.shape}")
-            return similarity_matrix
+            combined_features = self._combine_features(self.data)
+            
+            # Normalize rows so dot products are cosine similarities
+            features = normalize_features(combined_features)
+            logger.info(f"Created feature matrix with shape {features.shape} and {features.nnz} non-zeros")
+            return features
                 
         except Exception as e:
-            logger.error(f"Error creating similarity matrix: {str(e)}")
+            logger.error(f"Error creating feature matrix: {str(e)}")
             return None
     
-    def get_recommendations(self, app_name, num_recommendations=5):
-        """Get recommendations for an app based on similarity."""
-        # Inside get_recommendations method
+    def predict_catalog_ratings(self):
+        """The rating model's prediction for every catalog app, rounded to 2 places, in one batched pass.
+        
+        Run offline by app.ratings; startup only loads the saved result.
+        """
+        data = self.data.assign(**{column: self.data[column].fillna('Unknown') for column in CATEGORICAL_FEATURES})
+        return np.round(self._predict_ratings(self._combine_features(data)), 2)
+    
+    def rating_key(self):
+        """Fingerprints of the catalog, transformers and model that saved predicted ratings must match."""
+        return {
+            'catalog_fingerprint': self.catalog_fingerprint,
+            'transformers_fingerprint': self.transformers_fingerprint,
+            'model_digest': self._component_digest(self.model)
+        }
+    
+    def _records(self, rows):
+        """Response records for catalog rows, with predicted ratings when available."""
+        columns = ['App', 'Category', 'Rating']
+        if 'Predicted Rating' in self.data.columns:
+            columns.append('Predicted Rating')
+        return self.data.iloc[rows][columns].to_dict('records')
+    
+    def _blend_collaborative(self, app_idx, query, indices, scores, mask=None, index=None):
+        """Blend content scores with the app's item-item collaborative scores.
+        
+        Collaborative neighbors outside the content candidates are scored
+        exactly so every candidate gets both components.
+        """
+        weight = Config.HYBRID_CF_WEIGHT
+        cf_indices, cf_scores = self.cf_neighbors.neighbors(app_idx)
+        if mask is not None:
+            allowed = mask[cf_indices]
+            cf_indices, cf_scores = cf_indices[allowed], cf_scores[allowed]
+        candidates = np.union1d(indices, cf_indices)
+        blended = (1.0 - weight) * (index or self.index).score_rows(query, candidates)
+        blended[np.searchsorted(candidates, cf_indices)] += weight * cf_scores
+        order = np.argsort(-blended, kind='stable')
+        return candidates[order], blended[order]
+    
+    def _unique_recommendations(self, app_idx, indices, num_recommendations):
+        """Take ranked rows in order, skipping the input app and repeated names."""
+        unique_app_recommendations = []
+        seen_apps = set()
+        
+        # Add the input app to seen_apps to avoid recommending the same app
+        input_app_name = self.data['App'].iat[app_idx]
+        seen_apps.add(input_app_name.lower())
+        
+        # Get unique recommendations; names of all candidates in one lookup
+        names = self.data['App'].iloc[np.asarray(indices)].tolist()
+        for idx, app_name in zip(indices, names):
+            if app_name.lower() not in seen_apps:
+                seen_apps.add(app_name.lower())
+                unique_app_recommendations.append(idx)
+                if len(unique_app_recommendations) >= num_recommendations:
+                    break
+        return unique_app_recommendations
+    
+    def _rank(self, app_idx, num_recommendations, mode='content', mask=None, search=None, stages=None, weights=None):
+        """Rows recommended for a catalog row and the engine that scored them.
+        
+        Duplicate names are skipped, so extra rows are fetched and the search
+        widened if needed. ``search(fetch)`` returns the top ``fetch`` content
+        matches; by default it queries the index with the row's features, or
+        the block features with ``weights`` (see app.blocks).
+        """
+        if weights is not None:
+            index, query = self.blocks.index, self.blocks.query(app_idx, weights)
+        else:
+            index, query = self.index, self.features[app_idx]
+        if search is None:
+            search = lambda fetch: index.search(query, fetch, mask)
+        fetch = min(2 * num_recommendations + 1, len(self.data))
+        while True:
+            result = search(fetch)
+            indices = result.indices
+            if mode == 'hybrid':
+                indices, _ = self._blend_collaborative(app_idx, query, result.indices, result.scores, mask, index)
+            if stages is not None:
+                stages.lap('score')
+            rows = self._unique_recommendations(app_idx, indices, num_recommendations)
+            if stages is not None:
+                stages.lap('dedupe')
+            if len(rows) >= num_recommendations or len(result.indices) < fetch or fetch >= len(self.data):
+                return rows, result.engine
+            fetch = min(fetch * 4, len(self.data))
+    
+    def get_recommendations(self, app_name, num_recommendations=5, mode='content', filters=None, weights=None):
+        """Get recommendations for an app based on similarity.
+        
+        ``mode='hybrid'`` blends in collaborative scores when a CF neighbor
+        table is loaded and falls back to content scores otherwise.
+        ``filters`` (see app.filters) restricts the candidates before ranking.
+        ``weights`` (see app.blocks) re-balances the feature blocks; it
+        defaults to FEATURE_BLOCK_WEIGHTS.
+        """
+        stages = StageTimer(RECOMMEND_STAGE_SECONDS)
+        outcome = 'error'
         try:
-            if self.data is None or self.similarity_matrix is None:
+            if self.data is None or self.index is None:
                 return {
                     'status': 'error',
                     'message': 'Recommender not properly initialized',
                     'recommendations': []
                 }
             
+            if mode not in RECOMMENDATION_MODES:
+                return {
+                    'status': 'error',
+                    'message': f"Unknown mode '{mode}'. Use one of: {', '.join(RECOMMENDATION_MODES)}",
+                    'recommendations': []
+                }
+            if mode == 'hybrid' and getattr(self, 'cf_neighbors', None) is None:
+                logger.warning("Hybrid mode requested but no collaborative neighbors are loaded; using content scores")
+                mode = 'content'
+            weights = weights if weights is not None else getattr(self, 'default_block_weights', None)
+            if weights is not None and getattr(self, 'blocks', None) is None:
+                return {
+                    'status': 'error',
+                    'message': 'Feature block weights are not enabled; set FEATURE_BLOCKS=1',
+                    'recommendations': []
+                }
+            
             # Find the app in the dataset - try exact match first
             app_indices = self.data.index[self.data['App'] == app_name].tolist()
             
@@ -249,6 +683,10 @@ class AppRecommender:
             if not app_indices and 'App' in self.data.columns:
                 app_indices = self.data.index[self.data['App'].str.lower() == app_name.lower()].tolist()
             
+            # Then names of near-duplicate listings collapsed at ingest
+            if not app_indices and app_name.lower() in getattr(self, 'duplicate_aliases', {}):
+                app_indices = [self.duplicate_aliases[app_name.lower()]]
+            
             # If still no match, try partial match
             if not app_indices and 'App' in self.data.columns:
                 # Look for apps that contain the search term
@@ -258,7 +696,9 @@ class AppRecommender:
                     app_indices = [partial_matches[0]]
                     logger.info(f"Using partial match: {self.data.loc[partial_matches[0], 'App']} for query '{app_name}'")
             
+            stages.lap('resolve')
             if not app_indices:
+                outcome = 'not_found'
                 # App not found, return similar app names as suggestions
                 if 'App' in self.data.columns:
                     app_name_lower = app_name.lower()
@@ -281,6 +721,7 @@ class AppRecommender:
                                 if category_apps:
                                     suggestions = category_apps
                                     break
+                    stages.lap('suggest')
                     
                     return {
                         'status': 'error',
@@ -297,36 +738,22 @@ class AppRecommender:
             # Get the app index
             app_idx = app_indices[0]
             
-            # Get similarity scores
-            similarity_scores = self.similarity_matrix[app_idx]
-            
-            # Get indices of most similar apps (excluding the app itself)
-            similar_indices = similarity_scores.argsort()[::-1][1:]
-            
-            # Filter out duplicate app names
-            unique_app_recommendations = []
-            seen_apps = set()
-            
-            # Add the input app to seen_apps to avoid recommending the same app
-            input_app_name = self.data.iloc[app_idx]['App']
-            seen_apps.add(input_app_name.lower())
-            
-            # Get unique recommendations
-            for idx in similar_indices:
-                app_name = self.data.iloc[idx]['App']
-                if app_name.lower() not in seen_apps:
-                    seen_apps.add(app_name.lower())
-                    unique_app_recommendations.append(idx)
-                    if len(unique_app_recommendations) >= num_recommendations:
-                        break
+            mask = self.masks.mask(filters) if filters else None
+            unique_app_recommendations, engine = self._rank(app_idx, num_recommendations, mode, mask, stages=stages,
+                                                            weights=weights)
             
             # Get the recommended apps
-            recommended_apps = self.data.iloc[unique_app_recommendations][['App', 'Category', 'Rating']].to_dict('records')
+            recommended_apps = self._records(unique_app_recommendations)
+            stages.lap('records')
             
             logger.info(f"Successfully found {len(recommended_apps)} recommendations for {app_name}")
             
+            outcome = 'success'
             return {
                 'status': 'success',
+                'mode': mode,
+                'engine': engine,
+                'weights': weights,
                 'recommendations': recommended_apps
             }
             
@@ -337,4 +764,121 @@ class AppRecommender:
                 'status': 'error',
                 'message': str(e),
                 'recommendations': []
+            }
+        finally:
+            stages.finish()
+            RECOMMENDATIONS.labels(outcome).inc()
+    
+    def prepare_unseen_apps(self, apps):
+        """Validate raw feature dicts of apps outside the catalog and return a clean frame.
+        
+        Each dict needs the NUMERICAL_FEATURES and CATEGORICAL_FEATURES keys
+        and some text: 'description' and/or the 'Category', 'Genres' and
+        'App' fields used for catalog apps. Raises ValueError on bad input.
+        """
+        frame = pd.DataFrame(list(apps))
+        missing = [col for col in NUMERICAL_FEATURES + CATEGORICAL_FEATURES if col not in frame.columns or frame[col].isna().any()]
+        if missing:
+            raise ValueError(f"Missing features: {', '.join(missing)}")
+        
+        # Same text fields and numeric cleaning as catalog rows
+        text_columns = [col for col in ('Category', 'Genres', 'App', 'description') if col in frame.columns]
+        if not text_columns:
+            raise ValueError("Provide a 'description' or the 'Category', 'Genres' and 'App' fields")
+        frame['Features'] = frame[text_columns].fillna('').astype(str).agg(' '.join, axis=1)
+        for col in NUMERICAL_FEATURES:
+            # Accept catalog-style strings such as '1,000+', '$1.99' and '25M'
+            cleaned = frame[col].astype(str).str.strip().str.replace('[+,$]', '', regex=True)
+            if col == 'Size':
+                cleaned = cleaned.str.rstrip('Mm')
+            frame[col] = pd.to_numeric(cleaned, errors='coerce')
+        invalid = [col for col in NUMERICAL_FEATURES if frame[col].isna().any()]
+        if invalid:
+            raise ValueError(f"Features must be numeric: {', '.join(invalid)}")
+        frame[CATEGORICAL_FEATURES] = frame[CATEGORICAL_FEATURES].astype(str)
+        return frame
+    
+    def predict_unseen(self, apps, num_recommendations=5):
+        """Predict ratings and find catalog neighbors for apps not in the catalog.
+        
+        The batch is vectorized once in the serving block order, rated with
+        one model call and each normalized row is searched in the index.
+        """
+        frame = self.prepare_unseen_apps(apps)
+        combined = self._combine_features(frame)
+        ratings = self._predict_ratings(combined)
+        queries = normalize_features(combined)
+        
+        results = []
+        for row, rating in enumerate(ratings):
+            fetch = min(2 * num_recommendations, len(self.data))
+            result = self.index.search(queries[row], fetch)
+            rows, seen = [], set()
+            for idx in result.indices:
+                name = self.data.iloc[idx]['App'].lower()
+                if name not in seen:
+                    seen.add(name)
+                    rows.append(idx)
+                    if len(rows) >= num_recommendations:
+                        break
+            results.append({
+                # Rounded like the catalog's 'Predicted Rating' column
+                'predicted_rating': round(float(rating), 2),
+                'engine': result.engine,
+                'recommended_apps': self._records(rows)
+            })
+        return results
+    
+    def suggest(self, prefix, limit=8):
+        """Autocomplete app names starting with a prefix, most popular first."""
+        if self.data is None or getattr(self, 'prefix_index', None) is None:
+            return []
+        rows = self.prefix_index.suggest(prefix, limit)
+        return self.data.iloc[rows][['App', 'Category']].to_dict('records')
+    
+    def search(self, query, num_results=10, filters=None):
+        """Find apps matching a free-text query such as 'photo editor'."""
+        try:
+            if self.data is None or getattr(self, 'text_index', None) is None:
+                return {
+                    'status': 'error',
+                    'message': 'Recommender not properly initialized',
+                    'results': []
+                }
+            
+            mask = self.masks.mask(filters) if filters else None
+            # Fetch extra rows so repeated app names can be skipped
+            fetch = min(2 * num_results, len(self.data))
+            while True:
+                result = self.text_index.search(query, fetch, mask)
+                rows, scores, seen = [], [], set()
+                for idx, score in zip(result.indices, result.scores):
+                    name = self.data.iloc[idx]['App'].lower()
+                    if name not in seen:
+                        seen.add(name)
+                        rows.append(idx)
+                        scores.append(round(float(score), 4))
+                        if len(rows) >= num_results:
+                            break
+                if len(rows) >= num_results or len(result.indices) < fetch or fetch >= len(self.data):
+                    break
+                fetch = min(fetch * 4, len(self.data))
+            
+            results = self._records(rows)
+            for record, score in zip(results, scores):
+                record['score'] = score
+            
+            return {
+                'status': 'success',
+                'engine': result.engine,
+                'results': results
+            }
+        
+        except Exception as e:
+            logger.error(f"Error searching for '{query}': {str(e)}")
+            logger.error(f"Error details: {traceback.format_exc()}")
+            return {
+                'status': 'error',
+                'message': str(e),
+                'results': []
             }
\ No newline at end of file
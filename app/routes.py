@@ -1,41 +1,132 @@
-from flask import Blueprint, jsonify, request, current_app, render_template
-from werkzeug.exceptions import HTTPException, BadRequest
+from flask import Blueprint, jsonify, request, current_app, render_template, Response
+from werkzeug.exceptions import HTTPException, BadRequest, NotFound
 import logging
 import traceback
+import hashlib
+import threading
 from datetime import datetime
 import os
 from app.models import App, Review, db
+from app.database import read_session, database_status
+from app.metrics import REGISTRY, RECOMMEND_STAGE_SECONDS, StageTimer
+from app.middleware import REQUEST_ID_PATTERN
+from app.profiling import is_admin
 
 bp = Blueprint('main', __name__)
 logger = logging.getLogger(__name__)
 
+def request_recommender():
+    """The recommender of the request's ``catalog`` parameter, or the default one (see app.catalogs).
+
+    Raises NotFound for catalogs that are not configured and BadRequest for
+    a JSON body that is not an object.
+    """
+    from app.config import Config
+    
+    name = request.args.get('catalog')
+    if name is None and request.method == 'POST':
+        body = request.get_json(silent=True)
+        if body is not None and not isinstance(body, dict):
+            raise BadRequest('Request body must be a JSON object')
+        name = (body or {}).get('catalog')
+    registry = getattr(current_app, 'catalogs', None)
+    if not name or name == Config.DEFAULT_CATALOG:
+        return current_app.recommender
+    if registry is None or name not in registry.paths:
+        raise NotFound(f"Unknown catalog '{name}'")
+    return registry.get(name)
+
+# Exports streaming from this process; each ranks the whole catalog in the worker
+_exports = {'active': 0}
+_exports_lock = threading.Lock()
+
+def _claim_export(limit):
+    """Count a new export unless ``limit`` are already streaming; False if none is free."""
+    with _exports_lock:
+        if _exports['active'] >= limit:
+            return False
+        _exports['active'] += 1
+        return True
+
+def _release_export():
+    with _exports_lock:
+        _exports['active'] -= 1
+
+def _request_etag(recommender):
+    """Strong ETag of a GET response: the recommender version, path and query parameters."""
+    version = getattr(recommender, 'version', None)
+    if request.method != 'GET' or version is None:
+        return None
+    digest = hashlib.sha1(f"{version}\0{request.path}".encode('utf-8'))
+    for key, value in sorted(request.args.items(multi=True)):
+        digest.update(f"\0{key}={value}".encode('utf-8'))
+    return digest.hexdigest()
+
+def _cacheable(response, etag):
+    """Mark a response as reusable until max-age and revalidated by ETag after."""
+    if etag is not None:
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('HTTP_CACHE_MAX_AGE', 300)
+    return response
+
+def _not_modified(etag):
+    """An empty 304 when the client already holds this response, otherwise None."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return _cacheable(current_app.response_class(status=304), etag)
+
 @bp.route('/api/recommend', methods=['GET', 'POST'])
 def recommend():
     try:
         # Get the recommender from the app
-        recommender = current_app.recommender
+        recommender = request_recommender()
         
-        if recommender is None or not hasattr(recommender, 'data') or not hasattr(recommender, 'similarity_matrix'):
+        if recommender is None or not hasattr(recommender, 'data') or not hasattr(recommender, 'index'):
             logger.error("Recommender not properly initialized")
             return jsonify({
                 'status': 'error',
                 'message': 'Recommender service is currently unavailable',
                 'code': 'RECOMMENDER_UNAVAILABLE'
             }), 503
+        
+        # Answer revalidations before parsing or scoring anything
+        etag = _request_etag(recommender)
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        
+        # Loaded with the recommender; importing them here keeps routes free of pandas and scikit-learn
+        from app.recommender import RECOMMENDATION_MODES
+        from app.filters import parse_filters
+        from app.blocks import parse_block_weights
             
         # Handle both GET and POST requests
         if request.method == 'POST':
             # For POST requests, get data from JSON body
             data = request.get_json()
             app_name = data.get('app_name', '').strip() if data else ''
+            mode = data.get('mode', 'content') if data else 'content'
+            params = data or {}
         else:
             # For GET requests, get data from query parameters
             app_name = request.args.get('app_name', '').strip()
+            mode = request.args.get('mode', 'content')
+            params = request.args
             
         if not app_name:
             raise BadRequest('Please provide a valid app name')
+        if mode not in RECOMMENDATION_MODES:
+            raise BadRequest(f"Invalid mode '{mode}'. Use one of: {', '.join(RECOMMENDATION_MODES)}")
+        try:
+            filters = parse_filters(params)
+            weights = parse_block_weights(params.get('weights'))
+        except ValueError as e:
+            raise BadRequest(str(e))
+        if weights is not None and getattr(recommender, 'blocks', None) is None:
+            raise BadRequest('Feature block weights are not enabled on this server')
 
-        recommendations = recommender.get_recommendations(app_name)
+        recommendations = recommender.get_recommendations(app_name, mode=mode, filters=filters, weights=weights)
         
         if recommendations.get('status') == 'error':
             logger.warning(f"Recommendation error for {app_name}: {recommendations['message']}")
@@ -46,16 +137,24 @@ def recommend():
                 'popular': recommendations.get('popular', [])
             }), 404
 
-        return jsonify({
+        stages = StageTimer(RECOMMEND_STAGE_SECONDS)
+        response = jsonify({
             'status': 'success',
             'app_name': app_name,
+            'mode': recommendations.get('mode', mode),
+            'engine': recommendations.get('engine'),
+            'weights': recommendations.get('weights'),
+            'filters': filters,
             'recommendations': recommendations.get('recommendations', [])
         })
-    except BadRequest as e:
+        stages.lap('encode')
+        stages.finish()
+        return _cacheable(response, etag)
+    except (BadRequest, NotFound) as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 400
+        }), e.code
     except Exception as e:
         error_details = {
             'error_type': type(e).__name__,
@@ -69,6 +168,88 @@ def recommend():
             'details': str(e) if current_app.debug else None
         }), 500
 
+@bp.route('/api/search', methods=['GET', 'POST'])
+def search():
+    """Recommend apps for a free-text query instead of an exact app name."""
+    try:
+        recommender = request_recommender()
+        
+        if recommender is None or not hasattr(recommender, 'text_index'):
+            logger.error("Recommender not properly initialized")
+            return jsonify({
+                'status': 'error',
+                'message': 'Recommender service is currently unavailable',
+                'code': 'RECOMMENDER_UNAVAILABLE'
+            }), 503
+        
+        from app.filters import parse_filters
+        
+        params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+        query = str(params.get('q', '')).strip()
+        if not query:
+            raise BadRequest('Please provide a search query')
+        try:
+            count = int(params.get('count', 10))
+        except (TypeError, ValueError):
+            raise BadRequest('count must be an integer')
+        if count < 1:
+            raise BadRequest('count must be positive')
+        try:
+            filters = parse_filters(params)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        
+        results = recommender.search(query, num_results=count, filters=filters)
+        if results.get('status') == 'error':
+            return jsonify({
+                'status': 'error',
+                'message': results['message']
+            }), 500
+        
+        return jsonify({
+            'status': 'success',
+            'query': query,
+            'engine': results.get('engine'),
+            'filters': filters,
+            'results': results['results']
+        })
+    except (BadRequest, NotFound) as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), e.code
+    except Exception as e:
+        logger.error(f"Search request failed: {str(e)}", extra={
+            'traceback': traceback.format_exc()
+        })
+        return jsonify({
+            'status': 'error',
+            'message': 'Internal server error'
+        }), 500
+
+@bp.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Autocomplete app names for the search box."""
+    from app.config import Config
+    
+    recommender = request_recommender()
+    if recommender is None or not hasattr(recommender, 'prefix_index'):
+        return jsonify({
+            'status': 'error',
+            'message': 'Recommender service is currently unavailable',
+            'code': 'RECOMMENDER_UNAVAILABLE',
+            'suggestions': []
+        }), 503
+    
+    query = request.args.get('q', '')
+    count = request.args.get('count', Config.SUGGEST_LIMIT, type=int)
+    count = max(1, min(count, Config.MAX_SUGGESTIONS))
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'suggestions': recommender.suggest(query, count)
+    })
+
 @bp.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
@@ -82,13 +263,13 @@ def health_check():
     recommender_status = {
         'initialized': current_app.recommender is not None,
         'has_data': False,
-        'has_similarity_matrix': False,
+        'has_index': False,
         'has_models': False
     }
     
     if current_app.recommender is not None:
         recommender_status['has_data'] = hasattr(current_app.recommender, 'data') and current_app.recommender.data is not None
-        recommender_status['has_similarity_matrix'] = hasattr(current_app.recommender, 'similarity_matrix') and current_app.recommender.similarity_matrix is not None
+        recommender_status['has_index'] = hasattr(current_app.recommender, 'index') and current_app.recommender.index is not None
         recommender_status['has_models'] = all([
             hasattr(current_app.recommender, 'tfidf_vectorizer') and current_app.recommender.tfidf_vectorizer is not None,
             hasattr(current_app.recommender, 'encoder') and current_app.recommender.encoder is not None,
@@ -116,6 +297,7 @@ def health_check():
         'recommender': recommender_status,
         'model_files': model_files,
         'data_files': data_files,
+        'database': database_status(current_app),
         'config': {
             'tfidf_path': Config.TFIDF_PATH,
             'encoder_path': Config.ENCODER_PATH,
@@ -124,11 +306,38 @@ def health_check():
         }
     })
 
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, recommendation-stage and startup metrics in Prometheus text format."""
+    text = REGISTRY.render(current_app.config.get('METRICS_DIR'))
+    return Response(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Request ids of stored profiles, newest first (admin token required)."""
+    if not is_admin(current_app):
+        return jsonify({'status': 'error', 'message': 'Admin token required'}), 403
+    return jsonify({'status': 'success', 'profiles': current_app.profile_store.list()})
+
+@bp.route('/api/admin/profiles/<request_id>', methods=['GET'])
+def get_profile(request_id):
+    """Text summary of a stored profile, or the raw pstats file with ?format=prof."""
+    if not is_admin(current_app):
+        return jsonify({'status': 'error', 'message': 'Admin token required'}), 403
+    raw = request.args.get('format') == 'prof'
+    profile = current_app.profile_store.get(request_id, raw=raw) if REQUEST_ID_PATTERN.match(request_id) else None
+    if profile is None:
+        return jsonify({'status': 'error', 'message': f"No profile stored for request '{request_id}'"}), 404
+    if raw:
+        return Response(profile, mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename="{request_id}.prof"'})
+    return Response(profile, content_type='text/plain; charset=utf-8')
+
 @bp.route('/api/popular', methods=['GET'])
 def popular_apps():
     try:
         # Get the recommender from the app
-        recommender = current_app.recommender
+        recommender = request_recommender()
         
         if recommender is None or not hasattr(recommender, 'data'):
             logger.error("Recommender not properly initialized")
@@ -139,16 +348,21 @@ def popular_apps():
                 'popular_apps': []
             }), 503
         
+        etag = _request_etag(recommender)
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        
         # Get count parameter, default to 10
         count = request.args.get('count', 10, type=int)
         
         # Get popular apps based on review count
         if recommender.data is not None and len(recommender.data) > 0:
             popular_apps = recommender.data.sort_values('Reviews', ascending=False).head(count)
-            return jsonify({
+            return _cacheable(jsonify({
                 'success': True,
                 'popular_apps': popular_apps[['App', 'Category', 'Rating', 'Reviews']].to_dict('records')
-            })
+            }), etag)
         else:
             return jsonify({
                 'status': 'error',
@@ -156,6 +370,12 @@ def popular_apps():
                 'popular_apps': []
             }), 404
             
+    except NotFound as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'popular_apps': []
+        }), 404
     except Exception as e:
         logger.error(f"Popular apps request failed: {str(e)}", extra={
             'traceback': traceback.format_exc()
@@ -166,6 +386,54 @@ def popular_apps():
             'popular_apps': []
         }), 500
 
+@bp.route('/api/export', methods=['GET'])
+def export():
+    """Stream the recommendations of every catalog app as NDJSON (admin token required, see app.export).
+
+    Ranking the whole catalog ties up the web worker, so only
+    ``MAX_CONCURRENT_EXPORTS`` run per process; large catalogs are better
+    exported to a file with ``python -m app.export``.
+    """
+    from app.config import Config
+    
+    if not is_admin(current_app):
+        return jsonify({'status': 'error', 'message': 'Admin token required'}), 403
+    recommender = request_recommender()
+    if recommender is None or getattr(recommender, 'index', None) is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Recommender service is currently unavailable',
+            'code': 'RECOMMENDER_UNAVAILABLE'
+        }), 503
+    
+    etag = _request_etag(recommender)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    
+    from app.recommender import RECOMMENDATION_MODES
+    from app.export import iter_recommendations, ndjson_lines
+    
+    count = request.args.get('count', Config.MAX_RECOMMENDATIONS, type=int)
+    mode = request.args.get('mode', 'content')
+    if not 1 <= count <= Config.MAX_RECOMMENDATIONS:
+        return jsonify({'status': 'error', 'message': f"count must be between 1 and {Config.MAX_RECOMMENDATIONS}"}), 400
+    if mode not in RECOMMENDATION_MODES:
+        return jsonify({'status': 'error', 'message': f"Invalid mode '{mode}'. Use one of: {', '.join(RECOMMENDATION_MODES)}"}), 400
+    
+    if not _claim_export(Config.MAX_CONCURRENT_EXPORTS):
+        return jsonify({'status': 'error', 'message': 'Too many exports running; try again later'}), 429
+    
+    # Sent in chunks as blocks are ranked; the web worker ranks them itself
+    lines = ndjson_lines(iter_recommendations(recommender, count, mode))
+    response = _cacheable(Response(lines, mimetype='application/x-ndjson'), etag)
+    # Runs when the stream ends or the client goes away
+    response.call_on_close(_release_export)
+    # Admin-only: shared caches must not hand it to other clients
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
 @bp.errorhandler(HTTPException)
 def handle_http_error(e):
     return jsonify({
@@ -190,10 +458,10 @@ def recommender_status():
     """Check if the recommender is initialized and working properly."""
     from app.config import Config
     
-    recommender = current_app.recommender
+    recommender = request_recommender()
     missing_files = Config.verify_paths()
     
-    if recommender is None or not hasattr(recommender, 'data') or not hasattr(recommender, 'similarity_matrix'):
+    if recommender is None or not hasattr(recommender, 'data') or not hasattr(recommender, 'index'):
         return jsonify({
             'status': 'error',
             'initialized': False,
@@ -205,16 +473,24 @@ def recommender_status():
     # Check if the recommender has data
     has_data = recommender.data is not None and len(recommender.data) > 0
     
-    # Check if the similarity matrix is created
-    has_similarity_matrix = recommender.similarity_matrix is not None
+    # Check if the scoring index is built
+    has_index = recommender.index is not None
+    
+    from app.memory import memory_report
+    
+    # Listings collapsed into near-duplicate representatives at ingest (DEDUP_CATALOG)
+    duplicates = getattr(recommender, 'duplicates', None)
     
     return jsonify({
         'status': 'success',
         'initialized': True,
         'has_data': has_data,
-        'has_similarity_matrix': has_similarity_matrix,
+        'has_index': has_index,
         'data_shape': recommender.data.shape if has_data else None,
-        'similarity_matrix_shape': recommender.similarity_matrix.shape if has_similarity_matrix else None,
+        'duplicates_collapsed': len(duplicates) if duplicates is not None else None,
+        'index': recommender.index.describe() if has_index else None,
+        'memory': memory_report(recommender),
+        'catalogs': current_app.catalogs.describe() if getattr(current_app, 'catalogs', None) is not None else None,
         'current_directory': os.getcwd(),
         'base_directory': Config.BASE_DIR
     })
@@ -226,8 +502,11 @@ def get_app_reviews(app_name):
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         
+        # Review reads go to the replica when one is configured
+        session = read_session()
+        
         # Find the app
-        app = App.query.filter_by(name=app_name).first()
+        app = session.query(App).filter_by(name=app_name).first()
         if not app:
             return jsonify({
                 'status': 'error',
@@ -235,7 +514,7 @@ def get_app_reviews(app_name):
             }), 404
         
         # Get reviews with pagination
-        reviews_query = Review.query.filter_by(app_id=app.id)
+        reviews_query = session.query(Review).filter_by(app_id=app.id)
         total_reviews_count = reviews_query.count()  # Get total review count
         reviews_paginated = reviews_query.paginate(page=page, per_page=per_page, error_out=False)
         
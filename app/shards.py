@@ -0,0 +1,250 @@
+"""
+Scatter-gather scoring over a feature matrix split across local worker processes.
+
+With ``SERVING_SHARDS=n`` (n > 1) the exact index's rows are split into n
+contiguous row ranges, each held by its own worker process. A query is sent
+to every shard whose range has allowed rows; each scores its rows and
+returns its own top-k, and this process merges them. ``_top_k`` breaks
+ties by row, so the merged list is exactly the single-process result.
+
+Workers are started with 'spawn' and talk over pipes, so everything runs
+on one machine. A round trip holds a lock, so concurrent requests queue
+for the shards rather than interleave on the pipes. Processes forked from
+the one that started the workers (e.g. ``gunicorn --preload``, or export
+``--jobs``) cannot use them.
+
+If a shard dies or a pipe breaks mid-query, replies of the other shards
+may be left unread in their pipes, so the index stops every worker and
+refuses further queries rather than merge them into a later result.
+Restart the process to serve again.
+
+``describe()`` reports, per query, the time spent in the slowest shard and
+the rest of the round trip: pickling, pipes and the merge.
+
+Limits: the serving process still builds (or loads) the whole feature
+matrix at startup and only frees it once the shards hold their slices,
+so sharding lowers steady-state memory but not peak RSS at startup. The
+collaborative neighbor table (``cf_neighbors``) is not sharded; it stays
+whole in the serving process and hybrid mode reads it there.
+"""
+import os
+import time
+import logging
+import threading
+import weakref
+import multiprocessing
+import numpy as np
+from scipy.sparse import csr_matrix
+from app.config import Config
+from app.index import ExactIndex, SearchResult, _top_k
+from app.quantization import validate_precision, float_dtype
+
+logger = logging.getLogger(__name__)
+
+
+def _serve_shard(connection, features, precision):
+    """Worker loop: answer requests against one row range until told to close."""
+    index = ExactIndex(features, precision)
+    connection.send(index.nbytes)
+    while True:
+        op, args = connection.recv()
+        if op == 'close':
+            break
+        start_time = time.perf_counter()
+        try:
+            if op == 'search':
+                query, k, mask = args
+                if mask is not None:
+                    mask = np.unpackbits(mask, count=index.n_rows).astype(bool)
+                result = index.exact_search(query, k, mask)
+                reply = (result.indices, result.scores)
+            elif op == 'score_rows':
+                query, rows = args
+                reply = index.score_rows(query, rows)
+            elif op == 'row':
+                reply = index.features[args]
+            else:
+                raise ValueError(f"Unknown shard request '{op}'")
+        except Exception as e:
+            reply = e
+        connection.send((reply, time.perf_counter() - start_time))
+    connection.close()
+
+
+def _stop_workers(connections, processes):
+    for connection in connections:
+        try:
+            connection.send(('close', None))
+            connection.close()
+        except (OSError, ValueError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+
+class ShardedRows:
+    """Row access to a sharded feature matrix; each row comes from the shard that owns it."""
+
+    def __init__(self, index):
+        self.index = index
+
+    @property
+    def shape(self):
+        return self.index.shape
+
+    @property
+    def dtype(self):
+        return self.index.dtype
+
+    def __getitem__(self, row):
+        return self.index.row(int(row))
+
+
+class ShardedIndex:
+    """Exact scoring with the feature matrix split by row range across local worker processes."""
+
+    name = 'sharded'
+
+    def __init__(self, features, n_shards, precision=None):
+        self.precision = validate_precision(precision or Config.SERVING_PRECISION)
+        features = csr_matrix(features)
+        self.shape = features.shape
+        self.dtype = np.dtype(float_dtype(self.precision))
+        n_shards = max(1, min(int(n_shards), self.shape[0]))
+        # Shard i owns rows offsets[i]:offsets[i + 1]
+        self.offsets = np.linspace(0, self.shape[0], n_shards + 1).astype(np.int64)
+        self.features = ShardedRows(self)
+        self.stats = {'queries': 0, 'seconds': 0.0, 'shard_seconds': 0.0}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        # Set when a round trip failed part way; the pipes may hold stale replies
+        self.broken = False
+
+        context = multiprocessing.get_context('spawn')
+        self._connections, self._processes = [], []
+        start_time = time.perf_counter()
+        for lo, hi in self.ranges:
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve_shard, args=(child, features[lo:hi], self.precision), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self._finalizer = weakref.finalize(self, _stop_workers, self._connections, self._processes)
+        self.shard_nbytes = [connection.recv() for connection in self._connections]
+        logger.info(f"Started {n_shards} shard workers over {self.shape[0]} rows "
+                    f"in {time.perf_counter() - start_time:.1f}s")
+
+    @property
+    def ranges(self):
+        return list(zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist()))
+
+    @property
+    def n_shards(self):
+        return len(self.offsets) - 1
+
+    @property
+    def n_rows(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        """Bytes held by this process; the rows live in the shard workers (see ``shard_nbytes``)."""
+        return self.offsets.nbytes
+
+    def _scatter(self, requests):
+        """Send {shard: request} to every shard first, then gather (replies, slowest shard seconds)."""
+        if os.getpid() != self._pid:
+            raise RuntimeError("Shard workers belong to the process that started them")
+        with self._lock:
+            if self.broken:
+                raise RuntimeError("Shard workers were stopped after a failed query")
+            try:
+                for shard, request in requests.items():
+                    self._connections[shard].send(request)
+                replies = {shard: self._connections[shard].recv() for shard in requests}
+            except BaseException:
+                # Unread replies would be merged into the next query; stop every worker instead
+                self.broken = True
+                logger.error("Shard round trip failed; stopping all shard workers")
+                self._finalizer()
+                raise
+        for reply, _ in replies.values():
+            if isinstance(reply, Exception):
+                raise reply
+        return {shard: reply for shard, (reply, _) in replies.items()}, max(seconds for _, seconds in replies.values())
+
+    def _record(self, seconds, shard_seconds):
+        self.stats['queries'] += 1
+        self.stats['seconds'] += seconds
+        self.stats['shard_seconds'] += shard_seconds
+
+    def search(self, query, k, mask=None):
+        """Top-k catalog rows for a query, merged from every shard's own top-k."""
+        start_time = time.perf_counter()
+        requests = {}
+        for shard, (lo, hi) in enumerate(self.ranges):
+            if mask is None:
+                requests[shard] = ('search', (query, k, None))
+            elif mask[lo:hi].any():
+                # Shards with no allowed rows are skipped
+                requests[shard] = ('search', (query, k, np.packbits(mask[lo:hi])))
+        if not requests:
+            return SearchResult(np.array([], dtype=np.int64), np.array([], dtype=self.dtype), self.name)
+        replies, shard_seconds = self._scatter(requests)
+        indices = np.concatenate([rows + self.offsets[shard] for shard, (rows, _) in replies.items()])
+        scores = np.concatenate([scores for _, scores in replies.values()])
+        indices, scores = _top_k(indices, scores, min(k, len(scores)))
+        self._record(time.perf_counter() - start_time, shard_seconds)
+        return SearchResult(indices, scores, self.name)
+
+    def score_rows(self, query, rows):
+        """Exact scores of the query against the given catalog rows, in their order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        owners = np.searchsorted(self.offsets, rows, side='right') - 1
+        requests = {shard: ('score_rows', (query, rows[owners == shard] - self.offsets[shard]))
+                    for shard in np.unique(owners).tolist()}
+        scores = np.empty(len(rows), dtype=self.dtype)
+        if requests:
+            replies, _ = self._scatter(requests)
+            for shard, shard_scores in replies.items():
+                scores[owners == shard] = shard_scores
+        return scores
+
+    def row(self, row):
+        """A catalog row's features as a 1 x n_features CSR matrix."""
+        if not 0 <= row < self.n_rows:
+            raise IndexError(f"Row {row} is out of range for {self.n_rows} rows")
+        shard = int(np.searchsorted(self.offsets, row, side='right')) - 1
+        replies, _ = self._scatter({shard: ('row', row - int(self.offsets[shard]))})
+        return replies[shard]
+
+    def describe(self):
+        queries = self.stats['queries']
+        mean_ms = lambda seconds: round(1000 * seconds / queries, 3) if queries else None
+        return {
+            'engine': self.name,
+            'broken': self.broken,
+            'n_rows': self.n_rows,
+            'n_features': self.shape[1],
+            'precision': self.precision,
+            'nbytes': int(self.nbytes),
+            'shards': self.n_shards,
+            'shard_rows': [hi - lo for lo, hi in self.ranges],
+            'shard_nbytes': [int(nbytes) for nbytes in self.shard_nbytes],
+            'queries': queries,
+            'mean_query_ms': mean_ms(self.stats['seconds']),
+            'mean_slowest_shard_ms': mean_ms(self.stats['shard_seconds']),
+            # Pickling, pipes and the merge on top of the slowest shard's scoring
+            'mean_merge_overhead_ms': mean_ms(self.stats['seconds'] - self.stats['shard_seconds'])
+        }
+
+    def _meta(self):
+        # Results are identical to the exact index, so the serving version does not change
+        return {'engine': ExactIndex.name, 'shape': list(self.shape), 'precision': self.precision}
+
+    def close(self):
+        """Stop the shard workers."""
+        self._finalizer()
@@ -9,6 +9,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const recommendationsList = document.getElementById('recommendationsList');
     const errorContainer = document.getElementById('errorContainer');
     const popularAppsList = document.getElementById('popularAppsList');
+    const appSuggestions = document.getElementById('appSuggestions');
     
     // Debounce function to limit how often a function can fire
     function debounce(func, wait) {
@@ -19,11 +20,9 @@ document.addEventListener('DOMContentLoaded', function() {
         };
     }
     
-    // Cache for previously fetched recommendations
-    const recommendationCache = {};
-    
-    // Cache for popular apps
-    let popularAppsCache = null;
+    // Recommendations and popular apps are cached by the browser: the API
+    // sends Cache-Control and an ETag tied to the model version, so repeat
+    // lookups are served locally or revalidated with a 304.
     
     // Throttle search requests
     let lastSearchTime = 0;
@@ -79,12 +78,22 @@ document.addEventListener('DOMContentLoaded', function() {
     // Add auto-suggestion behavior with debounce
     appNameInput.addEventListener('input', debounce(function() {
         const query = appNameInput.value.trim();
-        if (query.length >= 3) {
-            // Here we would normally call an API endpoint for suggestions
-            // This is a placeholder for a future implementation
-            console.log(`Could search for suggestions: ${query}`);
+        if (query.length >= 2) {
+            fetch(`/api/suggest?q=${encodeURIComponent(query)}`)
+                .then(response => response.ok ? response.json() : { suggestions: [] })
+                .then(data => {
+                    // Ignore responses for text the user has already changed
+                    if (appNameInput.value.trim() !== query) return;
+                    appSuggestions.innerHTML = '';
+                    data.suggestions.forEach(app => {
+                        const option = document.createElement('option');
+                        option.value = app.App;
+                        appSuggestions.appendChild(option);
+                    });
+                })
+                .catch(error => console.warn('Suggestion request failed:', error));
         }
-    }, 300));
+    }, 100));
     
     // Function to get recommendations from the API
     // Function to get recommendations from the API
@@ -108,37 +117,13 @@ document.addEventListener('DOMContentLoaded', function() {
         // Reset UI
         resetUI();
         
-        // Check cache first
-        const cacheKey = `${appName}:10`; // 10 is the default num_recommendations
-        if (recommendationCache[cacheKey]) {
-            console.log('Using cached recommendations');
-            handleRecommendationResponse({
-                status: 200,
-                data: recommendationCache[cacheKey]
-            });
-            return;
-        }
-        
         // Show loading indicator
         loadingIndicator.classList.remove('d-none');
         
         // Use fetchWithRetry instead of fetch
-        fetchWithRetry('/api/recommend', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                app_name: appName,
-                num_recommendations: 10
-            }),
-        }, 3)  // 3 retries
+        // GET so the browser's HTTP cache applies
+        fetchWithRetry(`/api/recommend?app_name=${encodeURIComponent(appName)}`, {}, 3)  // 3 retries
         .then(response => {
-            // Cache successful responses
-            if (response.data.success) {
-                recommendationCache[cacheKey] = response.data;
-            }
-            
             handleRecommendationResponse(response);
         })
         .catch(error => {
@@ -227,17 +212,10 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Load popular apps with a smaller cached version
+    // Load popular apps (cached by the browser)
     function loadPopularApps() {
         console.log('Loading popular apps...');
         
-        // Use cache if available
-        if (popularAppsCache) {
-            console.log('Using cached popular apps');
-            displayPopularApps(popularAppsCache);
-            return;
-        }
-        
         // Use fetchWithRetry instead of fetch
         fetchWithRetry('/api/popular?count=10', {}, 3)  // 3 retries
         .then(({ status, data }) => {
@@ -252,7 +230,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // If the server returns popular_apps even with an error, use them
                 if (data.popular_apps && data.popular_apps.length > 0) {
-                    popularAppsCache = data.popular_apps;
                     displayPopularApps(data.popular_apps);
                     return;
                 }
@@ -263,14 +240,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     { App: "Instagram", Category: "Social", Rating: 4.3, Reviews: 900000, Installs: 500000000 },
                     { App: "WhatsApp", Category: "Communication", Rating: 4.6, Reviews: 950000, Installs: 1000000000 }
                 ];
-                popularAppsCache = sampleApps;
                 displayPopularApps(sampleApps);
                 return;
             }
             
             // Normal success case
             if (data.success && data.popular_apps && data.popular_apps.length > 0) {
-                popularAppsCache = data.popular_apps;
                 displayPopularApps(data.popular_apps);
             } else {
                 const errorMessage = data.error || data.message || 'No popular apps available at the moment.';
@@ -290,7 +265,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 { App: "WhatsApp", Category: "Communication", Rating: 4.6, Reviews: 950000, Installs: 1000000000 }
             ];
             
-            popularAppsCache = sampleApps;
             setTimeout(() => {
                 popularAppsList.innerHTML += '<div class="mt-3"><h4>Sample Popular Apps</h4></div>';
                 displayPopularApps(sampleApps);
@@ -0,0 +1,82 @@
+"""
+Prefix index for search-box autocomplete.
+
+Casefolded app names, and every word start inside them, are kept in one
+sorted list. A prefix selects a contiguous range with two binary searches,
+and the range is ordered by a precomputed popularity rank (Reviews, then
+Installs), so a lookup never touches apps that do not match the prefix.
+"""
+import logging
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Sorts after every character a casefolded name can contain
+_PREFIX_END = '\U0010ffff'
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over app names ranked by popularity."""
+
+    def __init__(self, data):
+        names = data['App'].fillna('').astype(str).tolist()
+        reviews = pd.to_numeric(data['Reviews'], errors='coerce').fillna(0).to_numpy() if 'Reviews' in data.columns else np.zeros(len(data))
+        installs = pd.to_numeric(data['Installs'], errors='coerce').fillna(0).to_numpy() if 'Installs' in data.columns else np.zeros(len(data))
+        # rank 0 is the most popular app
+        popularity_order = np.lexsort((-installs, -reviews))
+        rank = np.empty(len(data), dtype=np.int32)
+        rank[popularity_order] = np.arange(len(data), dtype=np.int32)
+
+        keys, rows = [], []
+        for row, name in enumerate(names):
+            key = name.casefold().strip()
+            if not key:
+                continue
+            keys.append(key)
+            rows.append(row)
+            # Also match from the start of each later word ("editor" -> "Photo Editor")
+            for pos in range(1, len(key)):
+                if key[pos - 1] == ' ' and key[pos] != ' ':
+                    keys.append(key[pos:])
+                    rows.append(row)
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.rows = np.asarray(rows, dtype=np.int32)[order]
+        self.ranks = rank[self.rows]
+        self.name_keys = [name.casefold() for name in names]
+        logger.info(f"Built prefix index with {len(self.keys)} keys for {len(names)} apps")
+
+    def suggest(self, prefix, limit=8):
+        """Return up to ``limit`` catalog rows whose name or a word in it starts with ``prefix``."""
+        prefix = prefix.casefold().strip()
+        if not prefix or limit < 1:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + _PREFIX_END, lo)
+        if lo == hi:
+            return []
+
+        ranks = self.ranks[lo:hi]
+        # Rows can appear once per matching word, and names can repeat; fetch spare entries
+        fetch = min(len(ranks), 4 * limit)
+        while True:
+            if fetch < len(ranks):
+                candidates = np.argpartition(ranks, fetch - 1)[:fetch]
+                candidates = candidates[np.argsort(ranks[candidates], kind='stable')]
+            else:
+                candidates = np.argsort(ranks, kind='stable')
+            found, seen = [], set()
+            for entry in candidates:
+                row = int(self.rows[lo + entry])
+                if self.name_keys[row] in seen:
+                    continue
+                seen.add(self.name_keys[row])
+                found.append(row)
+                if len(found) >= limit:
+                    return found
+            if fetch >= len(ranks):
+                return found
+            fetch = min(len(ranks), fetch * 4)
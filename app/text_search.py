@@ -0,0 +1,71 @@
+"""
+Free-text search over the catalog's TF-IDF vocabulary.
+
+The inverted index maps every vocabulary term to a postings list of the
+apps containing it and their TF-IDF weights. A query is vectorized with the
+fitted vectorizer and only the postings of its terms are read, so search
+cost grows with the number (and frequency) of query terms rather than with
+the catalog size.
+"""
+import logging
+import numpy as np
+from scipy.sparse import csc_matrix
+from app.index import SearchResult, _top_k
+
+logger = logging.getLogger(__name__)
+
+
+class InvertedIndex:
+    """Term -> (app rows, weights) postings built from a TF-IDF document matrix."""
+
+    name = 'inverted'
+
+    def __init__(self, tfidf_vectorizer, documents):
+        self.tfidf_vectorizer = tfidf_vectorizer
+        # Columns of the CSC matrix are exactly the postings lists
+        matrix = csc_matrix(tfidf_vectorizer.transform(documents))
+        matrix.sort_indices()
+        self.n_rows, self.n_terms = matrix.shape
+        self.postings_ptr = matrix.indptr.astype(np.int64)
+        self.postings_rows = matrix.indices.astype(np.int32)
+        self.postings_weights = matrix.data.astype(np.float32)
+        logger.info(f"Built inverted index: {self.n_terms} terms, {len(self.postings_rows)} postings")
+
+    @property
+    def nbytes(self):
+        return self.postings_ptr.nbytes + self.postings_rows.nbytes + self.postings_weights.nbytes
+
+    def query_terms(self, text):
+        """Vocabulary term ids and TF-IDF weights of a query; unknown words are dropped."""
+        vector = self.tfidf_vectorizer.transform([text]).tocsr()
+        return vector.indices, vector.data.astype(np.float32)
+
+    def search(self, text, k, mask=None):
+        """Top-k apps by cosine similarity between the query and app TF-IDF vectors."""
+        terms, weights = self.query_terms(text)
+        if len(terms) == 0:
+            return SearchResult(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), self.name)
+
+        starts, stops = self.postings_ptr[terms], self.postings_ptr[terms + 1]
+        rows = np.concatenate([self.postings_rows[a:b] for a, b in zip(starts, stops)])
+        contributions = np.concatenate([
+            self.postings_weights[a:b] * w for a, b, w in zip(starts, stops, weights)
+        ])
+        if mask is not None:
+            allowed = mask[rows]
+            rows, contributions = rows[allowed], contributions[allowed]
+
+        # Accumulate per app over the touched postings only
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions, minlength=len(candidates)).astype(np.float32)
+        indices, scores = _top_k(candidates.astype(np.int64), scores, k)
+        return SearchResult(indices, scores, self.name)
+
+    def describe(self):
+        return {
+            'engine': self.name,
+            'n_rows': self.n_rows,
+            'n_terms': self.n_terms,
+            'n_postings': len(self.postings_rows),
+            'nbytes': self.nbytes
+        }
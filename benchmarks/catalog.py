@@ -0,0 +1,192 @@
+"""
+Synthetic app catalogs with the googleplaystore_fixed.csv schema.
+
+``synthetic_catalog`` draws every column uniformly from fixed lists and is
+cheap and stable, which suits benchmark comparisons. ``realistic_catalog``
+resamples the bundled catalog instead: category, genre, rating, install and
+review distributions (so popularity is as skewed as in the real data), app
+names built from each category's own words, and the real share of
+duplicate names. Both write Size as plain megabytes and Installs and Price
+in the raw '10,000+' / '$1.99' form that ``clean_catalog`` parses.
+
+    python -m benchmarks.catalog --apps 1000000 --output data/synthetic_1m.csv
+"""
+import re
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = {
+    'PHOTOGRAPHY': 'Photography',
+    'SOCIAL': 'Social',
+    'GAME': 'Puzzle;Casual',
+    'FINANCE': 'Finance',
+    'TOOLS': 'Tools',
+    'EDUCATION': 'Education;Education',
+    'HEALTH_AND_FITNESS': 'Health & Fitness',
+    'MUSIC_AND_AUDIO': 'Music & Audio',
+    'TRAVEL_AND_LOCAL': 'Travel & Local',
+    'PRODUCTIVITY': 'Productivity',
+}
+WORDS = (
+    'photo camera editor selfie collage filter video music player radio podcast chat social friends '
+    'dating meet news weather forecast map travel hotel flight booking taxi food recipe diet fitness '
+    'workout yoga sleep meditation health doctor bank budget expense money wallet crypto stock tax '
+    'invoice scanner pdf notes todo calendar reminder clock alarm timer calculator keyboard launcher '
+    'theme wallpaper icon cleaner booster battery vpn browser file manager backup cloud email mail '
+    'messenger call dialer contacts sms puzzle word quiz trivia chess card solitaire racing car bike '
+    'shooter zombie hero adventure kingdom farm city builder tycoon idle merge match candy bubble '
+    'learn english math kids school study flashcards language translator dictionary bible prayer '
+    'shopping deals coupon fashion home decor garden pet dog cat baby pregnancy period tracker sport '
+    'football cricket soccer golf fishing hunting weather live pro free lite plus mini super smart'
+).split()
+CONTENT_RATINGS = ['Everyone', 'Teen', 'Everyone 10+', 'Mature 17+']
+INSTALL_LEVELS = np.array([100, 1000, 10000, 100000, 1000000, 10000000])
+
+
+def synthetic_catalog(n_apps, seed=0):
+    """Random catalog of ``n_apps`` rows in the raw CSV format (strings for reviews, installs, prices)."""
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS)
+    categories = np.array(list(CATEGORIES))
+
+    n_words = rng.integers(2, 5, size=n_apps)
+    picks = words[rng.integers(0, len(words), size=(n_apps, 4))]
+    names = [' '.join(row[:count]).title() for row, count in zip(picks, n_words)]
+    category = categories[rng.integers(0, len(categories), size=n_apps)]
+    paid = rng.random(n_apps) < 0.08
+    installs = INSTALL_LEVELS[rng.integers(0, len(INSTALL_LEVELS), size=n_apps)]
+    reviews = (installs * rng.uniform(0.001, 0.1, size=n_apps)).astype(np.int64)
+
+    return pd.DataFrame({
+        'App': names,
+        'Category': category,
+        'Rating': np.round(rng.uniform(2.5, 5.0, size=n_apps), 1),
+        'Reviews': reviews.astype(str),
+        'Size': rng.integers(1, 150, size=n_apps).astype(str),  # MB, as clean_catalog parses it
+        'Installs': [f"{count:,}+" for count in installs],
+        'Type': np.where(paid, 'Paid', 'Free'),
+        'Price': np.where(paid, '$' + np.round(rng.uniform(0.99, 9.99, size=n_apps), 2).astype(str), '0'),
+        'Content Rating': np.array(CONTENT_RATINGS)[rng.integers(0, len(CONTENT_RATINGS), size=n_apps)],
+        'Genres': pd.Series(category).map(CATEGORIES).to_numpy(),
+    })
+
+
+SCHEMA = ['App', 'Category', 'Rating', 'Reviews', 'Size', 'Installs', 'Type', 'Price', 'Content Rating', 'Genres']
+_SHIFTED_COLUMNS = ['Installs', 'Type', 'Price', 'Content Rating', 'Genres', 'Last Updated', 'Current Ver', 'Android Ver']
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+
+def load_reference(path=None):
+    """Clean rows of the bundled catalog CSV for ``realistic_catalog``.
+
+    In the bundled CSV the thousands separators of Installs were split into
+    extra columns ('10', '000+', 'Free', ...); those rows are re-joined and
+    rows that still do not parse are dropped.
+    """
+    from app.config import Config
+
+    df = pd.read_csv(path or Config.FIXED_DATA_PATH, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+    df.columns = [column.lstrip('\ufeff') for column in df.columns]
+    tail = [column for column in _SHIFTED_COLUMNS if column in df.columns]
+    repaired = []
+    for values in df[tail].itertuples(index=False):
+        installs, position = values[0], 1
+        while (position < len(values) and re.fullmatch(r'\d{1,3}(,\d{3})*', installs)
+               and re.fullmatch(r'\d{3}\+?', values[position])):
+            installs += ',' + values[position]
+            position += 1
+        rest = list(values[position:]) + [''] * position
+        repaired.append([installs] + rest[:4])
+    fixed = pd.DataFrame(repaired, columns=['Installs', 'Type', 'Price', 'Content Rating', 'Genres'], index=df.index)
+    df = pd.concat([df[['App', 'Category', 'Rating', 'Reviews', 'Size']], fixed], axis=1)
+
+    valid = (df['Type'].isin(['Free', 'Paid'])
+             & df['Installs'].str.fullmatch(r'[\d,]+\+')
+             & df['Reviews'].str.fullmatch(r'\d+')
+             & df['Category'].str.fullmatch(r'[A-Z_]+'))
+    logger.info(f"Reference catalog: {int(valid.sum())} of {len(df)} rows usable")
+    return df[valid].reset_index(drop=True)
+
+
+def _parse_size_mb(size):
+    """'19M' -> 19.0, '512k' -> 0.5; 'Varies with device' -> NaN."""
+    size = size.str.strip().str.upper()
+    megabytes = pd.to_numeric(size.str.rstrip('M'), errors='coerce')
+    kilobytes = pd.to_numeric(size.str.rstrip('K'), errors='coerce') / 1024
+    return megabytes.where(size.str.endswith('M'), kilobytes.where(size.str.endswith('K')))
+
+
+def realistic_catalog(n_apps, seed=0, reference=None, duplicate_rate=None):
+    """Catalog of ``n_apps`` rows resampled from a reference catalog (see load_reference).
+
+    Attributes are bootstrapped from whole reference rows so their joint
+    distribution (category, installs, reviews, price, rating) is kept;
+    review counts get multiplicative jitter. Names are new word sequences
+    drawn from the words of the row's category. ``duplicate_rate`` defaults
+    to the reference's share of repeated names; duplicates reuse the names
+    of popular apps, as store relistings do.
+    """
+    rng = np.random.default_rng(seed)
+    reference = load_reference() if reference is None else reference
+    if duplicate_rate is None:
+        duplicate_rate = float(reference['App'].duplicated().mean())
+
+    rows = rng.integers(0, len(reference), size=n_apps)
+    catalog = reference.iloc[rows][SCHEMA].reset_index(drop=True)
+
+    reviews = pd.to_numeric(catalog['Reviews']).to_numpy(dtype=np.float64)
+    reviews = np.rint(reviews * rng.lognormal(0.0, 0.3, size=n_apps)).astype(np.int64)
+    catalog['Reviews'] = reviews.astype(str)
+    sizes = _parse_size_mb(catalog['Size'])
+    # 'Varies with device' sizes get the median, as clean_catalog would
+    catalog['Size'] = np.round(sizes.fillna(sizes.median() if sizes.notna().any() else 10.0), 1).astype(str)
+
+    # Names: word count and words follow the reference names of the same category
+    word_counts = reference['App'].map(lambda name: len(_WORD.findall(name))).clip(1, 8)
+    count_values, count_freq = np.unique(word_counts, return_counts=True)
+    lengths = rng.choice(count_values, p=count_freq / count_freq.sum(), size=n_apps)
+    names = np.empty(n_apps, dtype=object)
+    for category, members in catalog.groupby('Category').groups.items():
+        words = pd.Series(_WORD.findall(' '.join(reference.loc[reference['Category'] == category, 'App'])))
+        if words.empty:
+            words = pd.Series(WORDS).str.title()
+        vocabulary = words.value_counts()
+        members = np.asarray(members)
+        picks = rng.choice(vocabulary.index.to_numpy(), p=(vocabulary / vocabulary.sum()).to_numpy(),
+                           size=(len(members), int(count_values.max())))
+        names[members] = [' '.join(picked[:length]) for picked, length in zip(picks, lengths[members])]
+
+    # Short names already collide; only add the missing share of duplicates
+    natural_rate = float(pd.Series(names).duplicated().mean())
+    n_duplicates = int(round(max(duplicate_rate - natural_rate, 0.0) * n_apps))
+    if n_duplicates and n_apps > 1:
+        copies = rng.choice(n_apps, size=n_duplicates, replace=False)
+        weights = reviews + 1.0
+        sources = rng.choice(n_apps, size=n_duplicates, p=weights / weights.sum())
+        names[copies] = names[sources]
+        catalog.loc[copies, ['Category', 'Genres']] = catalog.loc[sources, ['Category', 'Genres']].to_numpy()
+    catalog['App'] = names
+    return catalog
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Write a synthetic app catalog CSV")
+    parser.add_argument('--apps', type=int, required=True)
+    parser.add_argument('--kind', choices=['realistic', 'uniform'], default='realistic')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    if args.kind == 'realistic':
+        catalog = realistic_catalog(args.apps, args.seed)
+    else:
+        catalog = synthetic_catalog(args.apps, args.seed)
+    catalog.to_csv(args.output, index=False)
+    logger.info(f"Wrote {len(catalog)} apps to {args.output}")
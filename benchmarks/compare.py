@@ -0,0 +1,92 @@
+"""
+Compare two benchmark result files written by ``python -m benchmarks.run``.
+
+    python -m benchmarks.compare OLD.json NEW.json [--threshold 0.1]
+
+Prints every metric per catalog size with the new/old ratio and exits with
+status 1 when any metric regressed by more than the threshold. Throughput
+metrics (``*_per_s``) regress when they fall; times and memory
+(``*_ms``, ``*_us``, ``*_s``, ``*seconds``, ``*_mb``, ``*_bytes``) when
+they rise. Other numbers, such as counts and percentages, describe the
+data rather than its speed; they are printed with their difference and
+never count as regressions.
+"""
+import sys
+import json
+
+# Regress when they fall
+HIGHER_IS_BETTER = ('_per_s',)
+# Regress when they rise
+LOWER_IS_BETTER = ('_ms', '_us', '_s', 'seconds', '_mb', '_bytes')
+
+
+def flatten(result, prefix=''):
+    """Numeric leaves of a nested result dict keyed by dotted path."""
+    metrics = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in ('n', 'n_apps', 'batch_size'):
+            metrics[name] = value
+    return metrics
+
+
+def direction(name):
+    """1 if a higher value is better, -1 if a lower one is, 0 for counts and percentages."""
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(old_report, new_report, threshold=0.1):
+    """Return (rows, regressions) comparing results of matching catalog sizes.
+
+    Rows of metrics without a direction have a ratio of None.
+    """
+    old_results = {result['n_apps']: result for result in old_report['results']}
+    rows, regressions = [], []
+    for new_result in new_report['results']:
+        old_result = old_results.get(new_result['n_apps'])
+        if old_result is None or 'error' in old_result or 'error' in new_result:
+            continue
+        old_metrics, new_metrics = flatten(old_result), flatten(new_result)
+        for name in sorted(set(old_metrics) & set(new_metrics)):
+            old, new = old_metrics[name], new_metrics[name]
+            better = direction(name)
+            if better == 0:
+                rows.append((new_result['n_apps'], name, old, new, None, False))
+                continue
+            ratio = new / old if old else float('inf') if new else 1.0
+            regressed = ratio < 1 - threshold if better > 0 else ratio > 1 + threshold
+            rows.append((new_result['n_apps'], name, old, new, ratio, regressed))
+            if regressed:
+                regressions.append(rows[-1])
+    return rows, regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old_report = json.load(f)
+    with open(args.new) as f:
+        new_report = json.load(f)
+
+    rows, regressions = compare(old_report, new_report, args.threshold)
+    print(f"{'apps':>9}  {'metric':<40} {'old':>12} {'new':>12} {'new/old':>8}")
+    for n_apps, name, old, new, ratio, regressed in rows:
+        if ratio is None:
+            print(f"{n_apps:>9}  {name:<40} {old:>12.4g} {new:>12.4g} {new - old:>+8.3g} (difference)")
+            continue
+        print(f"{n_apps:>9}  {name:<40} {old:>12.4g} {new:>12.4g} {ratio:>8.2f}{'  REGRESSED' if regressed else ''}")
+    print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,225 @@
+"""
+Open-loop load driver for a locally running recommender server.
+
+    python -m benchmarks.load --start --catalog data/synthetic_1m.csv --qps 50 --duration 60
+
+Requests are a mix of /api/recommend, /api/popular and /api/reviews. App
+names are drawn from a Zipf distribution over the catalog ranked by review
+count, so a few popular apps get most of the traffic. Requests are sent on a
+fixed schedule at the target QPS whether or not earlier ones have finished,
+so a slow server shows up as latency and errors instead of a lower send
+rate. The report gives achieved throughput, per-endpoint latency
+percentiles and histograms, status codes and error rates.
+
+``--start`` launches the server (flask run, no reloader, threaded) with
+CATALOG_PATH set to ``--catalog`` and stops it afterwards; otherwise
+``--url`` must point at a running server.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ('recommend', 'popular', 'reviews')
+DEFAULT_MIX = 'recommend=0.7,popular=0.1,reviews=0.2'
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+
+def parse_mix(text):
+    """'recommend=0.7,popular=0.1,reviews=0.2' -> normalized weights per endpoint."""
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}'. Use: {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Mix weights must add up to a positive number")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def zipf_probabilities(n_items, exponent):
+    ranks = np.arange(1, n_items + 1, dtype=np.float64)
+    weights = ranks ** -exponent
+    return weights / weights.sum()
+
+
+def build_schedule(names, n_requests, mix, exponent=1.1, seed=0):
+    """Request paths in send order; ``names`` must be ranked most popular first."""
+    rng = np.random.default_rng(seed)
+    endpoints = rng.choice(list(mix), p=list(mix.values()), size=n_requests)
+    apps = rng.choice(len(names), p=zipf_probabilities(len(names), exponent), size=n_requests)
+    schedule = []
+    for endpoint, app in zip(endpoints, apps):
+        name = urllib.parse.quote(names[app], safe='')
+        if endpoint == 'recommend':
+            path = f"/api/recommend?app_name={name}"
+        elif endpoint == 'popular':
+            path = "/api/popular?count=10"
+        else:
+            path = f"/api/reviews/{name}"
+        schedule.append((str(endpoint), path))
+    return schedule
+
+
+def send(base_url, endpoint, path, timeout):
+    """Return (endpoint, status or None, latency seconds, error text or None)."""
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+            response.read()
+            status = response.status
+        return endpoint, status, time.perf_counter() - start_time, None
+    except urllib.error.HTTPError as e:
+        e.read()
+        return endpoint, e.code, time.perf_counter() - start_time, None
+    except Exception as e:
+        return endpoint, None, time.perf_counter() - start_time, type(e).__name__
+
+
+def run_load(base_url, schedule, qps, concurrency=64, timeout=10.0):
+    """Send the schedule at ``qps`` requests per second and collect every outcome."""
+    results = []
+    lock = threading.Lock()
+    lateness = []
+
+    def task(endpoint, path):
+        outcome = send(base_url, endpoint, path, timeout)
+        with lock:
+            results.append(outcome)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, (endpoint, path) in enumerate(schedule):
+            due = start_time + i / qps
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lateness.append(-delay)
+            pool.submit(task, endpoint, path)
+    duration = time.perf_counter() - start_time
+    return results, duration, (max(lateness) if lateness else 0.0)
+
+
+def summarize(results, duration, target_qps, max_send_lag):
+    """Throughput, latency percentiles, histograms and error rates per endpoint and overall."""
+    def endpoint_summary(outcomes):
+        latencies_ms = np.array([latency for _, _, latency, _ in outcomes]) * 1000
+        statuses = {}
+        for _, status, _, error in outcomes:
+            key = str(status) if status is not None else error
+            statuses[key] = statuses.get(key, 0) + 1
+        failures = sum(1 for _, status, _, _ in outcomes if status is None or status >= 500)
+        client_errors = sum(1 for _, status, _, _ in outcomes if status is not None and 400 <= status < 500)
+        counts, _ = np.histogram(latencies_ms, bins=(0,) + HISTOGRAM_BOUNDS_MS)
+        return {
+            'requests': len(outcomes),
+            'error_rate': round(failures / len(outcomes), 4),
+            'client_error_rate': round(client_errors / len(outcomes), 4),
+            'status_codes': statuses,
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+            'p90_ms': round(float(np.percentile(latencies_ms, 90)), 3),
+            'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+            'max_ms': round(float(latencies_ms.max()), 3),
+            'histogram_ms': {f"<={bound:g}": int(count) for bound, count in zip(HISTOGRAM_BOUNDS_MS, counts)},
+        }
+
+    report = {
+        'target_qps': target_qps,
+        'duration_s': round(duration, 3),
+        'achieved_qps': round(len(results) / duration, 2) if duration else None,
+        'max_send_lag_ms': round(max_send_lag * 1000, 3),
+        'overall': endpoint_summary(results) if results else None,
+        'endpoints': {},
+    }
+    for endpoint in ENDPOINTS:
+        outcomes = [outcome for outcome in results if outcome[0] == endpoint]
+        if outcomes:
+            report['endpoints'][endpoint] = endpoint_summary(outcomes)
+    return report
+
+
+def start_server(port, catalog=None, timeout=600):
+    """Start the app without the reloader and wait until /api/health answers."""
+    env = dict(os.environ)
+    if catalog:
+        env['CATALOG_PATH'] = os.path.abspath(catalog)
+    command = [sys.executable, '-m', 'flask', '--app', 'app.main', 'run',
+               '--port', str(port), '--no-reload', '--no-debugger', '--with-threads']
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + '/api/health', timeout=2):
+                return server, base_url
+        except urllib.error.HTTPError:
+            # Any HTTP answer means the server is up, even an unhealthy one
+            return server, base_url
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"Server did not start within {timeout}s")
+
+
+if __name__ == '__main__':
+    import argparse
+    from app.recommender import load_catalog
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Replay a Zipf request mix against a local server")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--start', action='store_true', help="Start a server for the run")
+    parser.add_argument('--port', type=int, default=5055, help="Port of the server started with --start")
+    parser.add_argument('--catalog', help="Catalog CSV served and sampled (default: the app's catalog)")
+    parser.add_argument('--qps', type=float, default=20)
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of traffic")
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent over apps ranked by reviews")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    catalog = load_catalog([args.catalog] if args.catalog else None)
+    names = catalog.sort_values('Reviews', ascending=False)['App'].astype(str).tolist()
+    schedule = build_schedule(names, int(args.qps * args.duration), parse_mix(args.mix), args.zipf, args.seed)
+
+    server = None
+    base_url = args.url
+    if args.start:
+        logger.info("Starting server...")
+        server, base_url = start_server(args.port, args.catalog)
+    try:
+        logger.info(f"Sending {len(schedule)} requests to {base_url} at {args.qps} QPS")
+        results, duration, max_lag = run_load(base_url, schedule, args.qps, args.concurrency, args.timeout)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = summarize(results, duration, args.qps, max_lag)
+    report['config'] = {'mix': parse_mix(args.mix), 'zipf': args.zipf, 'catalog': args.catalog, 'url': base_url}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
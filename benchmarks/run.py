@@ -0,0 +1,360 @@
+"""
+Benchmarks for the recommender hot paths on synthetic catalogs.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+Each catalog size runs in a fresh subprocess so peak RSS is measured per
+size. For every size the suite records startup stages (CSV load, fitting
+the transformers, recommender construction, index build), peak RSS,
+latency percentiles of exact, case-insensitive, partial and not-found
+lookups and of /api/popular, batch throughput and the cost of the /metrics
+instrumentation per request. Results are written as
+JSON named after the current commit so runs can be compared across commits.
+"""
+import os
+import sys
+import json
+import itertools
+import time
+import resource
+import platform
+import logging
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def latency_summary(samples):
+    samples_ms = np.asarray(samples) * 1000
+    return {
+        'n': len(samples_ms),
+        'mean_ms': round(float(samples_ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(samples_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(samples_ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(samples_ms, 99)), 4),
+    }
+
+
+def time_calls(fn, arguments):
+    samples = []
+    for argument in arguments:
+        start_time = time.perf_counter()
+        fn(argument)
+        samples.append(time.perf_counter() - start_time)
+    return latency_summary(samples)
+
+
+def instrumentation_cost(repeats=20000):
+    """Seconds of metrics recording per /api/recommend request.
+
+    Replays what one request records (the stage laps, their histograms,
+    the outcome counter and the request hooks) on a private registry.
+    """
+    from app.metrics import Registry, Histogram, Counter, StageTimer
+
+    registry = Registry()
+    stage_seconds = Histogram('stage_seconds', 'stages', ['stage'], registry=registry)
+    outcomes = Counter('outcomes_total', 'outcomes', ['outcome'], registry=registry)
+    request_seconds = Histogram('request_seconds', 'requests', ['endpoint'], registry=registry)
+    requests = Counter('requests_total', 'requests', ['endpoint', 'method', 'status'], registry=registry)
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        stages = StageTimer(stage_seconds)
+        for stage in ('resolve', 'score', 'dedupe', 'records', 'encode'):
+            stages.lap(stage)
+        stages.finish()
+        outcomes.labels('success').inc()
+        request_seconds.labels('/api/recommend').observe(0.01)
+        requests.labels('/api/recommend', 'GET', 200).inc()
+    return (time.perf_counter() - start_time) / repeats
+
+
+def fit_components(data, n_trees=10, fit_sample=20000, seed=0):
+    """Fit the transformers on the whole catalog and a small forest on a sample, as save_model does."""
+    from scipy.sparse import hstack, csr_matrix
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+    from app.recommender import NUMERICAL_FEATURES, CATEGORICAL_FEATURES
+
+    text = data['Category'] + ' ' + data['Genres'] + ' ' + data['App']
+    tfidf_vectorizer = TfidfVectorizer(stop_words='english')
+    scaler = MinMaxScaler()
+    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False)
+    combined = hstack([
+        tfidf_vectorizer.fit_transform(text),
+        csr_matrix(scaler.fit_transform(data[NUMERICAL_FEATURES])),
+        csr_matrix(encoder.fit_transform(data[CATEGORICAL_FEATURES]))
+    ]).tocsr()
+    # Unrated apps are left out of the forest fit, as in save_model
+    ratings = pd.to_numeric(data['Rating'], errors='coerce').to_numpy(dtype=np.float64)
+    rated = np.flatnonzero(~np.isnan(ratings))
+    rows = np.random.default_rng(seed).choice(rated, size=min(fit_sample, len(rated)), replace=False)
+    model = RandomForestRegressor(n_estimators=n_trees, random_state=seed, n_jobs=-1)
+    model.fit(combined[rows], ratings[rows])
+    return {'tfidf_vectorizer': tfidf_vectorizer, 'encoder': encoder, 'scaler': scaler, 'model': model}
+
+
+def lookup_queries(names, n_queries, rng):
+    """App-name queries for each lookup path of get_recommendations."""
+    picked = [names[i] for i in rng.choice(len(names), size=n_queries)]
+    return {
+        'exact': picked,
+        'case_insensitive': [name.swapcase() for name in picked],
+        # Drop the first character so only the substring match can find it
+        'partial': [name[1:max(4, len(name) // 2)] for name in picked],
+        'not_found': [''.join(rng.choice(list('qxzj'), size=8)) for _ in range(n_queries)],
+    }
+
+
+def bench_sharded(recommender, rows, n_shards=4):
+    """Latency and merge overhead of sharded scoring, and whether it ranks exactly like one process."""
+    from app.shards import ShardedIndex
+
+    single = recommender.index
+    start_time = time.perf_counter()
+    sharded = ShardedIndex(single.features, n_shards, precision=single.precision)
+    start_s = time.perf_counter() - start_time
+    try:
+        identical = all(np.array_equal(single.search(single.features[row], 50).indices,
+                                       sharded.search(single.features[row], 50).indices) for row in rows)
+        sharded.stats = dict.fromkeys(sharded.stats, 0)
+        timings = {name: time_calls(lambda row: index.search(single.features[row], 50), rows)
+                   for name, index in (('single', single), ('sharded', sharded))}
+        described = sharded.describe()
+    finally:
+        sharded.close()
+    return {
+        'shards': n_shards,
+        'start_s': round(start_s, 4),
+        'identical': identical,
+        'single_p50_ms': timings['single']['p50_ms'],
+        'sharded_p50_ms': timings['sharded']['p50_ms'],
+        'mean_slowest_shard_ms': described['mean_slowest_shard_ms'],
+        'mean_merge_overhead_ms': described['mean_merge_overhead_ms']
+    }
+
+
+def bench_catalog(n_apps, n_queries=200, batch_size=1000, n_trees=10, seed=0, generator='uniform'):
+    """Run every benchmark on one synthetic catalog size and return the measurements."""
+    from flask import Flask
+    from benchmarks.catalog import synthetic_catalog, realistic_catalog
+    from app.config import Config
+    from app.index import build_index
+    from app.recommender import AppRecommender, load_catalog
+    from app.export import iter_recommendations
+    from app.blocks import BlockFeatures, parse_block_weights
+    from app.dedup import collapse_duplicates
+    from app.routes import bp
+
+    rng = np.random.default_rng(seed)
+    result = {'n_apps': n_apps, 'generator': generator, 'engine': Config.SCORING_ENGINE, 'precision': Config.SERVING_PRECISION}
+    startup = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, 'catalog.csv')
+        make_catalog = realistic_catalog if generator == 'realistic' else synthetic_catalog
+        make_catalog(n_apps, seed).to_csv(csv_path, index=False)
+
+        start_time = time.perf_counter()
+        data = load_catalog([csv_path])
+        startup['csv_load_s'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    components = fit_components(data, n_trees=n_trees, seed=seed)
+    startup['fit_s'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    recommender = AppRecommender(data=data, **components)
+    startup['recommender_init_s'] = time.perf_counter() - start_time
+
+    # Index build alone, to separate it from feature transforms and other structures
+    start_time = time.perf_counter()
+    build_index(recommender.features, Config.SCORING_ENGINE, precision=Config.SERVING_PRECISION)
+    startup['index_build_s'] = time.perf_counter() - start_time
+
+    result['startup'] = {name: round(seconds, 4) for name, seconds in startup.items()}
+    # Loaded CSV against the compacted serving catalog (see compact_catalog)
+    result['catalog_memory'] = {
+        'loaded_mb': round(data.memory_usage(deep=True).sum() / 2 ** 20, 2),
+        'serving_mb': round(recommender.data.memory_usage(deep=True).sum() / 2 ** 20, 2)
+    }
+    result['peak_rss_after_startup_mb'] = peak_rss_mb()
+
+    # Near-duplicate collapsing at ingest (app.dedup, off unless DEDUP_CATALOG=1)
+    start_time = time.perf_counter()
+    _, duplicates = collapse_duplicates(data)
+    result['dedup'] = {
+        'seconds': round(time.perf_counter() - start_time, 4),
+        'collapsed': len(duplicates),
+        'collapsed_pct': round(100 * len(duplicates) / len(data), 2)
+    }
+
+    names = recommender.data['App'].tolist()
+    queries = lookup_queries(names, n_queries, rng)
+    result['lookup'] = {
+        kind: time_calls(recommender.get_recommendations, kind_queries)
+        for kind, kind_queries in queries.items()
+    }
+
+    # Query-time block weights (app.blocks) against the fixed-weight index, on the same queries
+    start_time = time.perf_counter()
+    recommender.blocks = BlockFeatures(recommender._combine_features(recommender.data), recommender._block_sizes(),
+                                       precision=Config.SERVING_PRECISION)
+    blocks_build_s = time.perf_counter() - start_time
+    weights = parse_block_weights('text:2,numeric:0.5')
+    fixed = time_calls(recommender.get_recommendations, queries['exact'])
+    weighted = time_calls(lambda name: recommender.get_recommendations(name, weights=weights), queries['exact'])
+    result['block_weights'] = {
+        'build_s': round(blocks_build_s, 4),
+        'blocks_mb': round(recommender.blocks.nbytes / 2 ** 20, 2),
+        'fixed_p50_ms': fixed['p50_ms'],
+        'weighted_p50_ms': weighted['p50_ms'],
+        'overhead_pct': round(100 * (weighted['p50_ms'] / fixed['p50_ms'] - 1), 2)
+    }
+    recommender.blocks = None
+
+    # Scatter-gather over local shard workers (app.shards) against the single-process index
+    result['sharded'] = bench_sharded(recommender, np.random.default_rng(seed + 1).choice(len(names), size=n_queries).tolist())
+
+    per_request = instrumentation_cost()
+    result['metrics'] = {
+        'per_request_us': round(per_request * 1e6, 3),
+        'overhead_pct_of_exact_p50': round(100 * per_request * 1000 / result['lookup']['exact']['p50_ms'], 4)
+    }
+
+    app = Flask('benchmarks')
+    app.register_blueprint(bp)
+    app.recommender = recommender
+    client = app.test_client()
+    result['api_popular'] = time_calls(lambda _: client.get('/api/popular?count=10'), range(n_queries))
+
+    batch = [names[i] for i in rng.choice(len(names), size=batch_size)]
+    start_time = time.perf_counter()
+    for name in batch:
+        recommender.get_recommendations(name)
+    recommendations_per_s = len(batch) / (time.perf_counter() - start_time)
+
+    unseen = recommender.data.iloc[rng.choice(len(names), size=batch_size)].to_dict('records')
+    start_time = time.perf_counter()
+    recommender.predict_unseen(unseen)
+    predict_rows_per_s = len(unseen) / (time.perf_counter() - start_time)
+
+    # Blocked full-catalog export (app.export) over the first batch_size apps
+    start_time = time.perf_counter()
+    exported = sum(1 for _ in itertools.islice(iter_recommendations(recommender, 5), batch_size))
+    export_apps_per_s = exported / (time.perf_counter() - start_time)
+
+    result['throughput'] = {
+        'batch_size': batch_size,
+        'recommendations_per_s': round(recommendations_per_s, 1),
+        'export_apps_per_s': round(export_apps_per_s, 1),
+        'predict_rows_per_s': round(predict_rows_per_s, 1)
+    }
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def environment():
+    """Commit and library versions the results were measured with."""
+    import numpy
+    import pandas
+    import scipy
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(RESULTS_DIR)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'scipy': scipy.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+IMPORT_MODULES = ('app.models', 'app.routes', 'app.recommender', 'app')
+
+
+def import_times(modules=IMPORT_MODULES, repeats=3):
+    """Best-of-``repeats`` cold import time in ms of each module, from ``python -X importtime``."""
+    times = {}
+    for module in modules:
+        samples = []
+        for _ in range(repeats):
+            completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                                       capture_output=True, text=True,
+                                       cwd=os.path.dirname(os.path.dirname(RESULTS_DIR)))
+            # Top-level entries are not indented; their cumulative times add up to the whole import
+            total_us = sum(int(line.split('|')[1]) for line in completed.stderr.splitlines()
+                           if line.startswith('import time:') and line.count('|') == 2
+                           and not line.split('|')[2][1:].startswith(' ') and line.split('|')[1].strip().isdigit())
+            samples.append(total_us / 1000)
+        times[module] = round(min(samples), 1)
+    return times
+
+
+def run_isolated(n_apps, args):
+    """Benchmark one size in a child process and return its result dict."""
+    command = [sys.executable, '-m', 'benchmarks.run', '--single', str(n_apps),
+               '--queries', str(args.queries), '--batch', str(args.batch), '--trees', str(args.trees),
+               '--generator', args.generator]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        logger.error(f"Benchmark for {n_apps} apps failed:\n{completed.stderr[-2000:]}")
+        return {'n_apps': n_apps, 'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the recommender on synthetic catalogs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200, help="Queries per lookup type")
+    parser.add_argument('--batch', type=int, default=1000, help="Rows per throughput batch")
+    parser.add_argument('--trees', type=int, default=10, help="Trees in the rating forest")
+    parser.add_argument('--generator', choices=['uniform', 'realistic'], default='uniform',
+                        help="Synthetic catalog kind (see benchmarks.catalog)")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process: logs go to stderr, the result is the last stdout line
+        logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+        print(json.dumps(bench_catalog(args.single, args.queries, args.batch, args.trees, generator=args.generator)))
+        sys.exit(0)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = {'environment': environment(), 'import_ms': import_times(), 'results': []}
+    for n_apps in args.sizes:
+        logger.info(f"Benchmarking {n_apps} apps")
+        report['results'].append(run_isolated(n_apps, args))
+        logger.info(json.dumps(report['results'][-1]))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['environment']['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote {output}")
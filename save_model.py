@@ -1,5 +1,25 @@
+"""
+Train the rating model and fit the feature transformers for the recommender.
+
+    python save_model.py [--trees 100] [--max-depth N] [--jobs -1] [--no-cache]
+
+Training runs in stages: clean the catalog, fit the transformers, build
+the training feature matrix, train the forest. Each stage's output is
+cached under ``TRAINING_CACHE_DIR`` keyed by a hash of its inputs (the CSV
+contents, upstream keys and the stage's parameters), so changing only
+model hyperparameters reuses the cleaned catalog, transformers and
+features and only retrains the forest. Trees are fitted on all cores with
+threads that share one float32 feature matrix. The time and RSS after
+each stage are logged and written to ``training_report.json``. The new
+model then predicts the configured catalog's ratings (app.ratings), which
+serving workers load instead of predicting at startup.
+"""
 import pickle
 import os
+import json
+import time
+import hashlib
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
@@ -9,21 +29,29 @@ from sklearn.ensemble import RandomForestRegressor
 from scipy.sparse import hstack, csr_matrix
 import logging
 import csv
+from app.config import Config
+from app.forest import CompiledForest
+from app.memory import PhaseRecorder
+from app.metrics import Histogram, Registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def load_dataset():
+def dataset_path():
+    """The CSV load_dataset reads: the fixed dataset if present, else the original."""
+    return 'data/googleplaystore_fixed.csv' if os.path.exists('data/googleplaystore_fixed.csv') else 'data/googleplaystore.csv'
+
+def load_dataset(path=None):
     """Load and properly parse the dataset"""
     try:
-        # Try to use the fixed dataset first
-        try:
-            df = pd.read_csv('data/googleplaystore_fixed.csv', encoding='utf-8-sig')
+        path = path or dataset_path()
+        if path != 'data/googleplaystore.csv':
+            df = pd.read_csv(path, encoding='utf-8-sig')
             logger.info(f"Successfully loaded fixed dataset with shape: {df.shape}")
-        except FileNotFoundError:
-            # If fixed file not found, try to parse the original with special handling
-            df = pd.read_csv('data/googleplaystore.csv', 
+        else:
+            # The original needs special handling
+            df = pd.read_csv(path, 
                              encoding='utf-8-sig',
                              quoting=csv.QUOTE_MINIMAL,
                              escapechar='\\',
@@ -95,11 +123,11 @@ def preprocess_data(df):
         df = df.dropna(subset=['Rating'])
         
         # Fill missing values for other columns
-        df['Size'].fillna(df['Size'].median(), inplace=True)
-        df['Price'].fillna(0, inplace=True)
+        df['Size'] = df['Size'].fillna(df['Size'].median())
+        df['Price'] = df['Price'].fillna(0)
         df['Reviews'] = pd.to_numeric(df['Reviews'], errors='coerce')
-        df['Reviews'].fillna(0, inplace=True)
-        df['Installs'].fillna(df['Installs'].median(), inplace=True)
+        df['Reviews'] = df['Reviews'].fillna(0)
+        df['Installs'] = df['Installs'].fillna(df['Installs'].median())
 
         # Verify no NaN values in Rating column
         if df['Rating'].isna().any():
@@ -114,64 +142,127 @@ def preprocess_data(df):
         logger.error(f"Error in preprocessing: {str(e)}")
         raise
 
-def train_model(df):
-    """Train the recommendation model"""
-    try:
-        # Prepare features
-        numerical_features = ['Reviews', 'Size', 'Installs', 'Price']
-        categorical_features = ['Type', 'Content Rating']
+NUMERICAL_FEATURES = ['Reviews', 'Size', 'Installs', 'Price']
+CATEGORICAL_FEATURES = ['Type', 'Content Rating']
 
-        # Verify no NaN values in Rating column before splitting
-        if df['Rating'].isna().any():
-            logger.warning(f"Found {df['Rating'].isna().sum()} NaN values in Rating before splitting")
-            df = df.dropna(subset=['Rating'])
-            logger.info(f"Removed rows with NaN ratings, new shape: {df.shape}")
+# Bump a stage's version when its code changes so cached outputs are rebuilt
+STAGE_VERSIONS = {'clean': 1, 'transformers': 1, 'features': 1, 'model': 1}
 
-        # Split data
-        X = df.drop('Rating', axis=1)
-        y = df['Rating']
-        
-        # Additional check for NaN values in y
-        if y.isna().any():
-            logger.error(f"Found {y.isna().sum()} NaN values in target variable y")
-            raise ValueError("Target variable contains NaN values after preprocessing")
-            
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+# Defaults of the forest hyperparameters; n_jobs does not change the model
+MODEL_PARAMS = {'n_estimators': 100, 'max_depth': None, 'min_samples_leaf': 1, 'max_features': 1.0,
+                'max_samples': None, 'random_state': 42}
 
-        # Initialize components
-        scaler = MinMaxScaler()
-        encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False)  # Changed sparse to sparse_output
-        tfidf_vectorizer = TfidfVectorizer(stop_words='english')
+# Training runs in its own process; a private registry keeps its stage timings off /metrics
+TRAINING_STAGE_SECONDS = Histogram('training_stage_seconds', "Time per training stage", ['stage'], registry=Registry())
 
-        # Transform numerical features
-        numerical_scaled = scaler.fit_transform(X_train[numerical_features])
-        
-        # Transform categorical features
-        categorical_encoded = encoder.fit_transform(X_train[categorical_features])
-        
-        # Transform text features
-        text_features = tfidf_vectorizer.fit_transform(X_train['Features'])
-
-        # Combine features
-        combined_features = hstack([
-            text_features,
-            csr_matrix(numerical_scaled),
-            csr_matrix(categorical_encoded)
-        ])
-
-        # Final check for NaN values in y_train
-        if np.isnan(y_train.values).any():
-            logger.error("NaN values found in y_train after splitting")
-            # Remove samples with NaN target values
-            valid_indices = ~np.isnan(y_train.values)
-            y_train = y_train[valid_indices]
-            combined_features = combined_features[valid_indices]
-            logger.info(f"Removed {(~valid_indices).sum()} samples with NaN target values")
-
-        # Train model
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(combined_features, y_train)
+def file_digest(path, chunk_size=2 ** 20):
+    """sha1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stage_key(stage, *inputs):
+    """Cache key of a stage's output from its version and inputs."""
+    text = json.dumps([stage, STAGE_VERSIONS[stage], *inputs], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+class StageCache:
+    """Pickled stage outputs in a directory, one file per stage and key; disabled without a directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, stage, key):
+        return os.path.join(self.directory, f"{stage}-{key}.pkl")
+
+    def has(self, stage, key):
+        return bool(self.directory) and os.path.exists(self._path(stage, key))
+
+    def load(self, stage, key):
+        with open(self._path(stage, key), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, stage, key, value):
+        if not self.directory:
+            return
+        path = self._path(stage, key)
+        with open(f"{path}.tmp", 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{path}.tmp", path)
+        # Outputs for older inputs of this stage are not needed again
+        for name in os.listdir(self.directory):
+            if name.startswith(f"{stage}-") and name.endswith('.pkl') and name != os.path.basename(path):
+                os.remove(os.path.join(self.directory, name))
+
+def split_data(df):
+    """Training rows and ratings; the held-out 20% is not used to fit anything."""
+    # Verify no NaN values in Rating column before splitting
+    if df['Rating'].isna().any():
+        logger.warning(f"Found {df['Rating'].isna().sum()} NaN values in Rating before splitting")
+        df = df.dropna(subset=['Rating'])
+        logger.info(f"Removed rows with NaN ratings, new shape: {df.shape}")
+
+    # Split data
+    X = df.drop('Rating', axis=1)
+    y = df['Rating']
 
+    # Additional check for NaN values in y
+    if y.isna().any():
+        logger.error(f"Found {y.isna().sum()} NaN values in target variable y")
+        raise ValueError("Target variable contains NaN values after preprocessing")
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    return X_train, y_train
+
+def fit_transformers(X_train):
+    """Fit the scaler, encoder and TF-IDF vectorizer on the training rows."""
+    scaler = MinMaxScaler()
+    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False)  # Changed sparse to sparse_output
+    tfidf_vectorizer = TfidfVectorizer(stop_words='english')
+    scaler.fit(X_train[NUMERICAL_FEATURES])
+    encoder.fit(X_train[CATEGORICAL_FEATURES])
+    tfidf_vectorizer.fit(X_train['Features'])
+    return scaler, encoder, tfidf_vectorizer
+
+def build_features(X_train, scaler, encoder, tfidf_vectorizer):
+    """Combined training matrix, as float32 CSC so the forest fits it without a copy."""
+    combined_features = hstack([
+        tfidf_vectorizer.transform(X_train['Features']),
+        csr_matrix(scaler.transform(X_train[NUMERICAL_FEATURES])),
+        csr_matrix(encoder.transform(X_train[CATEGORICAL_FEATURES]))
+    ], format='csc', dtype=np.float32)
+    return combined_features
+
+def train_forest(combined_features, y_train, params=None, n_jobs=-1):
+    """Fit the rating forest; trees are built in threads that share the feature matrix."""
+    params = dict(MODEL_PARAMS, **(params or {}))
+    y_train = np.asarray(y_train, dtype=np.float64)
+    # Final check for NaN values in y_train
+    if np.isnan(y_train).any():
+        logger.error("NaN values found in y_train after splitting")
+        # Remove samples with NaN target values
+        valid_indices = ~np.isnan(y_train)
+        y_train = y_train[valid_indices]
+        combined_features = combined_features[valid_indices]
+        logger.info(f"Removed {(~valid_indices).sum()} samples with NaN target values")
+
+    model = RandomForestRegressor(n_jobs=n_jobs, **params)
+    model.fit(combined_features, y_train)
+    # Serving predicts single-threaded; do not pickle the training setting
+    model.n_jobs = None
+    return model
+
+def train_model(df, params=None, n_jobs=-1):
+    """Train the recommendation model"""
+    try:
+        X_train, y_train = split_data(df)
+        scaler, encoder, tfidf_vectorizer = fit_transformers(X_train)
+        combined_features = build_features(X_train, scaler, encoder, tfidf_vectorizer)
+        model = train_forest(combined_features, y_train, params, n_jobs)
         logger.info("Model training completed successfully")
         return model, scaler, encoder, tfidf_vectorizer, combined_features
 
@@ -179,37 +270,119 @@ def train_model(df):
         logger.error(f"Error in model training: {str(e)}")
         raise
 
-if __name__ == "__main__":
+def run_pipeline(data_path=None, params=None, n_jobs=-1, cache_dir=None):
+    """Run the training stages, reusing cached outputs whose inputs have not changed.
+
+    Returns the fitted components and a report with each stage's status
+    ('cached', 'built' or 'skipped'), seconds and RSS after it.
+    """
+    params = dict(MODEL_PARAMS, **(params or {}))
+    data_path = data_path or dataset_path()
+    cache = StageCache(cache_dir)
+    recorder = PhaseRecorder(TRAINING_STAGE_SECONDS)
+    status = {}
+
+    keys = {'clean': stage_key('clean', file_digest(data_path))}
+    keys['transformers'] = stage_key('transformers', keys['clean'])
+    keys['features'] = stage_key('features', keys['transformers'])
+    keys['model'] = stage_key('model', keys['features'], params)
+
+    # Work back from the model: a stage runs only if a later one needs its output
+    need_features = not cache.has('model', keys['model'])
+    need_split = not cache.has('transformers', keys['transformers']) or (
+        need_features and not cache.has('features', keys['features']))
+
+    def stage(name, needed, build):
+        if not needed:
+            status[name] = 'skipped'
+            return None
+        if cache.has(name, keys[name]):
+            value = cache.load(name, keys[name])
+            status[name] = 'cached'
+        else:
+            value = build()
+            cache.save(name, keys[name], value)
+            status[name] = 'built'
+        recorder.lap(name)
+        logger.info(f"Stage {name}: {status[name]} in {recorder.phases[-1]['seconds']:.2f}s, "
+                    f"RSS {recorder.phases[-1]['rss_mb']} MB")
+        return value
+
     try:
-        # Load and preprocess data
-        dataset = load_dataset()
-        dataset = preprocess_data(dataset)
-        logger.info("Data preprocessing completed")
+        df = stage('clean', need_split, lambda: preprocess_data(load_dataset(data_path)))
+        X_train, y_train = split_data(df) if need_split else (None, None)
+        del df
+        scaler, encoder, tfidf_vectorizer = stage('transformers', True, lambda: fit_transformers(X_train))
+        features = stage('features', need_features,
+                         lambda: (build_features(X_train, scaler, encoder, tfidf_vectorizer), y_train.to_numpy()))
+        del X_train, y_train
+        model = stage('model', True, lambda: train_forest(*features, params, n_jobs))
+    finally:
+        recorder.finish()
 
-        # Train model
-        model, scaler, encoder, tfidf_vectorizer, combined_features = train_model(dataset)
-        logger.info("Model training completed")
+    report = dict(recorder.report(), data_path=data_path, params=params, keys=keys,
+                  stages={phase['phase']: dict(phase, status=status[phase['phase']]) for phase in recorder.phases},
+                  skipped=[name for name, value in status.items() if value == 'skipped'])
+    components = {'model': model, 'scaler': scaler, 'encoder': encoder, 'tfidf_vectorizer': tfidf_vectorizer,
+                  'combined_features': features[0] if features is not None else None}
+    return components, report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the rating model and fit the feature transformers")
+    parser.add_argument('--data', help="Catalog CSV (default: the fixed dataset, else the original)")
+    parser.add_argument('--trees', type=int, default=MODEL_PARAMS['n_estimators'])
+    parser.add_argument('--max-depth', type=int, default=MODEL_PARAMS['max_depth'])
+    parser.add_argument('--min-samples-leaf', type=int, default=MODEL_PARAMS['min_samples_leaf'])
+    parser.add_argument('--max-features', type=float, default=MODEL_PARAMS['max_features'])
+    parser.add_argument('--max-samples', type=float, default=MODEL_PARAMS['max_samples'],
+                        help="Fraction of rows drawn for each tree")
+    parser.add_argument('--jobs', type=int, default=-1, help="Threads fitting trees; -1 uses every core")
+    parser.add_argument('--cache-dir', default=Config.TRAINING_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help="Rebuild every stage and cache nothing")
+    args = parser.parse_args()
+
+    try:
+        params = {'n_estimators': args.trees, 'max_depth': args.max_depth, 'min_samples_leaf': args.min_samples_leaf,
+                  'max_features': args.max_features, 'max_samples': args.max_samples}
+        start_time = time.perf_counter()
+        components, report = run_pipeline(args.data, params, args.jobs, None if args.no_cache else args.cache_dir)
+        logger.info(f"Training pipeline finished in {time.perf_counter() - start_time:.1f}s")
 
         # Save components
         model_dir = os.path.join(os.path.dirname(__file__), 'models')
         os.makedirs(model_dir, exist_ok=True)
 
-        components = {
-            'random_forest_model.pkl': model,
-            'minmax_scaler.pkl': scaler,      # Changed from 'scaler.pkl'
-            'onehot_encoder.pkl': encoder,    # Changed from 'encoder.pkl'
-            'tfidf_vectorizer.pkl': tfidf_vectorizer,  # Changed from 'tfidf.pkl'
-            'combined_features_train.pkl': combined_features
+        saved = {
+            'random_forest_model.pkl': components['model'],
+            'minmax_scaler.pkl': components['scaler'],      # Changed from 'scaler.pkl'
+            'onehot_encoder.pkl': components['encoder'],    # Changed from 'encoder.pkl'
+            'tfidf_vectorizer.pkl': components['tfidf_vectorizer'],  # Changed from 'tfidf.pkl'
         }
+        if components['combined_features'] is not None:
+            saved['combined_features_train.pkl'] = components['combined_features']
 
-        for filename, component in components.items():
+        for filename, component in saved.items():
             filepath = os.path.join(model_dir, filename)
             with open(filepath, 'wb') as f:
                 pickle.dump(component, f)
             logger.info(f"Saved: {filename}")
 
+        # Flat node arrays for fast single-row predictions in /predict, keyed to the model file
+        model_digest = file_digest(os.path.join(model_dir, 'random_forest_model.pkl'))
+        CompiledForest.from_sklearn(components['model'], model_digest).save(os.path.join(model_dir, 'compiled_forest.npz'))
+
+        with open(os.path.join(model_dir, 'training_report.json'), 'w') as f:
+            json.dump(report, f, indent=2, default=str)
         logger.info("Model components saved successfully!")
 
+        # Catalog ratings of the new model, loaded by every serving worker
+        from app.recommender import AppRecommender
+        from app.ratings import build_ratings
+        try:
+            build_ratings(AppRecommender(), os.path.join(model_dir, os.path.basename(Config.PREDICTED_RATINGS_PATH)), args.jobs)
+        except Exception as e:
+            logger.error(f"Could not predict catalog ratings; run python -m app.ratings: {str(e)}")
+
     except Exception as e:
         logger.error(f"Error in main execution: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import hstack, csr_matrix
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.ensemble import RandomForestRegressor
+
+CATEGORIES = {
+    'PHOTOGRAPHY': ['Photo Editor', 'Camera Pro', 'Selfie Camera', 'Photo Collage', 'Filter Studio'],
+    'SOCIAL': ['Facebook', 'Instagram', 'Chat Friends', 'Social Feed', 'Meet People'],
+    'GAME': ['Puzzle Quest', 'Racing Game', 'Word Puzzle', 'Chess Master', 'Card Game'],
+    'FINANCE': ['Budget Tracker', 'Bank Mobile', 'Expense Manager', 'Stock Market', 'Crypto Wallet'],
+}
+GENRES = {
+    'PHOTOGRAPHY': 'Photography',
+    'SOCIAL': 'Social',
+    'GAME': 'Puzzle;Casual',
+    'FINANCE': 'Finance',
+}
+
+def make_catalog():
+    """A small catalog with the same schema as googleplaystore_fixed.csv."""
+    rng = np.random.RandomState(0)
+    rows = []
+    for category, names in CATEGORIES.items():
+        for i, name in enumerate(names):
+            paid = i % 4 == 3
+            rows.append({
+                'App': name,
+                'Category': category,
+                'Rating': round(3.0 + 2.0 * rng.rand(), 1),
+                'Reviews': str(int(rng.randint(10, 100000))),
+                'Size': str(int(rng.randint(1, 100))),
+                'Installs': f"{int(rng.choice([1000, 10000, 100000])):,}+",
+                'Type': 'Paid' if paid else 'Free',
+                'Price': '$1.99' if paid else '0',
+                'Content Rating': 'Teen' if category == 'SOCIAL' else 'Everyone',
+                'Genres': GENRES[category],
+            })
+    # Duplicate listing that recommendations must skip
+    rows.append(dict(rows[0], App='photo editor'))
+    return pd.DataFrame(rows)
+
+def fit_components(catalog):
+    """Transformers and rating model fitted the same way as save_model.train_model."""
+    from app.recommender import clean_catalog
+
+    df = clean_catalog(catalog.copy())
+    df['Features'] = df['Category'] + ' ' + df['Genres'] + ' ' + df['App']
+    scaler = MinMaxScaler()
+    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False)
+    tfidf_vectorizer = TfidfVectorizer(stop_words='english')
+    combined = hstack([
+        tfidf_vectorizer.fit_transform(df['Features']),
+        csr_matrix(scaler.fit_transform(df[['Reviews', 'Size', 'Installs', 'Price']])),
+        csr_matrix(encoder.fit_transform(df[['Type', 'Content Rating']]))
+    ]).tocsr()
+    model = RandomForestRegressor(n_estimators=5, random_state=42)
+    model.fit(combined, df['Rating'])
+    return {
+        'tfidf_vectorizer': tfidf_vectorizer,
+        'encoder': encoder,
+        'scaler': scaler,
+        'model': model
+    }
+
+@pytest.fixture
+def catalog():
+    return make_catalog()
+
+@pytest.fixture
+def fitted_components(catalog):
+    return fit_components(catalog)
+
+@pytest.fixture
+def recommender(catalog, fitted_components):
+    from app.recommender import AppRecommender
+    return AppRecommender(data=catalog, **fitted_components)
@@ -0,0 +1,67 @@
+from benchmarks.catalog import synthetic_catalog, realistic_catalog, load_reference
+from benchmarks.load import parse_mix, build_schedule, summarize
+from benchmarks.compare import compare
+from benchmarks.run import bench_catalog
+
+def test_synthetic_catalog_schema():
+    catalog = synthetic_catalog(50, seed=1)
+    assert len(catalog) == 50
+    assert list(catalog.columns) == ['App', 'Category', 'Rating', 'Reviews', 'Size', 'Installs',
+                                     'Type', 'Price', 'Content Rating', 'Genres']
+    assert synthetic_catalog(50, seed=1).equals(catalog)
+
+def test_bench_catalog_and_compare():
+    result = bench_catalog(300, n_queries=5, batch_size=10, n_trees=2)
+    assert set(result['lookup']) == {'exact', 'case_insensitive', 'partial', 'not_found'}
+    assert result['lookup']['exact']['n'] == 5
+    assert result['throughput']['recommendations_per_s'] > 0
+    assert result['peak_rss_mb'] >= result['peak_rss_after_startup_mb'] > 0
+
+    slower = dict(result, lookup=dict(result['lookup'], exact=dict(result['lookup']['exact'], p95_ms=result['lookup']['exact']['p95_ms'] * 2)))
+    rows, regressions = compare({'results': [result]}, {'results': [slower]})
+    assert [name for _, name, *_ in regressions] == ['lookup.exact.p95_ms']
+
+    # More duplicates found or a negative overhead are not regressions
+    changed = dict(slower, dedup=dict(result['dedup'], collapsed=result['dedup']['collapsed'] + 50, collapsed_pct=50.0),
+                   block_weights=dict(result['block_weights'], overhead_pct=-5.0))
+    rows, regressions = compare({'results': [result]}, {'results': [changed]})
+    assert [name for _, name, *_ in regressions] == ['lookup.exact.p95_ms']
+    assert next(row for row in rows if row[1] == 'dedup.collapsed')[4] is None
+
+def test_realistic_catalog_follows_reference():
+    reference = load_reference()
+    catalog = realistic_catalog(2000, seed=3, reference=reference, duplicate_rate=0.1)
+    assert len(catalog) == 2000
+    assert list(catalog.columns) == list(synthetic_catalog(1).columns)
+    assert set(catalog['Category']) <= set(reference['Category'])
+    assert abs(catalog['App'].duplicated().mean() - 0.1) < 0.03
+
+def test_catalog_path_alone_satisfies_data_check(tmp_path, monkeypatch):
+    from app.config import Config
+    path = tmp_path / 'realistic.csv'
+    realistic_catalog(20, seed=0).to_csv(path, index=False)
+    for name in ('DATA_PATH', 'FIXED_DATA_PATH', 'SAMPLE_DATA_PATH'):
+        monkeypatch.setattr(Config, name, str(tmp_path / f"{name}.csv"))
+    monkeypatch.setattr(Config, 'CATALOG_PATH', str(path))
+    assert not any(missing.endswith('.csv') for missing in Config.verify_paths())
+    monkeypatch.setattr(Config, 'CATALOG_PATH', None)
+    assert str(tmp_path / 'DATA_PATH.csv') in Config.verify_paths()
+
+def test_load_schedule_and_summary():
+    mix = parse_mix('recommend=3,reviews=1')
+    assert mix == {'recommend': 0.75, 'reviews': 0.25}
+    names = [f"App {i}" for i in range(100)]
+    schedule = build_schedule(names, 2000, mix, exponent=1.2, seed=1)
+    assert {endpoint for endpoint, _ in schedule} == {'recommend', 'reviews'}
+    # Zipf: the most popular app gets far more traffic than a mid-ranked one
+    paths = [path for _, path in schedule]
+    assert sum(p.endswith('App%200') for p in paths) > 5 * sum(p.endswith('App%2050') for p in paths)
+
+    results = [('recommend', 200, 0.004, None), ('recommend', 500, 0.030, None),
+               ('reviews', 404, 0.002, None), ('reviews', None, 10.0, 'TimeoutError')]
+    report = summarize(results, 2.0, 2, 0.0)
+    assert report['achieved_qps'] == 2.0
+    assert report['overall']['error_rate'] == 0.5
+    assert report['endpoints']['reviews']['client_error_rate'] == 0.5
+    assert report['endpoints']['reviews']['status_codes'] == {'404': 1, 'TimeoutError': 1}
+    assert sum(report['overall']['histogram_ms'].values()) == 4
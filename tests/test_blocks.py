@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from app import create_app
+from app.blocks import BlockFeatures, parse_block_weights
+from app.config import Config
+
+@pytest.fixture
+def block_recommender(catalog, fitted_components, monkeypatch):
+    from app.recommender import AppRecommender
+    monkeypatch.setattr(Config, 'FEATURE_BLOCKS', True)
+    return AppRecommender(data=catalog, **fitted_components)
+
+def test_parse_block_weights():
+    assert parse_block_weights(None) is None
+    assert parse_block_weights('text:2, numeric:0.5') == {'text': 2.0, 'numeric': 0.5, 'categorical': 1.0}
+    assert parse_block_weights({'categorical': 0}) == {'text': 1.0, 'numeric': 1.0, 'categorical': 0.0}
+    for bad in ('colour:1', 'text:-1', 'text:x', 'text:0,numeric:0,categorical:0', 'text'):
+        with pytest.raises(ValueError):
+            parse_block_weights(bad)
+
+def test_weighted_scores_are_weighted_block_cosines():
+    rng = np.random.default_rng(0)
+    combined = rng.random((6, 5)) * (rng.random((6, 5)) > 0.3)
+    combined[:, 0] += 0.1
+    blocks = BlockFeatures(combined, [2, 2, 1], precision='float64')
+    weights = {'text': 3.0, 'numeric': 1.0, 'categorical': 0.0}
+    scores = blocks.index.score_all(blocks.query(0, weights))
+
+    def cosine(a, b):
+        norms = np.linalg.norm(a) * np.linalg.norm(b)
+        return a @ b / norms if norms else 0.0
+    for row in range(6):
+        expected = (3 * cosine(combined[0, :2], combined[row, :2]) + cosine(combined[0, 2:4], combined[row, 2:4])) / 4
+        assert scores[row] == pytest.approx(expected)
+
+def test_weights_change_ranking_without_rebuild(block_recommender):
+    fixed = block_recommender.get_recommendations('Photo Editor', 5)
+    assert fixed['weights'] is None
+    text_only = block_recommender.get_recommendations('Photo Editor', 5, weights=parse_block_weights('numeric:0,categorical:0'))
+    numeric_only = block_recommender.get_recommendations('Photo Editor', 5, weights=parse_block_weights('text:0,categorical:0'))
+    names = lambda result: [record['App'] for record in result['recommendations']]
+    assert names(text_only) != names(numeric_only)
+    # Text alone ranks the other photography apps first
+    assert {record['Category'] for record in text_only['recommendations'][:4]} == {'PHOTOGRAPHY'}
+
+def test_weights_request_parameter(block_recommender, tmp_path, monkeypatch):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = block_recommender
+    client = app.test_client()
+    response = client.get('/api/recommend?app_name=Photo Editor&weights=text:2,numeric:0.5')
+    assert response.status_code == 200
+    assert response.get_json()['weights'] == {'text': 2.0, 'numeric': 0.5, 'categorical': 1.0}
+    assert client.post('/api/recommend', json={'app_name': 'Photo Editor', 'weights': {'text': 2}}).status_code == 200
+    assert client.get('/api/recommend?app_name=Photo Editor&weights=colour:1').status_code == 400
+
+    # Without block features the parameter is refused
+    monkeypatch.setattr(block_recommender, 'blocks', None)
+    assert client.get('/api/recommend?app_name=Photo Editor&weights=text:2').status_code == 400
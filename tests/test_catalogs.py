@@ -0,0 +1,101 @@
+import pytest
+from app import create_app
+from app.catalogs import CatalogRegistry, UnknownCatalog, catalog_nbytes, parse_catalogs
+
+MB = 2 ** 20
+
+@pytest.fixture
+def catalog_paths(catalog, tmp_path):
+    paths = {}
+    for market in ('de', 'fr'):
+        path = tmp_path / f"{market}.csv"
+        catalog.assign(App=market.upper() + ' ' + catalog['App']).to_csv(path, index=False)
+        paths[market] = str(path)
+    return paths
+
+def test_parse_catalogs():
+    from app.config import Config
+    catalogs = parse_catalogs('de=data/de.csv, fr=/srv/fr.csv,')
+    assert catalogs == {'de': f"{Config.BASE_DIR}/data/de.csv", 'fr': '/srv/fr.csv'}
+    assert parse_catalogs(None) == {}
+    with pytest.raises(ValueError):
+        parse_catalogs('de')
+
+def test_registry_loads_lazily_and_shares_models(recommender, catalog_paths, tmp_path):
+    registry = CatalogRegistry(catalog_paths, shared=recommender, artifacts_dir=str(tmp_path / 'artifacts'))
+    assert not registry.loaded
+
+    de = registry.get('de')
+    assert list(registry.loaded) == ['de']
+    assert de.data['App'].str.startswith('DE ').all()
+    assert de.tfidf_vectorizer is recommender.tfidf_vectorizer and de.model is recommender.model
+    assert de.compiled_model is recommender.compiled_model
+    # The shared models' file digests carry over, and the catalog's own data changes the version
+    assert de.version != recommender.version
+    assert registry.get('de') is de and registry.stats == {'hits': 1, 'loads': 1, 'evictions': 0, 'failures': 0}
+    # Shared models are not counted against the budget
+    assert catalog_nbytes(de, recommender) < catalog_nbytes(de)
+
+    with pytest.raises(UnknownCatalog):
+        registry.get('us')
+
+def test_registry_evicts_least_recently_used(recommender, catalog_paths, tmp_path):
+    registry = CatalogRegistry(catalog_paths, shared=recommender, artifacts_dir=str(tmp_path))
+    size = catalog_nbytes(registry.get('de'), recommender)
+    registry.memory_budget = 1.5 * size
+
+    fr = registry.get('fr')
+    assert list(registry.loaded) == ['fr'] and registry.stats['evictions'] == 1
+    de = registry.get('de')
+    assert list(registry.loaded) == ['de'] and registry.stats['loads'] == 3
+    assert registry.get('de') is de and registry.get('fr') is not fr
+
+    registry.memory_budget = 3 * size
+    registry.get('de')
+    assert list(registry.loaded) == ['fr', 'de']
+    assert registry.describe()['loaded_mb'] == {'fr': round(size / MB, 2), 'de': round(size / MB, 2)}
+
+def test_unloadable_catalog_is_unavailable(recommender, catalog, tmp_path, monkeypatch):
+    path = tmp_path / 'broken.csv'
+    catalog.drop(columns=['Genres']).to_csv(path, index=False)
+    registry = CatalogRegistry({'broken': str(path)}, shared=recommender, retry_seconds=60)
+    assert registry.get('broken') is None
+    assert registry.stats['failures'] == 1 and not registry.loaded
+
+    # Not rebuilt on every request while it backs off
+    loads = []
+    monkeypatch.setattr(registry, '_load', lambda name: loads.append(name))
+    assert registry.get('broken') is None and loads == []
+    assert 0 < registry.describe()['retry_in_s']['broken'] <= 60
+
+    # Retried once the wait is over, then waits twice as long
+    registry._failed['broken'] = (1, 0.0)
+    assert registry.get('broken') is None and loads == ['broken']
+    assert registry.stats['failures'] == 2 and 60 < registry.describe()['retry_in_s']['broken'] <= 120
+
+def test_catalog_request_parameter(recommender, catalog_paths, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = recommender
+    app.catalogs = CatalogRegistry(catalog_paths, shared=recommender, artifacts_dir=str(tmp_path))
+    client = app.test_client()
+
+    default = client.get('/api/recommend?app_name=Facebook')
+    assert client.get('/api/recommend?app_name=Facebook&catalog=default').get_json() == default.get_json()
+    german = client.get('/api/recommend?app_name=DE Facebook&catalog=de')
+    assert german.status_code == 200
+    assert all(rec['App'].startswith('DE ') for rec in german.get_json()['recommendations'])
+    assert german.headers['ETag'] != default.headers['ETag']
+    assert client.post('/api/recommend', json={'app_name': 'FR Facebook', 'catalog': 'fr'}).status_code == 200
+
+    popular = client.get('/api/popular?count=3&catalog=fr').get_json()['popular_apps']
+    assert all(app['App'].startswith('FR ') for app in popular)
+    assert client.get('/api/suggest?q=DE F&catalog=de').get_json()['suggestions'][0]['App'].startswith('DE F')
+
+    unknown = client.get('/api/recommend?app_name=Facebook&catalog=us')
+    assert unknown.status_code == 404 and 'us' in unknown.get_json()['message']
+    assert client.get('/api/popular?catalog=us').status_code == 404
+    assert client.get('/api/suggest?q=a&catalog=us').status_code == 404
+
+    status = client.get('/api/recommender-status').get_json()
+    assert status['catalogs']['available'] == ['de', 'fr']
+    assert set(status['catalogs']['loaded_mb']) == {'de', 'fr'}
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from flask import Flask
+from scipy.sparse import csr_matrix
+from app.collaborative import build_item_neighbors, build_interaction_matrix
+from app.database import init_db
+from app.models import App, Review, db
+from app.neighbors import NeighborTable, top_k_neighbors
+
+@pytest.fixture
+def session(catalog):
+    app = Flask('app')
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://')
+    init_db(app)
+    with app.app_context():
+        apps = {name: App(name=name) for name in catalog['App'][:20]}
+        db.session.add_all(apps.values())
+        db.session.flush()
+        # Users who like Photo Editor also like Budget Tracker
+        for user in range(10):
+            db.session.add(Review(app_id=apps['Photo Editor'].id, rating=5, content='x', author=f'u{user}'))
+            db.session.add(Review(app_id=apps['Budget Tracker'].id, rating=4, content='x', author=f'u{user}'))
+        db.session.add(Review(app_id=apps['Chess Master'].id, rating=3, content='x', author='u0'))
+        db.session.commit()
+        yield db.session
+
+def test_top_k_neighbors_matches_dense_cosine():
+    rng = np.random.RandomState(1)
+    matrix = csr_matrix(rng.rand(30, 8) * (rng.rand(30, 8) > 0.5))
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    matrix = csr_matrix(matrix.multiply(1.0 / np.maximum(norms, 1e-12)[:, None]))
+    table = top_k_neighbors(matrix, k=5, chunk_size=7)
+
+    dense = (matrix @ matrix.T).toarray()
+    np.fill_diagonal(dense, -1)
+    for row in range(30):
+        indices, scores = table.neighbors(row)
+        expected = np.sort(dense[row][dense[row] > 0])[::-1][:5]
+        np.testing.assert_allclose(scores, expected, rtol=1e-5)
+
+def test_interaction_matrix_averages_repeated_reviews():
+    reviews = [('a', 1, 5), ('a', 1, 3), ('b', 2, 4), ('c', 99, 1)]
+    matrix = build_interaction_matrix(reviews, {1: 0, 2: 1}, n_apps=3, batch_size=2)
+    assert matrix.shape == (3, 2)
+    assert matrix[0, 0] == 4
+    assert matrix[1, 1] == 4
+
+def test_build_item_neighbors_and_hybrid(session, catalog, fitted_components, tmp_path):
+    table = build_item_neighbors(session, catalog['App'].tolist(), k=3, chunk_size=4)
+    assert table.n_rows == len(catalog)
+    indices, scores = table.neighbors(0)
+    assert catalog['App'][indices[0]] == 'Budget Tracker'
+
+    path = tmp_path / 'cf.npz'
+    table.save(path)
+    loaded = NeighborTable.load(path)
+    np.testing.assert_array_equal(loaded.indices, table.indices)
+
+    from app.recommender import AppRecommender
+    recommender = AppRecommender(data=catalog, cf_neighbors=loaded, **fitted_components)
+    content = recommender.get_recommendations('Photo Editor', num_recommendations=20, mode='content')
+    hybrid = recommender.get_recommendations('Photo Editor', num_recommendations=20, mode='hybrid')
+    assert hybrid['mode'] == 'hybrid'
+    content_names = [app['App'] for app in content['recommendations']]
+    hybrid_names = [app['App'] for app in hybrid['recommendations']]
+    assert hybrid_names.index('Budget Tracker') < content_names.index('Budget Tracker')
+    assert hybrid_names[0] == 'Budget Tracker'
+
+def test_reviews_of_collapsed_listings_count_for_their_representative(session, catalog):
+    # Photo Editor was collapsed into Camera Pro at ingest
+    names = catalog['App'][1:20].tolist()
+    table = build_item_neighbors(session, names, k=3, chunk_size=4, aliases={'photo editor': 0})
+    indices, _ = table.neighbors(0)
+    assert names[indices[0]] == 'Budget Tracker'
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import text
+from app import create_app
+from app.models import App, Review, db
+
+@pytest.fixture
+def app(tmp_path):
+    db_path = tmp_path / 'test.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLALCHEMY_REPLICA_URI': f'sqlite:///{db_path}',
+        'DB_POOL_SIZE': 2,
+        'DB_MAX_OVERFLOW': 3
+    })
+    with app.app_context():
+        facebook = App(name='Facebook', category='SOCIAL', rating=4.1)
+        db.session.add(facebook)
+        db.session.flush()
+        db.session.add(Review(app_id=facebook.id, rating=5, content='Great', author='alice'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+def test_sqlite_pragmas(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            # synchronous=NORMAL is reported as 1
+            assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+
+def test_pool_settings_from_config(app):
+    with app.app_context():
+        assert db.engine.pool.size() == 2
+        assert db.engine.pool._max_overflow == 3
+
+def test_reviews_read_from_replica(app):
+    client = app.test_client()
+    response = client.get('/api/reviews/Facebook')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['review_count'] == 1
+    assert data['reviews'][0]['author'] == 'alice'
+
+    health = client.get('/api/health').get_json()
+    engines = health['database']['engines']
+    assert health['database']['has_replica']
+    assert engines['replica']['queries']['count'] > 0
+    assert engines['primary']['pool_size'] == 2
+
+def test_failed_query_leaves_no_timer(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(Exception):
+                conn.execute(text('SELECT * FROM missing_table'))
+            assert not conn.info.get('query_start_time')
+            conn.execute(text('SELECT 1'))
+            assert not conn.info.get('query_start_time')
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from app import create_app
+from app.config import Config
+from app.dedup import collapse_duplicates, duplicate_aliases, jaccard, normalize_name, shingle_sets, variant_key
+
+def listing(name, reviews, category='PHOTOGRAPHY', genres='Photography'):
+    return {'App': name, 'Category': category, 'Reviews': reviews, 'Genres': genres}
+
+def test_normalize_name_and_variants():
+    assert normalize_name('Maps - Navigate v2.1!') == 'maps navigate'
+    assert normalize_name('Notes  (Version 3)') == 'notes'
+    assert normalize_name('Calculator++') == 'calculator plus plus'
+    assert variant_key(normalize_name('Racing 2 Pro')) == '2 pro'
+    assert variant_key(normalize_name('Dragon Quest III')) == 'iii'
+    assert variant_key(normalize_name('Photo Editor')) == ''
+
+def test_jaccard_matches_python_sets():
+    data = pd.DataFrame([listing('Photo Editor', 1), listing('Photo Editor Lab', 1), listing('Chess', 1, 'GAME', 'Board')])
+    indptr, hashes, _ = shingle_sets(data)
+    sets = [set(hashes[indptr[i]:indptr[i + 1]].tolist()) for i in range(3)]
+    left, right = np.array([0, 0, 1]), np.array([1, 2, 2])
+    expected = [len(sets[a] & sets[b]) / len(sets[a] | sets[b]) for a, b in zip(left, right)]
+    np.testing.assert_allclose(jaccard(indptr, hashes, left, right, chunk_size=2), expected)
+    assert expected[1] < expected[0] < 1
+
+def test_collapse_keeps_most_reviewed_listing():
+    data = pd.DataFrame([
+        listing('Photo Editor', 10), listing('Chess Master', 50, 'GAME', 'Board'), listing('photo editor', 500),
+        listing('Photo Editor!', 20), listing('Photo Editor v2.0', 5), listing('Photo Editor Pro', 1000),
+        listing('Racing 2', 1, 'GAME', 'Racing'), listing('Racing', 1, 'GAME', 'Racing'),
+        # Same name in another category and genre is another app
+        listing('Photo Editor', 1, 'FINANCE', 'Finance'),
+    ])
+    collapsed, duplicates = collapse_duplicates(data, threshold=0.9)
+    assert collapsed['App'].tolist() == ['Chess Master', 'photo editor', 'Photo Editor Pro', 'Racing 2', 'Racing',
+                                         'Photo Editor']
+    assert sorted(duplicates['App']) == ['Photo Editor', 'Photo Editor v2.0', 'Photo Editor!']
+    assert set(duplicates['Representative']) == {'photo editor'} and set(duplicates['Row']) == {1}
+
+    # Names the collapsed catalog still has are not aliases
+    assert duplicate_aliases(collapsed, duplicates) == {'photo editor v2.0': 1, 'photo editor!': 1}
+
+    nothing, none = collapse_duplicates(data.iloc[[0, 1]])
+    assert len(nothing) == 2 and none.empty
+
+def test_recommender_serves_collapsed_catalog(catalog, fitted_components, tmp_path, monkeypatch):
+    from app.recommender import AppRecommender
+    monkeypatch.setattr(Config, 'DEDUP_CATALOG', True)
+    variant = dict(catalog.iloc[5], App='Facebook v2.0')
+    recommender = AppRecommender(data=pd.concat([catalog, pd.DataFrame([variant])], ignore_index=True),
+                                 **fitted_components)
+    assert len(recommender.data) == len(catalog) - 1
+    assert recommender.features.shape[0] == len(recommender.data)
+    assert sorted(recommender.duplicates['App']) == ['Facebook v2.0', 'photo editor']
+    assert 'dedup' in [phase['phase'] for phase in recommender.startup_report['phases']]
+
+    # A dropped name resolves to its representative's recommendations
+    result = recommender.get_recommendations('Facebook v2.0', 5)
+    assert result['status'] == 'success'
+    assert result['recommendations'] == recommender.get_recommendations('Facebook', 5)['recommendations']
+    names = [rec['App'] for rec in recommender.get_recommendations('Camera Pro', 20)['recommendations']]
+    assert len(names) == len(set(name.lower() for name in names)) == len(recommender.data) - 1
+
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = recommender
+    status = app.test_client().get('/api/recommender-status').get_json()
+    assert status['duplicates_collapsed'] == 2
+    assert status['memory']['structures']['duplicates']['aliases'] == 1
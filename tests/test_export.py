@@ -0,0 +1,61 @@
+import json
+import sqlite3
+import pytest
+from app import create_app
+from app.export import iter_recommendations, export_recommendations, export_rows
+
+def test_export_matches_get_recommendations(recommender):
+    exported = dict(iter_recommendations(recommender, count=5, block_size=7))
+    names = recommender.data['App'].iloc[export_rows(recommender)].tolist()
+    assert list(exported) == names
+    for name in names:
+        assert exported[name] == recommender.get_recommendations(name, 5)['recommendations']
+
+def test_forked_workers_match_single_process(recommender):
+    single = list(iter_recommendations(recommender, count=3, block_size=5))
+    assert list(iter_recommendations(recommender, count=3, jobs=2, block_size=5)) == single
+
+@pytest.mark.parametrize('extension', ['ndjson', 'sqlite'])
+def test_export_files(recommender, tmp_path, extension):
+    path = str(tmp_path / f"recommendations.{extension}")
+    n_apps = export_recommendations(recommender, path, count=3)
+    assert n_apps == len(export_rows(recommender))
+    expected = recommender.get_recommendations('Facebook', 3)['recommendations']
+    if extension == 'ndjson':
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        assert len(lines) == n_apps
+        assert next(line for line in lines if line['app'] == 'Facebook')['recommendations'] == expected
+    else:
+        with sqlite3.connect(path) as connection:
+            rows = connection.execute('SELECT rank, recommended_app FROM recommendations WHERE app = ? ORDER BY rank',
+                                      ('Facebook',)).fetchall()
+        assert rows == [(rank, record['App']) for rank, record in enumerate(expected, start=1)]
+
+def test_failed_export_leaves_no_file(recommender, tmp_path, monkeypatch):
+    path = tmp_path / 'recommendations.ndjson'
+    monkeypatch.setattr(recommender, 'index', None)
+    with pytest.raises(Exception):
+        export_recommendations(recommender, str(path), count=3)
+    assert list(tmp_path.iterdir()) == []
+
+def test_export_route_streams_ndjson(recommender, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+                      'ADMIN_TOKEN': 'secret'})
+    app.recommender = recommender
+    client = app.test_client()
+    admin = {'X-Admin-Token': 'secret'}
+    assert client.get('/api/export?count=2').status_code == 403
+
+    response = client.get('/api/export?count=2', headers=admin)
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed and response.cache_control.private
+    # One export per process at a time by default
+    assert client.get('/api/export?count=2', headers=admin).status_code == 429
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    response.close()
+    assert [line['app'] for line in lines] == [app for app, _ in iter_recommendations(recommender, count=2)]
+    etag = {'If-None-Match': response.headers['ETag']}
+    assert client.get('/api/export', headers=dict(admin, **etag)).status_code == 200
+    assert client.get('/api/export?count=2', headers=dict(admin, **etag)).status_code == 304
+    assert client.get('/api/export?count=50', headers=admin).status_code == 400
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from app.filters import CatalogMasks, parse_filters
+from app.index import ExactIndex, LSHIndex
+
+def test_masks_combine_values_and_fields(catalog):
+    masks = CatalogMasks(catalog)
+    game = masks.mask({'category': 'game'})
+    assert game.sum() == 5
+    assert np.array_equal(game, (catalog['Category'] == 'GAME').to_numpy())
+
+    either = masks.mask({'category': ['GAME', 'SOCIAL']})
+    assert either.sum() == 10
+
+    free_games = masks.mask({'category': 'GAME', 'type': 'Free', 'min_rating': 4.0})
+    expected = (catalog['Category'] == 'GAME') & (catalog['Type'] == 'Free') & (catalog['Rating'] >= 4.0)
+    assert np.array_equal(free_games, expected.to_numpy())
+
+    assert masks.mask({'genre': 'casual'}).sum() == 5
+    assert not masks.mask({'category': 'NOT A CATEGORY'}).any()
+    assert masks.mask({}) is None
+
+def test_parse_filters():
+    assert parse_filters({'category': 'GAME, SOCIAL', 'min_rating': '4.2'}) == {
+        'category': ['GAME', 'SOCIAL'], 'min_rating': 4.2}
+    assert parse_filters({'type': ['Free']}) == {'type': ['Free']}
+    for bad in ({'min_rating': 'high'}, {'min_rating': 'nan'}, {'min_rating': 'inf'}, {'category': 5},
+                {'type': ['Free', 1]}):
+        with pytest.raises(ValueError):
+            parse_filters(bad)
+
+def test_masked_search_only_returns_allowed_rows(recommender):
+    mask = recommender.masks.mask({'category': 'FINANCE'})
+    for index in (ExactIndex(recommender.features), LSHIndex(recommender.features, n_tables=2, n_bits=4)):
+        result = index.search(recommender.features[0], 5, mask)
+        assert len(result.indices) == 5
+        assert mask[result.indices].all()
+
+def test_filtered_recommendations_fill_k(recommender):
+    result = recommender.get_recommendations('Photo Editor', 4, filters={'category': 'GAME'})
+    assert result['status'] == 'success'
+    assert len(result['recommendations']) == 4
+    assert {rec['Category'] for rec in result['recommendations']} == {'GAME'}
+
+    result = recommender.get_recommendations('Photo Editor', 5, filters={'min_rating': 5.1})
+    assert result['recommendations'] == []
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+from app.forest import CompiledForest
+
+@pytest.fixture
+def sparse_data():
+    rng = np.random.RandomState(0)
+    X = sparse_random(600, 80, density=0.1, format='csr', random_state=rng)
+    y = X @ rng.randn(80) + 0.1 * rng.randn(600)
+    return X, y
+
+def test_compiled_forest_matches_sklearn(sparse_data):
+    X, y = sparse_data
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X[:500], y[:500])
+    forest = CompiledForest.from_sklearn(model)
+    assert forest.n_trees == 20
+    np.testing.assert_allclose(forest.predict(X), model.predict(X), rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(forest.predict(X[:1]), model.predict(X[:1]), rtol=1e-12, atol=1e-12)
+    # Dense input and small chunks take the same path
+    np.testing.assert_allclose(forest.predict(X.toarray(), chunk_size=7), model.predict(X), rtol=1e-12, atol=1e-12)
+
+def test_single_tree_and_threshold_ties():
+    # Inputs equal to float64 thresholds that are not float32 values
+    X = np.array([[0.1], [0.2], [0.3], [0.4]])
+    tree = DecisionTreeRegressor().fit(X, [1.0, 2.0, 3.0, 4.0])
+    forest = CompiledForest.from_sklearn(tree)
+    probes = np.linspace(0, 0.5, 501).reshape(-1, 1)
+    np.testing.assert_array_equal(forest.predict(probes), tree.predict(probes))
+
+def test_save_and_load(sparse_data, tmp_path):
+    X, y = sparse_data
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    path = tmp_path / 'forest.npz'
+    CompiledForest.from_sklearn(model).save(path)
+    loaded = CompiledForest.load(path)
+    np.testing.assert_array_equal(loaded.predict(X), CompiledForest.from_sklearn(model).predict(X))
+    with pytest.raises(ValueError):
+        loaded.predict(X[:, :10])
+
+def test_recommender_uses_compiled_forest_for_small_batches(recommender):
+    assert recommender.compiled_model is not None
+    X = recommender._combine_features(recommender.data)
+    np.testing.assert_allclose(recommender._predict_ratings(X[:3]), recommender.model.predict(X[:3]), rtol=1e-12, atol=1e-12)
+
+def test_compiled_forest_must_come_from_the_loaded_model_file(catalog, fitted_components, monkeypatch, tmp_path, caplog):
+    import hashlib
+    import pickle
+    from app.config import Config
+    from app.recommender import AppRecommender
+    model = fitted_components.pop('model')
+    model_path, forest_path = tmp_path / 'model.pkl', tmp_path / 'forest.npz'
+    model_path.write_bytes(pickle.dumps(model))
+    monkeypatch.setattr(Config, 'MODEL_PATH', str(model_path))
+    monkeypatch.setattr(Config, 'COMPILED_FOREST_PATH', str(forest_path))
+    caplog.set_level('INFO', logger='app.recommender')
+
+    # Same shape, but exported for another model file
+    CompiledForest.from_sklearn(model, 'another model').save(forest_path)
+    AppRecommender(data=catalog, **fitted_components)
+    assert 'does not match the model' in caplog.text and 'Loaded compiled forest' not in caplog.text
+
+    caplog.clear()
+    CompiledForest.from_sklearn(model, hashlib.sha1(model_path.read_bytes()).hexdigest()).save(forest_path)
+    recommender = AppRecommender(data=catalog, **fitted_components)
+    assert 'Loaded compiled forest' in caplog.text
+    assert recommender.compiled_model.model_digest == recommender._artifact_digests[id(recommender.model)]
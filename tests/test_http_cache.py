@@ -0,0 +1,48 @@
+from app import create_app
+
+def make_client(recommender, tmp_path, **config):
+    app = create_app(dict({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"}, **config))
+    app.recommender = recommender
+    return app.test_client()
+
+def test_recommend_etag_and_not_modified(recommender, tmp_path, monkeypatch):
+    client = make_client(recommender, tmp_path, HTTP_CACHE_MAX_AGE=120)
+    response = client.get('/api/recommend?app_name=Facebook')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and not etag.startswith('W/')
+    assert response.headers['Cache-Control'] == 'public, max-age=120'
+    # Stable across requests, parameter order aside
+    assert client.get('/api/recommend?app_name=Facebook').headers['ETag'] == etag
+    assert (client.get('/api/recommend?app_name=Facebook&mode=content').headers['ETag']
+            == client.get('/api/recommend?mode=content&app_name=Facebook').headers['ETag'])
+    assert client.get('/api/recommend?app_name=Instagram').headers['ETag'] != etag
+
+    def fail(*args, **kwargs):
+        raise AssertionError("scored a request the client already holds")
+    monkeypatch.setattr(recommender, 'get_recommendations', fail)
+    cached = client.get('/api/recommend?app_name=Facebook', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+    assert cached.headers['ETag'] == etag
+    monkeypatch.undo()
+
+    # POST bodies are not cached; errors carry no validator
+    assert 'ETag' not in client.post('/api/recommend', json={'app_name': 'Facebook'}).headers
+    assert 'ETag' not in client.get('/api/recommend?app_name=No Such App').headers
+
+def test_etag_follows_recommender_version(recommender, tmp_path, monkeypatch):
+    client = make_client(recommender, tmp_path)
+    response = client.get('/api/popular?count=5')
+    etag = response.headers['ETag']
+    assert client.get('/api/popular?count=5', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/popular?count=6', headers={'If-None-Match': etag}).status_code == 200
+
+    # A new model or catalog changes the version and invalidates every ETag
+    monkeypatch.setattr(recommender, 'version', 'retrained')
+    assert client.get('/api/popular?count=5', headers={'If-None-Match': etag}).status_code == 200
+
+def test_version_is_deterministic(catalog, fitted_components, recommender):
+    from app.recommender import AppRecommender
+    assert AppRecommender(data=catalog, **fitted_components).version == recommender.version
+    changed = catalog.copy()
+    changed.loc[0, 'Rating'] = 1.0
+    assert AppRecommender(data=changed, **fitted_components).version != recommender.version
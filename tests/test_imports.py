@@ -0,0 +1,19 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def loaded_after(statement):
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, check=True)
+    return set(completed.stdout.split())
+
+def test_database_and_routes_do_not_import_the_scientific_stack():
+    for statement in ('import app.models', 'import app.database', 'import app.routes'):
+        modules = loaded_after(statement)
+        assert not {'sklearn', 'pandas', 'scipy'} & modules, statement
+
+def test_recommender_imports_without_scikit_learn():
+    # Only unpickling models or building features loads scikit-learn
+    assert 'sklearn' not in loaded_after('import app.recommender')
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+from app.config import Config
+from app.index import ExactIndex, LSHIndex, build_index, load_index, normalize_features, recall_at_k
+
+@pytest.fixture
+def features():
+    # Clustered rows so nearest neighbors are well defined
+    rng = np.random.RandomState(0)
+    centers = sparse_random(20, 300, density=0.1, random_state=rng).toarray()
+    rows = centers[rng.randint(0, 20, size=2000)] + 0.05 * sparse_random(2000, 300, density=0.05, random_state=rng).toarray()
+    return normalize_features(rows)
+
+def test_exact_index_matches_dense_cosine(features):
+    index = ExactIndex(features)
+    result = index.search(features[3], 10)
+    dense = (features @ features[3].T).toarray().ravel()
+    np.testing.assert_allclose(result.scores, np.sort(dense)[::-1][:10], rtol=1e-5)
+    assert result.engine == 'exact'
+
+def test_lsh_recall_and_candidate_pruning(features):
+    index = LSHIndex(features, n_tables=12, n_bits=10, n_probes=2)
+    rows = range(0, 2000, 40)
+    assert recall_at_k(index, ExactIndex(features), rows, 10) > 0.9
+    assert np.mean([len(index.candidates(features[row])) for row in rows]) < 0.5 * features.shape[0]
+    assert index.search(features[0], 10).engine == 'lsh'
+
+def test_lsh_falls_back_to_exact_when_too_few_candidates(features):
+    index = LSHIndex(features, n_tables=1, n_bits=32, n_probes=0)
+    result = index.search(features[0], 1999)
+    assert result.engine == 'exact'
+    assert len(result.indices) == 1999
+
+def test_save_and_mmap_load(features, tmp_path):
+    index = build_index(features, 'lsh', n_tables=4, n_bits=8)
+    index.save(tmp_path)
+    loaded = load_index(tmp_path, mmap=True)
+    assert isinstance(loaded, LSHIndex)
+    assert isinstance(loaded.sorted_keys, np.memmap)
+    original = index.search(features[7], 5)
+    restored = loaded.search(features[7], 5)
+    np.testing.assert_array_equal(original.indices, restored.indices)
+
+def test_recommender_reports_engine(catalog, fitted_components, monkeypatch, tmp_path):
+    from app.recommender import AppRecommender
+    monkeypatch.setattr(Config, 'INDEX_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'SCORING_ENGINE', 'lsh')
+    recommender = AppRecommender(data=catalog, **fitted_components)
+    result = recommender.get_recommendations('Photo Editor')
+    assert result['status'] == 'success'
+    assert result['engine'] in ('lsh', 'exact')
+    assert isinstance(recommender.index, LSHIndex)
+    assert len(result['recommendations']) == 5
+
+def test_saved_index_requires_the_same_transformers(catalog, fitted_components, monkeypatch, tmp_path, caplog):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from app.recommender import AppRecommender
+    monkeypatch.setattr(Config, 'INDEX_DIR', str(tmp_path))
+    built = AppRecommender(data=catalog, **fitted_components)
+    built.index.save(str(tmp_path), extra_meta={'catalog_fingerprint': built.catalog_fingerprint,
+                                                'transformers_fingerprint': built.transformers_fingerprint})
+    caplog.set_level('INFO', logger='app.recommender')
+    AppRecommender(data=catalog, **fitted_components)
+    assert 'Loaded saved exact index' in caplog.text
+    caplog.clear()
+
+    # Refit on more text: same catalog, more feature columns
+    refit = TfidfVectorizer(stop_words='english').fit(
+        (catalog['Category'] + ' ' + catalog['Genres'] + ' ' + catalog['App']).tolist() + ['extra words widen vocabulary'])
+    recommender = AppRecommender(data=catalog, **dict(fitted_components, tfidf_vectorizer=refit))
+    assert 'built with other transformers' in caplog.text and 'Loaded saved' not in caplog.text
+    assert recommender.features.shape[1] == built.features.shape[1] + 4
+
+def test_embedding_index_ranks_like_exact(tmp_path):
+    # Rank-30 data is reproduced exactly by a 40-dim projection
+    rng = np.random.RandomState(0)
+    features = normalize_features(rng.rand(2000, 30) @ sparse_random(30, 300, density=0.2, random_state=rng).toarray())
+    index = build_index(features, 'svd', n_components=40)
+    assert index.embedding.dtype == np.float32 and index.embedding.flags['C_CONTIGUOUS']
+    assert recall_at_k(index, ExactIndex(features), range(0, 2000, 50), 10) > 0.95
+    # Sparse and dense queries project identically
+    np.testing.assert_allclose(index.project(features[5]), index.project(features[5].toarray()), atol=1e-5)
+
+    index.save(tmp_path)
+    loaded = load_index(tmp_path)
+    np.testing.assert_array_equal(loaded.search(features[5], 10).indices, index.search(features[5], 10).indices)
+
+def test_agreement_report(features):
+    from app.embeddings import agreement_report
+    report = agreement_report(features, [8, 40], k=5, n_queries=50)
+    recalls = [entry['recall_at_k'] for entry in report['embeddings']]
+    assert [entry['dims'] for entry in report['embeddings']] == [8, 40]
+    assert recalls[1] >= recalls[0]
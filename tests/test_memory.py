@@ -0,0 +1,65 @@
+import pickle
+import numpy as np
+from scipy.sparse import csr_matrix
+from app import create_app
+from app.memory import deep_nbytes, frame_memory, matrix_memory, memory_report
+
+def test_deep_nbytes_counts_buffers_once():
+    array = np.zeros(10000)
+    assert deep_nbytes(array) >= array.nbytes
+    # A shared array and views of it count once
+    assert deep_nbytes([array, array, array[:10]]) < 2 * array.nbytes
+    assert deep_nbytes({'words': ['x' * 1000] * 3}) < 2000
+
+def test_model_size_matches_pickled_trees(fitted_components):
+    model = fitted_components['model']
+    size = deep_nbytes(model)
+    # Tree node arrays live in extension objects; they must still be counted
+    assert 0.8 * len(pickle.dumps(model)) < size < 2 * len(pickle.dumps(model))
+
+def test_frame_and_matrix_memory(catalog):
+    report = frame_memory(catalog)
+    assert report['rows'] == len(catalog)
+    assert report['nbytes'] == sum(report['columns'].values()) + report['index_bytes']
+    assert set(report['columns']) == set(catalog.columns)
+
+    matrix = csr_matrix(np.eye(4, dtype=np.float32))
+    assert matrix_memory(matrix) == {'nbytes': 4 * 4 + 4 * 4 + 5 * 4, 'format': 'csr', 'shape': [4, 4],
+                                     'dtype': 'float32', 'nnz': 4}
+
+def test_memory_report_and_status_route(recommender, tmp_path):
+    report = memory_report(recommender)
+    structures = report['structures']
+    assert {'data', 'index', 'model', 'tfidf_vectorizer', 'encoder', 'scaler', 'masks',
+            'text_index', 'prefix_index', 'compiled_model'} <= set(structures)
+    assert 'App' in structures['data']['columns']
+    assert structures['index']['features']['nnz'] == recommender.features.nnz
+    assert report['structure_bytes_per_app'] > 0
+    phases = [phase['phase'] for phase in report['startup']['phases']]
+    assert phases[:2] == ['load_data', 'load_models'] and 'index' in phases
+
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = recommender
+    status = app.test_client().get('/api/recommender-status').get_json()
+    assert status['memory']['structures']['data']['rows'] == len(recommender.data)
+
+def test_compact_catalog_keeps_serving_values(catalog, fitted_components, monkeypatch):
+    from app.config import Config
+    from app.recommender import AppRecommender, clean_catalog, compact_catalog
+
+    raw = clean_catalog(catalog.assign(**{'Last Updated': 'January 7, 2018', 'Android Ver': '4.0.3 and up'}))
+    compact = compact_catalog(raw)
+    assert 'Last Updated' not in compact.columns and 'Android Ver' not in compact.columns
+    assert str(compact['Category'].dtype) == 'category'
+    assert compact['Reviews'].dtype.itemsize < raw['Reviews'].dtype.itemsize
+    assert (compact['Reviews'] == raw['Reviews']).all() and (compact['Size'] == raw['Size']).all()
+    assert compact.memory_usage(deep=True).sum() < raw.memory_usage(deep=True).sum() / 2
+
+    results = {}
+    for enabled in (False, True):
+        monkeypatch.setattr(Config, 'COMPACT_CATALOG', enabled)
+        recommender = AppRecommender(data=catalog, **fitted_components)
+        results[enabled] = (recommender.get_recommendations('Photo Editor', 5)['recommendations'],
+                            recommender.features.toarray())
+    assert results[True][0] == results[False][0]
+    assert np.array_equal(results[True][1], results[False][1])
@@ -0,0 +1,69 @@
+import json
+from app import create_app
+from app.metrics import Registry, Histogram, Counter, StageTimer, merge_snapshots, render_text
+
+def test_histogram_text_format():
+    registry = Registry()
+    latency = Histogram('latency_seconds', "Latency", ['stage'], buckets=(0.1, 1.0), registry=registry)
+    calls = Counter('calls_total', "Calls", ['outcome'], registry=registry)
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.labels('score').observe(value)
+    calls.labels('success').inc()
+    calls.labels('success').inc(2)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{stage="score",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="score",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{stage="score",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{stage="score"} 4.05' in lines
+    assert 'latency_seconds_count{stage="score"} 4' in lines
+    assert 'calls_total{outcome="success"} 3' in lines
+
+def test_stage_timer_records_totals_once():
+    registry = Registry()
+    stages = Histogram('stage_seconds', "Stages", ['stage'], registry=registry)
+    timer = StageTimer(stages)
+    for _ in range(3):
+        timer.lap('score')
+    timer.lap('records')
+    timer.finish()
+    snapshot = registry.snapshot()['stage_seconds']['series']
+    assert {tuple(values): sum(counts) for values, (counts, _) in snapshot} == {('score',): 1, ('records',): 1}
+
+def test_snapshots_from_workers_are_summed(tmp_path):
+    workers = []
+    for observations in ([0.2], [0.2, 5.0]):
+        registry = Registry()
+        latency = Histogram('latency_seconds', "Latency", buckets=(1.0,), registry=registry)
+        requests = Counter('requests_total', "Requests", ['status'], registry=registry)
+        for value in observations:
+            latency.observe(value)
+            requests.labels(200).inc()
+        workers.append(registry.snapshot())
+    # A worker that exited left its file behind; its totals still count
+    (tmp_path / 'metrics-1.json').write_text(json.dumps(workers[0]))
+    (tmp_path / 'metrics-2.json').write_text(json.dumps(workers[1]))
+
+    merged = Registry().collect(str(tmp_path))
+    assert merged['requests_total']['series'] == {('200',): 3.0}
+    assert merged['latency_seconds']['series'][()] == [[2, 1], 5.4]
+    assert merged == merge_snapshots(workers)
+    assert 'latency_seconds_count 3' in render_text(merged).splitlines()
+
+def test_metrics_endpoint(recommender, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+                      'METRICS_DIR': str(tmp_path / 'metrics')})
+    app.recommender = recommender
+    client = app.test_client()
+    assert client.get('/api/recommend?app_name=Facebook').status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    for stage in ('resolve', 'score', 'dedupe', 'records', 'encode'):
+        assert f'recommend_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'http_requests_total{endpoint="/api/recommend",method="GET",status="200"}' in text
+    assert 'startup_stage_seconds_count{stage="index"}' in text
+    assert list((tmp_path / 'metrics').iterdir())
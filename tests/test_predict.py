@@ -0,0 +1,62 @@
+import numpy as np
+from app import create_app
+from app.index import normalize_features
+
+UNSEEN_GAME = {
+    'App': 'Puzzle Adventure', 'Category': 'GAME', 'Genres': 'Puzzle;Casual',
+    'description': 'puzzle game', 'Reviews': '5,000', 'Size': '20M',
+    'Installs': '10,000+', 'Price': '0', 'Type': 'Free', 'Content Rating': 'Everyone'
+}
+
+def test_unseen_vector_matches_catalog_layout(recommender):
+    # A catalog row sent as an unseen app gets the same serving vector
+    row = recommender.data.iloc[3]
+    app = {col: row[col] for col in ['App', 'Category', 'Genres', 'Reviews', 'Size', 'Installs', 'Price', 'Type', 'Content Rating']}
+    frame = recommender.prepare_unseen_apps([app])
+    vector = normalize_features(recommender._combine_features(frame))
+    np.testing.assert_allclose(vector.toarray(), recommender.features[3].toarray(), rtol=1e-5, atol=1e-7)
+
+def test_predict_route_single_and_batch(recommender, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = recommender
+    client = app.test_client()
+
+    single = client.post('/predict', json={'features': UNSEEN_GAME, 'count': 3}).get_json()
+    assert 1.0 <= single['predicted_rating'] <= 5.0 and single['predicted_rating'] == round(single['predicted_rating'], 2)
+    assert [rec['Category'] for rec in single['recommended_apps']] == ['GAME'] * 3
+
+    finance = dict(UNSEEN_GAME, App='Budget Planner', Category='FINANCE', Genres='Finance', description='budget')
+    batch = client.post('/predict', json={'apps': [UNSEEN_GAME, finance]}).get_json()
+    assert len(batch['results']) == 2
+    assert batch['results'][1]['recommended_apps'][0]['Category'] == 'FINANCE'
+
+    assert client.post('/predict', json={'features': {'App': 'x'}}).status_code == 400
+    assert client.post('/predict', json={'apps': [dict(UNSEEN_GAME, Reviews='many')]}).status_code == 400
+    assert client.post('/predict', json=[1, 2]).status_code == 400
+    for count in (0, -1, 21, 'many'):
+        assert client.post('/predict', json={'features': UNSEEN_GAME, 'count': count}).status_code == 400
+
+def test_catalog_ratings_predicted_offline_and_loaded(catalog, fitted_components, monkeypatch, tmp_path):
+    from sklearn.ensemble import RandomForestRegressor
+    from app.config import Config
+    from app.ratings import build_ratings
+    from app.recommender import AppRecommender
+    path = str(tmp_path / 'predicted_ratings.npz')
+    monkeypatch.setattr(Config, 'PREDICTED_RATINGS_PATH', path)
+    recommender = AppRecommender(data=catalog, **fitted_components)
+    assert 'Predicted Rating' not in recommender.data.columns
+    assert 'Predicted Rating' not in recommender.get_recommendations('Facebook', 2)['recommendations'][0]
+
+    expected = recommender.model.predict(recommender._combine_features(recommender.data))
+    np.testing.assert_allclose(build_ratings(recommender, path, n_jobs=2), np.round(expected, 2))
+    assert recommender.model.n_jobs == fitted_components['model'].n_jobs
+
+    loaded = AppRecommender(data=catalog, **fitted_components)
+    np.testing.assert_allclose(loaded.data['Predicted Rating'], np.round(expected, 2))
+    recommendation = loaded.get_recommendations('Facebook', 2)['recommendations'][0]
+    assert recommendation['Predicted Rating'] == loaded.data.loc[loaded.data['App'] == recommendation['App'], 'Predicted Rating'].iloc[0]
+
+    # Ratings of another model are not served
+    other = RandomForestRegressor(n_estimators=2, random_state=1).fit(recommender._combine_features(recommender.data),
+                                                                      recommender.data['Rating'].fillna(4.0))
+    assert 'Predicted Rating' not in AppRecommender(data=catalog, **dict(fitted_components, model=other)).data.columns
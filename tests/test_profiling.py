@@ -0,0 +1,56 @@
+import logging
+import marshal
+import pytest
+from app import create_app
+
+def make_app(recommender, tmp_path, **config):
+    app = create_app(dict({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+                           'ADMIN_TOKEN': 'secret'}, **config))
+    app.recommender = recommender
+    return app
+
+def test_request_id_is_echoed_or_generated(recommender, tmp_path):
+    client = make_app(recommender, tmp_path).test_client()
+    response = client.get('/api/suggest?q=ph', headers={'X-Request-ID': 'trace-123'})
+    assert response.headers['X-Request-ID'] == 'trace-123'
+    # Unsafe ids are replaced
+    response = client.get('/api/suggest?q=ph', headers={'X-Request-ID': '../../etc/passwd'})
+    assert response.headers['X-Request-ID'] != '../../etc/passwd'
+    assert len(response.headers['X-Request-ID']) == 36
+
+@pytest.mark.parametrize('profile_dir', [None, 'profiles'])
+def test_admin_header_profiles_request(recommender, tmp_path, profile_dir):
+    app = make_app(recommender, tmp_path, PROFILE_DIR=str(tmp_path / profile_dir) if profile_dir else None)
+    client = app.test_client()
+    admin = {'X-Admin-Token': 'secret'}
+
+    # Without the token the header is ignored
+    for wrong in ('wrong', 'sécret'):
+        response = client.get('/api/recommend?app_name=Facebook', headers={'X-Profile': '1', 'X-Admin-Token': wrong})
+        assert 'X-Profiled' not in response.headers
+
+    response = client.get('/api/recommend?app_name=Facebook', headers=dict(admin, **{'X-Profile': '1', 'X-Request-ID': 'req-1'}))
+    assert response.status_code == 200
+    assert response.headers['X-Profiled'] == '1'
+
+    assert client.get('/api/admin/profiles').status_code == 403
+    assert client.get('/api/admin/profiles', headers=admin).get_json()['profiles'] == ['req-1']
+
+    summary = client.get('/api/admin/profiles/req-1', headers=admin).get_data(as_text=True)
+    assert summary.startswith('GET /api/recommend?app_name=Facebook -> 200')
+    assert 'score=' in summary and 'get_recommendations' in summary
+
+    raw = client.get('/api/admin/profiles/req-1?format=prof', headers=admin).get_data()
+    stats = marshal.loads(raw)
+    assert any(function == 'get_recommendations' for _, _, function in stats)
+    assert client.get('/api/admin/profiles/missing', headers=admin).status_code == 404
+
+def test_sampling_and_slow_request_log(recommender, tmp_path, caplog):
+    client = make_app(recommender, tmp_path, PROFILE_SAMPLE_RATE=1, SLOW_REQUEST_MS=0).test_client()
+    with caplog.at_level(logging.WARNING, logger='app.profiling'):
+        response = client.get('/api/recommend?app_name=Facebook', headers={'X-Request-ID': 'slow-1'})
+    assert response.headers['X-Profiled'] == '1'
+    message = next(record.getMessage() for record in caplog.records if 'Slow request' in record.getMessage())
+    assert message.startswith('Slow request slow-1: GET /api/recommend -> 200')
+    for stage in ('resolve', 'score', 'dedupe', 'records', 'encode'):
+        assert f"{stage}=" in message
@@ -0,0 +1,38 @@
+import numpy as np
+from app.index import build_index, normalize_features
+from app.neighbors import NeighborTable
+from app.quantization import quantize_rows, dequantize_rows, quantized_matvec, precision_report
+
+def test_quantize_rows_roundtrip():
+    rng = np.random.RandomState(0)
+    matrix = rng.randn(50, 16).astype(np.float32)
+    matrix[3] = 0
+    values, scales = quantize_rows(matrix)
+    assert values.dtype == np.int8
+    np.testing.assert_allclose(dequantize_rows(values, scales), matrix, atol=np.abs(matrix).max() / 127)
+    vector = rng.randn(16).astype(np.float32)
+    np.testing.assert_allclose(quantized_matvec(values, scales, vector, chunk_size=7),
+                               dequantize_rows(values, scales) @ vector, rtol=1e-5, atol=1e-5)
+
+def test_neighbor_table_int8(tmp_path):
+    scores = np.array([[0.9, 0.5, 0.0], [0.7, 0.6, 0.2]], dtype=np.float32)
+    indices = np.array([[1, 2, -1], [0, 2, 3]])
+    table = NeighborTable(indices, scores).to_precision('int8')
+    assert table.precision == 'int8'
+    assert table.nbytes < NeighborTable(indices, scores).nbytes
+    table.save(tmp_path / 'cf.npz')
+    loaded = NeighborTable.load(tmp_path / 'cf.npz')
+    rows, row_scores = loaded.neighbors(0)
+    np.testing.assert_array_equal(rows, [1, 2])
+    np.testing.assert_allclose(row_scores, [0.9, 0.5], atol=0.01)
+
+def test_precision_report_embeddings():
+    rng = np.random.RandomState(0)
+    features = normalize_features(rng.rand(500, 20) @ rng.rand(20, 60))
+    report = precision_report(features, 'svd', k=10, n_queries=50, n_components=16)
+    by_precision = {entry['precision']: entry for entry in report['results']}
+    assert by_precision['float64']['overlap_vs_first'] == 1.0
+    assert by_precision['float32']['overlap_vs_first'] > 0.95
+    assert by_precision['int8']['overlap_vs_first'] > 0.8
+    assert by_precision['int8']['index_mb'] < by_precision['float32']['index_mb'] < by_precision['float64']['index_mb']
+    assert build_index(features, 'svd', precision='int8', n_components=16).embedding.dtype == np.int8
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+from app.config import Config
+from app.index import ExactIndex, normalize_features
+from app.neighbors import top_k_neighbors
+from app.shards import ShardedIndex
+
+@pytest.fixture(scope='module')
+def features():
+    rng = np.random.RandomState(0)
+    rows = sparse_random(600, 200, density=0.05, random_state=rng).toarray()
+    # Repeated rows give tied scores that straddle shard boundaries
+    rows[400:] = rows[rng.randint(0, 400, size=200)]
+    return normalize_features(rows)
+
+@pytest.fixture(scope='module')
+def sharded(features):
+    index = ShardedIndex(features, 3)
+    yield index
+    index.close()
+
+def test_sharded_search_matches_exact(features, sharded):
+    exact = ExactIndex(features)
+    rng = np.random.RandomState(1)
+    selective = np.zeros(600, dtype=bool)
+    selective[rng.choice(600, 30, replace=False)] = True
+    # Allows no rows of the first shard
+    last_shards = np.arange(600) >= 250
+    for row in (0, 7, 450, 599):
+        for k, mask in ((10, None), (600, None), (10, selective), (50, last_shards), (10, rng.rand(600) < 0.7)):
+            expected = exact.search(features[row], k, mask)
+            result = sharded.search(features[row], k, mask)
+            np.testing.assert_array_equal(result.indices, expected.indices)
+            np.testing.assert_array_equal(result.scores, expected.scores)
+    assert result.engine == 'sharded'
+    assert len(sharded.search(features[0], 10, np.zeros(600, dtype=bool)).indices) == 0
+
+    rows = np.array([599, 3, 250, 199, 200, 3])
+    np.testing.assert_array_equal(sharded.score_rows(features[5], rows), exact.score_rows(features[5], rows))
+    assert (sharded.features[450] != exact.features[450]).nnz == 0 and sharded.features.shape == features.shape
+
+    described = sharded.describe()
+    assert described['shard_rows'] == [200, 200, 200] and described['queries'] > 0
+    assert described['mean_merge_overhead_ms'] >= 0 and sum(described['shard_nbytes']) >= exact.nbytes
+
+def test_dead_shard_stops_the_index(features):
+    index = ShardedIndex(features, 2)
+    index._processes[1].kill()
+    index._processes[1].join()
+    with pytest.raises((EOFError, OSError)):
+        index.search(features[0], 10)
+    assert index.describe()['broken'] and not any(process.is_alive() for process in index._processes)
+    # The surviving shard's reply is never merged into a later query
+    with pytest.raises(RuntimeError):
+        index.search(features[1], 10)
+
+def test_recommender_serves_from_shards(catalog, fitted_components, monkeypatch, tmp_path):
+    from app.recommender import AppRecommender
+    monkeypatch.setattr(Config, 'INDEX_DIR', str(tmp_path))
+    single = AppRecommender(data=catalog, **fitted_components)
+    monkeypatch.setattr(Config, 'SERVING_SHARDS', 2)
+    recommender = AppRecommender(data=catalog, **fitted_components)
+    try:
+        assert isinstance(recommender.index, ShardedIndex)
+        assert recommender.version == single.version
+        for name, filters in (('Photo Editor', None), ('Chess Master', None), ('Facebook', {'category': 'GAME'})):
+            expected = single.get_recommendations(name, 20, filters=filters)
+            assert recommender.get_recommendations(name, 20, filters=filters)['recommendations'] == expected['recommendations']
+
+        interactions = normalize_features(sparse_random(len(catalog), 8, density=0.5, random_state=0))
+        single.cf_neighbors = recommender.cf_neighbors = top_k_neighbors(interactions, 5)
+        expected = single.get_recommendations('Camera Pro', 10, mode='hybrid')['recommendations']
+        assert recommender.get_recommendations('Camera Pro', 10, mode='hybrid')['recommendations'] == expected
+        assert recommender.get_recommendations('Camera Pro', 10)['engine'] == 'sharded'
+    finally:
+        recommender.index.close()
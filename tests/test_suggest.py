@@ -0,0 +1,27 @@
+import pandas as pd
+from app import create_app
+from app.suggest import PrefixIndex
+
+def test_prefix_matches_ranked_by_popularity():
+    data = pd.DataFrame({
+        'App': ['Photo Editor', 'Photo Lab', 'photo editor', 'Camera Photo', 'Phone Book', 'Chess'],
+        'Reviews': [100, 5000, 50, 900, 10, 1],
+        'Installs': [1000, 100000, 1000, 10000, 100, 10],
+    })
+    index = PrefixIndex(data)
+    # Word starts match, duplicate names collapse, most reviewed first
+    assert index.suggest('PHOTO', 10) == [1, 3, 0]
+    assert index.suggest('ph', 2) == [1, 3]
+    assert index.suggest('editor', 5) == [0]
+    assert index.suggest('xyz', 5) == []
+    assert index.suggest('  ', 5) == []
+
+def test_suggest_route(recommender, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = recommender
+    client = app.test_client()
+
+    data = client.get('/api/suggest?q=puz&count=5').get_json()
+    assert data['status'] == 'success'
+    assert {app['App'] for app in data['suggestions']} == {'Puzzle Quest', 'Word Puzzle'}
+    assert len(client.get('/api/suggest?q=c&count=1').get_json()['suggestions']) == 1
@@ -0,0 +1,45 @@
+import numpy as np
+from app import create_app
+from app.recommender import features_text
+
+def test_inverted_index_matches_dense_tfidf(recommender):
+    index = recommender.text_index
+    documents = recommender.tfidf_vectorizer.transform(features_text(recommender.data))
+    query = recommender.tfidf_vectorizer.transform(['photo camera'])
+    dense = (documents @ query.T).toarray().ravel()
+
+    result = index.search('photo camera', 5)
+    assert result.engine == 'inverted'
+    np.testing.assert_allclose(result.scores, np.sort(dense)[::-1][:5], rtol=1e-5)
+    # Only apps sharing a term with the query are scored
+    assert len(index.search('photo camera', 50).indices) == np.count_nonzero(dense)
+
+def test_unknown_terms_return_nothing(recommender):
+    assert len(recommender.text_index.search('zzzz qqqq', 5).indices) == 0
+
+def test_search_skips_duplicates_and_applies_filters(recommender):
+    result = recommender.search('photo editor', 5)
+    names = [rec['App'].lower() for rec in result['results']]
+    assert names[0] == 'photo editor'
+    assert len(names) == len(set(names))
+
+    result = recommender.search('game', 3, filters={'type': 'Paid'})
+    assert [rec['App'] for rec in result['results']] == ['Chess Master']
+
+def test_search_route(recommender, tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    app.recommender = recommender
+    client = app.test_client()
+
+    response = client.get('/api/search?q=puzzle&count=2')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['engine'] == 'inverted'
+    assert [rec['App'] for rec in data['results']] == ['Puzzle Quest', 'Word Puzzle']
+
+    assert client.get('/api/search').status_code == 400
+    assert client.post('/api/search', json={'q': 'bank', 'min_rating': 'x'}).status_code == 400
+    assert client.get('/api/search?q=bank&min_rating=nan').status_code == 400
+    assert client.post('/api/search', json={'q': 'bank', 'category': 5}).status_code == 400
+    assert client.post('/api/search', json=['bank']).status_code == 400
+    assert client.post('/api/recommend', json=[1, 2]).status_code == 400
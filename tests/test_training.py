@@ -0,0 +1,41 @@
+import numpy as np
+import save_model
+
+def statuses(report):
+    return {name: stage['status'] for name, stage in report['stages'].items()}
+
+def test_pipeline_reuses_cached_stages(catalog, tmp_path):
+    path = str(tmp_path / 'catalog.csv')
+    catalog.to_csv(path, index=False)
+    cache_dir = str(tmp_path / 'cache')
+
+    components, report = save_model.run_pipeline(path, {'n_estimators': 3}, n_jobs=1, cache_dir=cache_dir)
+    assert statuses(report) == {'clean': 'built', 'transformers': 'built', 'features': 'built', 'model': 'built'}
+    assert all(stage['peak_rss_mb'] > 0 for stage in report['stages'].values())
+    features = components['combined_features']
+    assert features.format == 'csc' and features.dtype == np.float32
+
+    # Unchanged inputs load the outputs and skip the stages nothing needs
+    cached, report = save_model.run_pipeline(path, {'n_estimators': 3}, n_jobs=1, cache_dir=cache_dir)
+    assert statuses(report) == {'transformers': 'cached', 'model': 'cached'}
+    assert report['skipped'] == ['clean', 'features']
+    assert np.array_equal(cached['model'].predict(features), components['model'].predict(features))
+
+    # New hyperparameters retrain only the forest
+    retrained, report = save_model.run_pipeline(path, {'n_estimators': 4}, n_jobs=2, cache_dir=cache_dir)
+    assert statuses(report) == {'transformers': 'cached', 'features': 'cached', 'model': 'built'}
+    assert len(retrained['model'].estimators_) == 4 and retrained['model'].n_jobs is None
+
+    # A changed catalog rebuilds everything
+    catalog.assign(Rating=catalog['Rating'].iloc[::-1].to_numpy()).to_csv(path, index=False)
+    _, report = save_model.run_pipeline(path, {'n_estimators': 4}, n_jobs=1, cache_dir=cache_dir)
+    assert set(statuses(report).values()) == {'built'}
+
+def test_pipeline_matches_train_model(catalog, tmp_path):
+    path = str(tmp_path / 'catalog.csv')
+    catalog.to_csv(path, index=False)
+    components, _ = save_model.run_pipeline(path, {'n_estimators': 3}, n_jobs=1)
+    model, scaler, encoder, tfidf_vectorizer, features = save_model.train_model(
+        save_model.preprocess_data(save_model.load_dataset(path)), {'n_estimators': 3}, n_jobs=1)
+    assert np.array_equal(components['model'].predict(features), model.predict(features))
+    assert components['tfidf_vectorizer'].vocabulary_ == tfidf_vectorizer.vocabulary_